@@ -0,0 +1,203 @@
+# activity_ledger.py
+# Append-only per-user store of /analyze and /logs/analyze results (SQLite).
+#
+#   events   one row per recorded result: integer user id, unix seconds, local
+#            day, source code and the five category values from
+#            analyze_payload's breakdown, all stored as integers (grams), which
+#            SQLite packs into 1-4 bytes each and sums exactly
+#   rollups  per (user, grain, bucket) sums of the same columns, updated in the
+#            same transaction as the insert, for grain in day / week / month
+#
+# Range queries ("last 30 days per category") read one rollup row per bucket,
+# so their cost depends on the number of buckets, not on how many events a
+# user has logged. Days are local to LEDGER_TZ_OFFSET_MIN (default IST).
+
+import os, time, sqlite3, threading
+from collections import defaultdict
+from typing import Optional, Any, Dict, List, Tuple, Iterable
+
+from local_days import local_day, bucket_of, bucket_start, first_day, bucket_days
+
+CATEGORIES = ("transport_kg", "meals_kg", "electricity_kg", "lpg_kg", "waste_kg")
+GRAINS = ("day", "week", "month")
+SOURCES = {"analyze": 0, "log": 1, "ingest": 2}
+
+def _grams(kg: float) -> int:
+    return int(round(kg * 1000))
+
+def _kg(grams: int) -> float:
+    return round(grams / 1000, 2)
+
+_COLS = ", ".join(c for c in CATEGORIES)
+_SUMS = ", ".join(f"{c} = {c} + excluded.{c}" for c in CATEGORIES)
+
+class ActivityLedger:
+    def __init__(self, db_path: str):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._users: Dict[str, int] = {}
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA cache_size=-65536")  # 64 MB of page cache for rollup upserts
+        self._db.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " user INTEGER NOT NULL, ts INTEGER NOT NULL, day INTEGER NOT NULL, source INTEGER NOT NULL,"
+            f" {', '.join(f'{c} INTEGER NOT NULL' for c in CATEGORIES)}, total_kg INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_user_day ON events(user, day)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " user INTEGER NOT NULL, grain TEXT NOT NULL, bucket INTEGER NOT NULL, n INTEGER NOT NULL,"
+            f" {', '.join(f'{c} INTEGER NOT NULL' for c in CATEGORIES)}, total_kg INTEGER NOT NULL,"
+            " PRIMARY KEY (user, grain, bucket)) WITHOUT ROWID"
+        )
+        # stats() reads on its own connection, so a /metrics scrape never waits
+        # for (or holds up) a write; WAL lets it read while a batch commits
+        if db_path == ":memory:":
+            self._reader, self._read_lock = self._db, self._lock
+        else:
+            self._reader = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True,
+                                           check_same_thread=False, isolation_level=None)
+            self._read_lock = threading.Lock()
+
+    def _user_id(self, name: str, create: bool) -> Optional[int]:
+        # caller holds self._lock
+        uid = self._users.get(name)
+        if uid is None:
+            row = self._db.execute("SELECT id FROM users WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                if not create:
+                    return None
+                row = (self._db.execute("INSERT INTO users (name) VALUES (?)", (name,)).lastrowid,)
+            uid = self._users[name] = row[0]
+        return uid
+
+    def record(self, user: str, analysis: Dict[str, Any], source: str = "analyze", ts: Optional[float] = None) -> None:
+        """Append one analyze_payload() result for `user` and update its rollups."""
+        self.record_many([(user, analysis, source, ts)])
+
+    def record_many(self, items: Iterable[Tuple[str, Dict[str, Any], str, Optional[float]]]) -> int:
+        """
+        Append many (user, analysis, source, ts) results in one transaction.
+        Rollup deltas are summed per bucket first, so a batch costs one upsert
+        per touched bucket rather than one per event.
+        """
+        now = time.time()
+        with self._lock:
+            events = []
+            deltas: Dict[Tuple[int, str, int], List[int]] = {}
+            day_buckets: Dict[int, Tuple[int, ...]] = {}
+            self._db.execute("BEGIN")
+            try:
+                for user, analysis, source, ts in items:
+                    ts = now if ts is None else ts
+                    uid = self._user_id(user, create=True)
+                    day = local_day(ts)
+                    breakdown = analysis["breakdown"]
+                    vals = [_grams(breakdown[c]) for c in CATEGORIES]
+                    vals.append(_grams(analysis["total_kg"]))
+                    events.append((uid, int(ts), day, SOURCES[source], *vals))
+                    buckets = day_buckets.get(day)
+                    if buckets is None:
+                        buckets = day_buckets[day] = tuple(bucket_of(day, g) for g in GRAINS)
+                    for grain, bucket in zip(GRAINS, buckets):
+                        acc = deltas.get((uid, grain, bucket))
+                        if acc is None:
+                            deltas[(uid, grain, bucket)] = [1, *vals]
+                        else:
+                            acc[0] += 1
+                            for i, v in enumerate(vals, 1):
+                                acc[i] += v
+                self._db.executemany(
+                    f"INSERT INTO events (user, ts, day, source, {_COLS}, total_kg)"
+                    f" VALUES (?, ?, ?, ?, {', '.join('?' * len(CATEGORIES))}, ?)", events)
+                self._db.executemany(
+                    f"INSERT INTO rollups (user, grain, bucket, n, {_COLS}, total_kg)"
+                    f" VALUES (?, ?, ?, ?, {', '.join('?' * len(CATEGORIES))}, ?)"
+                    f" ON CONFLICT (user, grain, bucket) DO UPDATE SET n = n + excluded.n, {_SUMS},"
+                    " total_kg = total_kg + excluded.total_kg",
+                    [(*k, *v) for k, v in deltas.items()])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(events)
+
+    def rollup(self, user: str, grain: str, start_day: int, end_day: int) -> List[Dict[str, Any]]:
+        """
+        Buckets of `grain` from the one containing start_day to the one
+        containing end_day, oldest first, each with n, per-category kg,
+        total_kg and `days` (calendar days of the bucket up to end_day).
+        Buckets are whole: the first one may start before start_day.
+        Empty buckets are omitted.
+        """
+        if grain not in GRAINS:
+            raise ValueError(f"grain must be one of {GRAINS}")
+        lo, hi = bucket_of(start_day, grain), bucket_of(end_day, grain)
+        with self._lock:
+            uid = self._user_id(user, create=False)
+            if uid is None:
+                return []
+            rows = self._db.execute(
+                f"SELECT bucket, n, {_COLS}, total_kg FROM rollups"
+                " WHERE user = ? AND grain = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+                (uid, grain, lo, hi)).fetchall()
+        out = []
+        for bucket, n, *vals, total in rows:
+            first = first_day(bucket, grain)
+            out.append({
+                "bucket": bucket_start(bucket, grain).isoformat(),
+                "n": n,
+                "breakdown": {c: _kg(v) for c, v in zip(CATEGORIES, vals)},
+                "total_kg": _kg(total),
+                "days": min(end_day, first + bucket_days(bucket, grain) - 1) - first + 1,
+            })
+        return out
+
+    def scan(self, user: str, grain: str, start_day: int, end_day: int) -> List[Dict[str, Any]]:
+        """
+        Same buckets as rollup() (without `days`) computed from the raw
+        events in O(events); used to check and benchmark the rollups.
+        """
+        start_day = first_day(bucket_of(start_day, grain), grain)
+        with self._lock:
+            uid = self._user_id(user, create=False)
+            if uid is None:
+                return []
+            rows = self._db.execute(
+                f"SELECT day, {_COLS}, total_kg FROM events WHERE user = ? AND day BETWEEN ? AND ?",
+                (uid, start_day, end_day)).fetchall()
+        acc: Dict[int, List[int]] = defaultdict(lambda: [0] * (len(CATEGORIES) + 2))
+        for day, *vals in rows:
+            a = acc[bucket_of(day, grain)]
+            a[0] += 1
+            for i, v in enumerate(vals):
+                a[i + 1] += v
+        return [{"bucket": bucket_start(b, grain).isoformat(), "n": a[0],
+                 "breakdown": {c: _kg(v) for c, v in zip(CATEGORIES, a[1:-1])},
+                 "total_kg": _kg(a[-1])}
+                for b, a in sorted(acc.items())]
+
+    def stats(self, rollup_rows: bool = True) -> Dict[str, Any]:
+        """
+        Row counts. Users and events are append-only, so the last rowid is the
+        count (an O(log n) lookup); rollup_rows needs a scan of the rollups,
+        so /metrics leaves it out.
+        """
+        with self._read_lock:
+            (users,) = self._reader.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()
+            (events,) = self._reader.execute("SELECT COALESCE(MAX(rowid), 0) FROM events").fetchone()
+            out = {"users": users, "events": events}
+            if rollup_rows:
+                (out["rollup_rows"],) = self._reader.execute("SELECT COUNT(*) FROM rollups").fetchone()
+        return out
+
+    def close(self) -> None:
+        with self._read_lock:
+            if self._reader is not self._db:
+                self._reader.close()
+        with self._lock:
+            self._db.close()
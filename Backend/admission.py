@@ -0,0 +1,210 @@
+# admission.py
+# Per-route admission control for LLM-bound routes, so a spike degrades to
+# the routes' deterministic fallbacks instead of queueing until clients time out.
+#
+#   gate = Gate.from_env("explain", slots=16, queue=64, deadline_s=10)
+#   budget = Budget.from_headers(x_priority, x_deadline_ms, gate)
+#   try:
+#       async with gate.admit(budget):
+#           ...                       # LLM work; llm() calls are capped at the time left
+#   except Shed as e:
+#       ...                           # serve the fallback, flag it with e.reason
+#
+# A Gate runs `slots` requests at a time and keeps up to `queue` waiting in
+# priority order (high, normal, low; FIFO within one). A request is shed at
+# once when:
+#   queue_full  the queue is full and it doesn't outrank anyone in it
+#   deadline    its expected wait + service time exceeds its deadline
+# and later when it is pushed out of a full queue by a higher-priority
+# arrival (evicted) or its deadline would pass before it could finish
+# (deadline). Service time is an EWMA of admitted requests. An admitted
+# request whose LLM call times out because its deadline passed leaves admit()
+# as Shed("deadline_exceeded"), so routes handle both cases in one place.
+# Per worker process; ADMISSION=0 admits everything (no queue, no deadline).
+
+import os, time, heapq, asyncio, contextvars, contextlib
+from typing import Optional, Any, Dict, List, Tuple, AsyncIterator
+
+import metrics
+
+ENABLED = os.getenv("ADMISSION", "1") != "0"
+# deadlines are kept this much ahead of the client's, so a fallback served at
+# the deadline still reaches the client before it gives up
+ADMISSION_MARGIN_S = float(os.getenv("ADMISSION_MARGIN_S", "0.25"))
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+ADMISSIONS = metrics.counter("eco_admission_total", "Admission decisions by route and outcome", ("route", "outcome"))
+DEGRADED = metrics.counter("eco_degraded_total", "Responses served from a fallback path, by route and reason",
+                           ("route", "reason"))
+
+# absolute perf_counter() deadline of the admitted request being handled
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (None outside an admitted request)."""
+    d = _deadline.get()
+    return None if d is None else d - time.perf_counter()
+
+def expired() -> bool:
+    """True inside an admitted request whose deadline has passed."""
+    left = remaining()
+    return left is not None and left <= 0
+
+class Shed(Exception):
+    """The request won't be served normally; the route serves its fallback and flags it with `reason`."""
+
+    def __init__(self, route: str, reason: str):
+        super().__init__(f"{route}: {reason}")
+        self.route, self.reason = route, reason
+
+class Budget:
+    """Priority and absolute deadline of one request."""
+
+    def __init__(self, priority: int, deadline: float):
+        self.priority, self.deadline = priority, deadline
+
+    @classmethod
+    def from_headers(cls, priority: Optional[str], deadline_ms: Optional[str], gate: "Gate") -> "Budget":
+        """`X-Priority: high|normal|low` and `X-Deadline-Ms` (the client's remaining budget), else the gate's defaults."""
+        p = PRIORITIES.get((priority or "").strip().lower(), PRIORITIES["normal"])
+        try:
+            seconds = float(deadline_ms) / 1000 if deadline_ms else gate.deadline_s
+        except ValueError:
+            seconds = gate.deadline_s
+        seconds = min(seconds, gate.deadline_s) - ADMISSION_MARGIN_S
+        return cls(p, time.perf_counter() + max(seconds, 0.0))
+
+class Gate:
+    def __init__(self, route: str, slots: int, queue: int, deadline_s: float, service_s: float = 1.0):
+        self.route = route
+        self.slots, self.max_queue, self.deadline_s = max(1, slots), max(0, queue), deadline_s
+        self.service_s = service_s  # EWMA of admitted requests' time in a slot
+        self.active = 0
+        self._queue: List[Tuple[int, int, "asyncio.Future[bool]"]] = []
+        self._seq = 0
+        self.counters: Dict[str, int] = {"admitted": 0, "queued": 0}
+        self.shed: Dict[str, int] = {}
+        self.degraded: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls, route: str, slots: int, queue: int, deadline_s: float, service_s: float = 1.0) -> "Gate":
+        """Defaults overridable as ADMIT_<ROUTE>_SLOTS / _QUEUE / _DEADLINE_S / _SERVICE_S."""
+        env = lambda k, d: os.getenv(f"ADMIT_{route.upper()}_{k}", str(d))
+        return cls(route, int(env("SLOTS", slots)), int(env("QUEUE", queue)),
+                   float(env("DEADLINE_S", deadline_s)), float(env("SERVICE_S", service_s)))
+
+    def _shed(self, reason: str) -> Shed:
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        ADMISSIONS.inc(route=self.route, outcome=f"shed_{reason}")
+        return Shed(self.route, reason)
+
+    def record_degraded(self, reason: str) -> None:
+        """Count a response served from the fallback path (shed, out of time, or the LLM failed)."""
+        self.degraded[reason] = self.degraded.get(reason, 0) + 1
+        DEGRADED.inc(route=self.route, reason=reason)
+
+    def expected_wait(self, priority: int) -> float:
+        if self.active < self.slots and not self._queue:
+            return 0.0
+        ahead = sum(1 for p, _, f in self._queue if p <= priority and not f.done())
+        return (ahead // self.slots + 1) * self.service_s
+
+    def _release(self) -> None:
+        self.active -= 1
+        while self._queue and self.active < self.slots:
+            _, _, fut = heapq.heappop(self._queue)
+            if not fut.done():
+                self.active += 1
+                fut.set_result(True)
+
+    def _remove(self, fut: "asyncio.Future[bool]") -> None:
+        self._queue = [e for e in self._queue if e[2] is not fut]
+        heapq.heapify(self._queue)
+
+    async def _wait_turn(self, budget: Budget) -> None:
+        now = time.perf_counter()
+        if self.active < self.slots and not self._queue:
+            self.active += 1
+            self.counters["admitted"] += 1
+            ADMISSIONS.inc(route=self.route, outcome="admitted")
+            return
+        if self.expected_wait(budget.priority) + self.service_s > budget.deadline - now:
+            raise self._shed("deadline")
+        if len(self._queue) >= self.max_queue:
+            worst = max(self._queue, default=None)
+            if worst is None or worst[0] <= budget.priority:
+                raise self._shed("queue_full")
+            self._remove(worst[2])
+            worst[2].set_exception(self._shed("evicted"))
+
+        fut: "asyncio.Future[bool]" = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._queue, (budget.priority, self._seq, fut))
+        self.counters["queued"] += 1
+        ADMISSIONS.inc(route=self.route, outcome="queued")
+        try:
+            # give up while there is still time to serve the fallback
+            await asyncio.wait({fut}, timeout=max(0.0, budget.deadline - time.perf_counter() - self.service_s))
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release()  # granted as the client went away
+            else:
+                self._remove(fut)
+                fut.cancel()
+            raise
+        if not fut.done():
+            self._remove(fut)
+            fut.cancel()
+            raise self._shed("deadline")
+        fut.result()  # raises Shed if evicted
+
+    @contextlib.asynccontextmanager
+    async def admit(self, budget: Budget) -> AsyncIterator[None]:
+        """Hold a slot for the body; raises Shed instead of admitting when the request can't be served in time."""
+        if not ENABLED:
+            yield
+            return
+        await self._wait_turn(budget)
+        token = _deadline.set(budget.deadline)
+        t0 = time.perf_counter()
+        try:
+            yield
+        except asyncio.TimeoutError as e:
+            if budget.deadline > time.perf_counter():
+                raise
+            raise Shed(self.route, "deadline_exceeded") from e
+        finally:
+            _deadline.reset(token)
+            self.service_s = 0.8 * self.service_s + 0.2 * (time.perf_counter() - t0)
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "max_queue": self.max_queue,
+            "deadline_s": self.deadline_s,
+            "in_flight": self.active,
+            "queue_depth": sum(1 for *_, f in self._queue if not f.done()),
+            "service_s": round(self.service_s, 3),
+            **self.counters,
+            "shed": dict(self.shed),
+            "degraded": dict(self.degraded),
+        }
+
+_gates: List[Gate] = []
+
+def register(gate: Gate) -> Gate:
+    _gates.append(gate)
+    return gate
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": ENABLED, "routes": {g.route: g.stats() for g in _gates}}
+
+@metrics.collector
+def _gauges():
+    return [
+        ("eco_admission_in_flight", "gauge", "Requests holding an admission slot", [({"route": g.route}, g.active) for g in _gates]),
+        ("eco_admission_queue_depth", "gauge", "Requests waiting for an admission slot",
+         [({"route": g.route}, g.stats()["queue_depth"]) for g in _gates]),
+    ]
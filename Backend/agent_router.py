@@ -0,0 +1,77 @@
+# agent_router.py
+# Local intent router for /agent tasks (English + Hindi).
+#
+# Most /agent tasks are "how many points do I have / what did my day emit",
+# and the request already carries completed_missions and emissions, so the
+# first model round would only decide to call points_calc / analyze_co2e with
+# those fields. route() recognizes such tasks with keyword patterns and
+# returns the tools to run locally; /agent then runs them itself and makes
+# only the final, tool-less model call (or answers from templates).
+#
+# A task is routed only when every clause of it asks for something a local
+# tool answers (points, CO2e / footprint, the missions list, or a summary of
+# what the request carries), the tools it needs have their inputs in the
+# request, and nothing in it asks for reasoning ("why", "how can I reduce",
+# advice, climate data). Everything else goes to the model loop unchanged.
+
+import os, re
+from typing import List, Optional, Tuple
+
+from log_parser import normalize, WORD_RE
+
+# same order as CHAT_TOOLS in app.py
+TOOLS = ("missions_catalog", "points_calc", "analyze_co2e")
+
+_CLAUSE_SPLIT = re.compile(r"[,;?!।\n]+|\.(?!\d)|\s+(?:and|also|plus|then|&)\s+|\s+(?:और|तथा|फिर|व)\s+")
+
+POINTS_WORDS = re.compile(r"\b(?:eco)?points?\b|\bpts\b|\bscore\b|\bearn(?:ed|s)?\b|"
+                          r"\bcomplet(?:e|ed)\b|\bfinished\b|\bdone\b|अंक|पॉइंट|प्वाइंट|पूरे? कि")
+CO2_WORDS = re.compile(r"\bco2e?\b|\bcarbon\b|\bfootprint\b|\bemi(?:t|ts|tted|ssions?)\b|\bthreat\b|"
+                       r"\bimpact\b|\bpollut\w*|\bkg\b|कार्बन|उत्सर्जन|फुटप्रिंट|प्रदूषण")
+CATALOG_WORDS = re.compile(r"\b(?:list|show|which|what|available|all|any)\b.*\b(?:missions?|challenges?)\b|"
+                           r"\b(?:missions?|challenges?)\b.*\b(?:list|catalog(?:ue)?|available)\b|"
+                           r"मिशन.*(?:कौन|सूची|दिखा)|(?:कौन|सूची).*मिशन")
+# "how am I doing": every tool whose input the request carries
+STATUS_WORDS = re.compile(r"\bsummar(?:y|ise|ize)\b|\bstatus\b|\bprogress\b|\bhow am i doing\b|\boverview\b|"
+                          r"\bstats\b|\breport\b|सारांश|प्रगति")
+# anything that needs the model to think, not just to phrase tool results
+OPEN_WORDS = re.compile(r"\bwhy\b|\bhow (?:can|could|do|does|should|to)\b|\bexplain\w*|\bcompar\w*|"
+                        r"\breduc\w*|\bimprov\w*|\bsuggest\w*|\badvi[cs]e\b|\btips?\b|\bideas?\b|\bplan\b|"
+                        r"\bshould\b|\bwhat if\b|\bbetter\b|\bworse\b|\btemperature\b|\bclimate\b|\bweather\b|"
+                        r"\bheat\w*|\bgenerate\b|\bnew missions?\b|क्यों|कैसे|सुझाव|समझा|कम कर|तापमान|मौसम")
+# clauses made only of these words ask for nothing
+FILLER = {"please", "pls", "plz", "thanks", "thank", "you", "hi", "hello", "hey", "ok", "okay",
+          "कृपया", "धन्यवाद", "नमस्ते", "जी"}
+
+# AGENT_ROUTER=0 sends every task through the model loop
+ENABLED = os.getenv("AGENT_ROUTER", "1") != "0"
+
+def route(task: str, has_missions: bool, has_emissions: bool) -> Optional[Tuple[str, ...]]:
+    """
+    Tools (in TOOLS order) that fully answer `task` from the request's own
+    completed_missions / emissions, or None when the model should plan.
+    """
+    t = normalize(task)
+    if not t.strip() or OPEN_WORDS.search(t):
+        return None
+    wanted: List[str] = []
+    for clause in (c.strip() for c in _CLAUSE_SPLIT.split(t)):
+        if not clause or set(WORD_RE.findall(clause)) <= FILLER:
+            continue
+        hit = []
+        if POINTS_WORDS.search(clause):
+            hit.append("points_calc")
+        if CO2_WORDS.search(clause):
+            hit.append("analyze_co2e")
+        if CATALOG_WORDS.search(clause) and "points_calc" not in hit:
+            hit.append("missions_catalog")
+        if not hit and STATUS_WORDS.search(clause):
+            hit = [n for n, have in (("points_calc", has_missions), ("analyze_co2e", has_emissions)) if have]
+        if not hit:
+            return None  # a clause no local tool answers
+        wanted.extend(hit)
+    if not wanted:
+        return None
+    if "points_calc" in wanted and not has_missions or "analyze_co2e" in wanted and not has_emissions:
+        return None  # the model would have to fill in the tool's input from the text
+    return tuple(n for n in TOOLS if n in wanted)
@@ -3,46 +3,145 @@
 #   cp .env.example .env  # then put your real OpenAI key
 #   uvicorn app:app --reload
 
-import os, json, datetime as dt
-from typing import Optional, List, Dict, Any, Literal
+import os, json, time, asyncio, functools, datetime as dt
+from contextlib import asynccontextmanager
+from collections import deque
+from typing import Optional, List, Dict, Any, Literal, Tuple, AsyncIterator
 
-from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi import FastAPI, HTTPException, Header, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse, ORJSONResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from dotenv import load_dotenv
 
-# OpenAI
-from openai import OpenAI
-import xarray as xr, s3fs, numpy as np
+import anyio
+import httpx
 from fastapi import Query
 
-# India bounding box (rough): lon 68–98E, lat 6–37N
-INDIA_BBOX = dict(lon_min=68, lon_max=98, lat_min=6, lat_max=37)
-
-# One concrete file from NEX-GDDP-CMIP6 (daily tasmax “historical” for a single model)
-# Tip: open the S3 index in a browser to pick a model/scenario file you like:
-# https://nex-gddp-cmip6.s3.us-west-2.amazonaws.com/index.html
-NEX_BUCKET_PREFIX = "s3://nex-gddp-cmip6/CMIP6/ScenarioMIP"
-# Example path pattern (adjust after browsing the index):
-# s3://nex-gddp-cmip6/CMIP6/CMIP/<INSTITUTION>/<MODEL>/historical/r1i1p1f1/tasmax/..."
-# or
-# s3://nex-gddp-cmip6/CMIP6/ScenarioMIP/<INSTITUTION>/<MODEL>/ssp245/r1i1p1f1/tasmax/...
-
-s3 = s3fs.S3FileSystem(anon=True)
-
 load_dotenv()
 
+# Heavy modules load on first use (see lazy_imports.py) so workers boot fast
+# and the non-climate routes never import numpy/xarray/s3fs.
+from lazy_imports import lazy_import, preload, is_loaded
+np = lazy_import("numpy")
+climate = lazy_import("climate")
+climate_pipeline = lazy_import("climate_pipeline")
+nc_partial = lazy_import("nc_partial")
+region_masks = lazy_import("region_masks")
+recommender = lazy_import("recommender")
+climate_extremes = lazy_import("climate_extremes")
+climate_tiles = lazy_import("climate_tiles")
+
+from response_cache import ResponseCache, normalize_text
+import log_parser
+import agent_router
+import emission_factors
+import metrics
+import single_flight
+import admission
+import content
+import payloads
+from metrics import stage, MetricsMiddleware
+from points_ledger import PointsLedger, GLOBAL as GLOBAL_BOARD, school_board, week_board
+from activity_ledger import ActivityLedger, CATEGORIES as ACTIVITY_CATEGORIES
+from local_days import local_day, bucket_of, first_day, parse_ts
+
 # ---------- Config ----------
-SUPPORTED = {"en","hi"}  # per doc: English + Hindi (extend later)
-DEFAULT_LANG = "en"
+# Languages come from the content bundle (content_source.json / content.py)
+SUPPORTED = content.SUPPORTED
+DEFAULT_LANG = content.SOURCE_LANG
 
+# Checked when an LLM route first needs the client, so the other routes work without a key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise RuntimeError("OPENAI_API_KEY missing. Put it in .env or export it.")
-client = OpenAI(api_key=OPENAI_API_KEY)
-def chat(messages, tools=None):
+
+# APP_PRELOAD=1 imports the climate stack and builds the OpenAI client at
+# startup instead of on first use (e.g. with `gunicorn --preload`)
+APP_PRELOAD = os.getenv("APP_PRELOAD", "0") == "1"
+
+# LLM calls run on the event loop (no threadpool worker held per call) through
+# one pooled HTTP client. LLM_MAX_CONCURRENCY caps in-flight model calls per
+# worker; LLM_TIMEOUT_S bounds each call including time spent waiting for a slot
+# (less if the request's admission deadline is closer, see admission.py).
+# OPENAI_BASE_URL (read by the SDK) can point at a local stub for load tests.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "32"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+http_client: Optional[httpx.AsyncClient] = None
+client = None  # AsyncOpenAI, built by get_client()
+
+def get_client():
+    """The shared AsyncOpenAI client; imports the SDK and opens the pool on first use."""
+    global client, http_client
+    if client is None:
+        if not OPENAI_API_KEY:
+            raise HTTPException(503, "OPENAI_API_KEY missing. Put it in .env or export it.")
+        from openai import AsyncOpenAI
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=60,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT_S, connect=5.0),
+        )
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=LLM_MAX_RETRIES)
+    return client
+
+# Per call site (chat, extract_activity_factors, ...): calls by outcome,
+# tokens, time waiting for a slot and model latency; see /metrics
+LLM_CALLS = metrics.counter("eco_llm_calls_total", "LLM calls by call site and outcome", ("site", "outcome"))
+LLM_TOKENS = metrics.counter("eco_llm_tokens_total", "LLM tokens by call site", ("site", "kind"))
+LLM_SECONDS = metrics.histogram("eco_llm_seconds", "LLM call latency (slot held) by call site", ("site",))
+LLM_WAIT_SECONDS = metrics.histogram("eco_llm_slot_wait_seconds", "Time waiting for an LLM slot", ("site",))
+
+def llm_outcome(e: BaseException) -> str:
+    return "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+
+def count_tokens(site: str, usage) -> None:
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, site=site, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, site=site, kind="completion")
+
+def call_timeout(timeout: Optional[float]) -> float:
+    """Per-call timeout, capped at what is left of the admitted request's deadline."""
+    timeout = timeout or LLM_TIMEOUT_S
+    left = admission.remaining()
+    return timeout if left is None else max(0.0, min(timeout, left))
+
+async def llm(timeout: Optional[float] = None, site: str = "other", **kwargs):
+    """Chat Completions call behind the global concurrency limit and a per-call deadline."""
+    timeout = call_timeout(timeout)
+    t0 = time.perf_counter()
+
+    async def call():
+        async with llm_slots:
+            t_slot = time.perf_counter()
+            LLM_WAIT_SECONDS.observe(t_slot - t0, site=site)
+            try:
+                return await get_client().chat.completions.create(timeout=timeout, **kwargs)
+            finally:
+                LLM_SECONDS.observe(time.perf_counter() - t_slot, site=site)
+
+    try:
+        resp = await asyncio.wait_for(call(), timeout)
+    except BaseException as e:
+        LLM_CALLS.inc(site=site, outcome=llm_outcome(e))
+        raise
+    finally:
+        metrics.record(f"llm:{site}", time.perf_counter() - t0)
+    LLM_CALLS.inc(site=site, outcome="ok")
+    count_tokens(site, getattr(resp, "usage", None))
+    return resp
+
+async def chat(messages, tools=None):
     """Wrapper around Chat Completions with optional tools."""
-    return client.chat.completions.create(
+    return await llm(
+        site="chat",
         model="gpt-4o-mini",
         messages=messages,
         tools=tools or None,
@@ -51,9 +150,142 @@ def chat(messages, tools=None):
     )
 
 
+async def llm_stream_chunks(timeout: Optional[float] = None, site: str = "other", **kwargs):
+    """Streaming Chat Completions; yields raw chunks and holds an LLM slot until the stream ends."""
+    timeout = call_timeout(timeout)
+    t0 = time.perf_counter()
+    try:
+        await asyncio.wait_for(llm_slots.acquire(), timeout)
+    except BaseException as e:
+        LLM_CALLS.inc(site=site, outcome=llm_outcome(e))
+        raise
+    t_slot = time.perf_counter()
+    LLM_WAIT_SECONDS.observe(t_slot - t0, site=site)
+    outcome = "error"
+    try:
+        stream = await get_client().chat.completions.create(stream=True, timeout=timeout, **kwargs)
+        async for chunk in stream:
+            count_tokens(site, getattr(chunk, "usage", None))
+            yield chunk
+        outcome = "ok"
+    finally:
+        llm_slots.release()
+        LLM_SECONDS.observe(time.perf_counter() - t_slot, site=site)
+        LLM_CALLS.inc(site=site, outcome=outcome)
+        metrics.record(f"llm:{site}", time.perf_counter() - t0)
+
+async def llm_stream(timeout: Optional[float] = None, site: str = "other", **kwargs):
+    """Content deltas of a streaming Chat Completions call."""
+    async for chunk in llm_stream_chunks(timeout=timeout, site=site, **kwargs):
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+LOGS_ANALYZE_STRATEGY = os.getenv("LOGS_ANALYZE_STRATEGY", "two_call")
+
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "*")
 
-app = FastAPI(title="EcoLearn+ India — Carbon Prototype", version="0.1.0")
+# Cache of LLM answers for /explain and /missions/generate. Bump a prompt
+# version whenever its system prompt changes so old answers stop matching.
+EXPLAIN_PROMPT_VERSION = "explain-v1"
+MISSIONS_PROMPT_VERSION = "missions-v1"
+response_cache = ResponseCache(
+    max_items=int(os.getenv("RESPONSE_CACHE_MAX_ITEMS", "2048")),
+    ttl_s=float(os.getenv("RESPONSE_CACHE_TTL_S", str(24 * 3600))),
+    db_path=os.getenv("RESPONSE_CACHE_DB") or None,
+    max_db_items=int(os.getenv("RESPONSE_CACHE_MAX_DB_ITEMS", "100000")),
+)
+
+# Identical work already in flight is shared instead of repeated (see
+# single_flight.py); each group's key says which arguments make two calls the same
+explain_flight = single_flight.Group("explain", key=lambda cache_key, lang, question, budget: cache_key)
+missions_flight = single_flight.Group("generate_missions", key=lambda cache_key, lang, system, user_content: cache_key)
+extract_flight = single_flight.Group(
+    "extract_activity_factors",
+    key=lambda text, lang: (normalize_text(text), lang, emission_factors.current().version),
+)
+india_temp_flight = single_flight.Group(
+    "india_temp", key=lambda variable, scenario, model, refresh: (variable, scenario, model, refresh))
+ensemble_flight = single_flight.Group(
+    "india_ensemble",
+    key=lambda variable, scenario, models, start_year, end_year, refresh:
+        (variable, scenario, tuple(models), start_year, end_year, refresh),
+)
+heat_flight = single_flight.Group("india_heat", key=lambda *args, refresh: (*args, refresh))
+tiles_flight = single_flight.Group("india_tiles", key=lambda *args: args)
+
+# Admission control for the LLM-bound routes (see admission.py): when a
+# route's queue is full or a request can't finish within its deadline, it is
+# answered from the route's fallback path at once and flagged "degraded".
+# Clients may send X-Priority (high|normal|low) and X-Deadline-Ms.
+explain_gate = admission.register(admission.Gate.from_env("explain", slots=16, queue=64, deadline_s=10, service_s=1))
+logs_gate = admission.register(admission.Gate.from_env("logs_analyze", slots=16, queue=64, deadline_s=15, service_s=2))
+agent_gate = admission.register(admission.Gate.from_env("agent", slots=8, queue=32, deadline_s=30, service_s=3))
+
+def degrade(gate: admission.Gate, response: Optional[Response], reason: str) -> Dict[str, Any]:
+    """Count a fallback answer and flag it (X-Degraded header + the body's "degraded" field)."""
+    gate.record_degraded(reason)
+    if response is not None:
+        response.headers["X-Degraded"] = reason
+    return {"reason": reason}
+
+def fallback_reason() -> str:
+    """Why an admitted request's LLM step fell back: its deadline ran out, or the call failed."""
+    return "deadline_exceeded" if admission.expired() else "llm_error"
+
+# Per-user activity history (/analyze and /logs/analyze with an X-User-Id
+# header); off unless ACTIVITY_DB names a SQLite file
+ACTIVITY_DB = os.getenv("ACTIVITY_DB", "")
+activity_ledger = ActivityLedger(ACTIVITY_DB) if ACTIVITY_DB else None
+
+def record_activity(user_id: Optional[str], analysis: Dict[str, Any], source: str) -> None:
+    if not user_id or activity_ledger is None:
+        return
+    try:
+        with stage("ledger"):
+            activity_ledger.record(user_id, analysis, source=source)
+    except Exception as e:
+        # history is best-effort; never fail the analysis because of it
+        print(f"[activity] record failed: {e}")
+
+# Mission completions and leaderboards (/points/complete, /leaderboard);
+# off unless POINTS_DB names a SQLite file. Boards are snapshotted to POINTS_SNAPSHOT
+# every POINTS_SNAPSHOT_INTERVAL_S seconds when they changed.
+POINTS_DB = os.getenv("POINTS_DB", "")
+POINTS_SNAPSHOT = os.getenv("POINTS_SNAPSHOT", f"{POINTS_DB}.snapshot" if POINTS_DB else "")
+points_ledger = PointsLedger(POINTS_DB, POINTS_SNAPSHOT or None) if POINTS_DB else None
+
+def require_points_ledger() -> PointsLedger:
+    if points_ledger is None:
+        raise HTTPException(404, "Points ledger is disabled (POINTS_DB is not set).")
+    return points_ledger
+
+def wants_fresh(fresh: bool, cache_control: Optional[str]) -> bool:
+    """?fresh=true or `Cache-Control: no-cache` skips the cache lookup (result is still stored)."""
+    return fresh or "no-cache" in (cache_control or "").lower()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if APP_PRELOAD:
+        preload(np, climate, climate_pipeline, climate_extremes, nc_partial, region_masks, climate.xr, climate.s3fs)
+        if OPENAI_API_KEY:
+            get_client()
+    watcher = asyncio.create_task(emission_factors.watch(EF_RELOAD_INTERVAL_S))
+    snapshots = asyncio.create_task(points_ledger.watch()) if points_ledger is not None else None
+    yield
+    watcher.cancel()
+    if snapshots is not None:
+        snapshots.cancel()
+        try:
+            await asyncio.to_thread(points_ledger.snapshot)
+        except Exception as e:
+            print(f"[points] snapshot failed: {e}")
+    if http_client is not None:
+        await http_client.aclose()
+    if is_loaded(climate_pipeline):
+        climate_pipeline.shutdown()
+
+app = FastAPI(title="EcoLearn+ India — Carbon Prototype", version="0.1.0", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[FRONTEND_ORIGIN] if FRONTEND_ORIGIN != "*" else ["*"],
@@ -61,33 +293,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# outermost, so latency includes CORS and the time to stream the body
+app.add_middleware(MetricsMiddleware)
 
 # ---------- Missions (static) ----------
 MISSIONS: Dict[str, Dict[str, Any]] = {
-    "m_walk":  {"title": "Walk instead of short car trip",     "points": 40, "co2_saving_kg": 0.15},
-    "m_trans": {"title": "Use public transport today",         "points": 60, "co2_saving_kg": 0.5},
-    "m_veg":   {"title": "Eat a vegetarian meal",              "points": 20, "co2_saving_kg": 2.0},
-    "m_bag":   {"title": "Carry a reusable bag",               "points": 15, "co2_saving_kg": 0.05},
-    "m_idle":  {"title": "Turn off idle appliances",           "points": 25, "co2_saving_kg": 0.1},
+    "m_walk":  {"title": "Walk instead of short car trip",     "category": "transport", "points": 40, "co2_saving_kg": 0.15},
+    "m_trans": {"title": "Use public transport today",         "category": "transport", "points": 60, "co2_saving_kg": 0.5},
+    "m_veg":   {"title": "Eat a vegetarian meal",              "category": "food",      "points": 20, "co2_saving_kg": 2.0},
+    "m_bag":   {"title": "Carry a reusable bag",               "category": "waste",     "points": 15, "co2_saving_kg": 0.05},
+    "m_idle":  {"title": "Turn off idle appliances",           "category": "energy",    "points": 25, "co2_saving_kg": 0.1},
 }
 
-# ---------- Emission factors (from document + simple defaults) ----------
-# Transport (kg CO2e per km)
-EF_PETROL_CAR = 0.24
-EF_BUS = 0.05
-EF_ECAR = 0.05
-EF_WALK_CYCLE = 0.0
-
-# Meals (kg CO2e per serving)
-EF_MEAT_MEAL = 2.5
-EF_VEG_MEAL = 0.5
-
-# Electricity (configurable via ENV; default if not given)
-EF_ELECTRICITY_KWH = float(os.getenv("EF_ELECTRICITY_KWH", "0.82"))
+# ---------- Emission factors ----------
+# Per-region, per-period factor tables live in emission_factors.json
+# (EMISSION_FACTORS_FILE) and are reloaded while the app runs; see
+# emission_factors.py. EF_ELECTRICITY_KWH / EF_LPG_KG / EF_WASTE_KG still
+# override the default region's values.
+EF_RELOAD_INTERVAL_S = emission_factors.RELOAD_INTERVAL_S
 
-# LPG / Waste (simple defaults; can be tuned later)
-EF_LPG_KG = float(os.getenv("EF_LPG_KG", "2.98"))
-EF_WASTE_KG = float(os.getenv("EF_WASTE_KG", "1.90"))
+# Generic tips returned with every analysis, per language in the content bundle
+DEFAULT_TIPS = content.table(DEFAULT_LANG).tips
 
 # Threat bands based ONLY on total CO2e for a period (arbitrary demo thresholds)
 THREAT_BANDS = [
@@ -107,9 +333,17 @@ class MissionGenerateRequest(BaseModel):
 class PointsCalcRequest(BaseModel):
     completed_missions: List[str]
 
+class PointsCompleteRequest(BaseModel):
+    completed_missions: List[str] = Field(..., min_length=1, max_length=50)
+    # joins (or moves the user to) that school's leaderboard
+    school: Optional[str] = Field(None, min_length=1, max_length=80)
+    # retries with the same id are credited once; without one, a mission
+    # counts once per user per local day
+    completion_id: Optional[str] = Field(None, min_length=1, max_length=64)
+
 class AnalyzeInput(BaseModel):
-    # transport
-    mode: Optional[Literal["petrol_car","bus","walk_cycle","electric_car"]] = None
+    # transport; any mode of the current factor table (petrol_car, bus, walk_cycle, electric_car, ...)
+    mode: Optional[str] = None
     distance_km: float = 0.0
     # meals
     meat_meals: int = 0
@@ -123,6 +357,56 @@ class AnalyzeInput(BaseModel):
     lang: Optional[str] = None
     # optional period label for threat calc
     period: str = "day"
+    # state/region for regional factors, e.g. "IN-MH" or "MH" (default: national)
+    region: Optional[str] = None
+
+    @field_validator("mode")
+    @classmethod
+    def known_mode(cls, v: Optional[str]) -> Optional[str]:
+        return emission_factors.current().check_mode(v)
+
+    @field_validator("region")
+    @classmethod
+    def known_region(cls, v: Optional[str]) -> Optional[str]:
+        return emission_factors.current().normalize_region(v)
+
+class AnalyzeColumns(BaseModel):
+    # columnar form of AnalyzeInput; every list must have the same length
+    mode: Optional[List[Optional[str]]] = None
+    distance_km: Optional[List[float]] = None
+    meat_meals: Optional[List[int]] = None
+    veg_meals: Optional[List[int]] = None
+    electricity_kwh: Optional[List[float]] = None
+    lpg_kg: Optional[List[float]] = None
+    waste_kg: Optional[List[float]] = None
+    period: Optional[List[str]] = None
+    region: Optional[List[Optional[str]]] = None
+
+    @field_validator("mode")
+    @classmethod
+    def known_modes(cls, v: Optional[List[Optional[str]]]) -> Optional[List[Optional[str]]]:
+        if v is not None:
+            table = emission_factors.current()
+            for m in set(v):
+                table.check_mode(m)
+        return v
+
+    @field_validator("region")
+    @classmethod
+    def known_regions(cls, v: Optional[List[Optional[str]]]) -> Optional[List[Optional[str]]]:
+        if v is None:
+            return v
+        table = emission_factors.current()
+        normalized = {r: table.normalize_region(r) for r in set(v)}
+        return [normalized[r] for r in v]
+
+class AnalyzeBatchRequest(BaseModel):
+    # send either `rows` (list of AnalyzeInput) or `columns`
+    rows: Optional[List[AnalyzeInput]] = None
+    columns: Optional[AnalyzeColumns] = None
+    # "rows" -> list of analyze_payload dicts; "columns" -> parallel arrays
+    format: Literal["rows","columns"] = "rows"
+    lang: Optional[str] = None
 
 class ExplainRequest(BaseModel):
     question: str
@@ -133,57 +417,97 @@ class AgentRequest(BaseModel):
     lang: Optional[str] = None
     emissions: Optional[AnalyzeInput] = None
     completed_missions: Optional[List[str]] = None
+    # optional per-request limits; capped by AGENT_MAX_ROUNDS / AGENT_TOKEN_BUDGET
+    max_rounds: Optional[int] = Field(None, ge=1)
+    token_budget: Optional[int] = Field(None, ge=1)
+    # "template": answer a routed task from templates, without any model call
+    answer: Literal["model", "template"] = "model"
+
+class MissionCandidate(BaseModel):
+    # e.g. a mission from /missions/generate
+    id: str = Field(..., min_length=1, max_length=80)
+    title: str = Field("", max_length=200)
+    category: Optional[str] = None
+    points: int = Field(..., ge=1, le=1000)
+    co2_saving_kg: float = Field(..., ge=0)
+
+class RecommendRequest(BaseModel):
+    routine: AnalyzeInput
+    # most points (effort) the picked missions may add up to; default no limit
+    budget_points: Optional[int] = Field(None, ge=1)
+    max_missions: int = Field(3, ge=1, le=20)
+    # considered along with MISSIONS
+    candidates: Optional[List[MissionCandidate]] = Field(None, max_length=10000)
+    lang: Optional[str] = None
+
+class RecommendBatchRequest(BaseModel):
+    # one routine per user, as `rows` or `columns` (same as /analyze/batch)
+    rows: Optional[List[AnalyzeInput]] = None
+    columns: Optional[AnalyzeColumns] = None
+    budget_points: Optional[int] = Field(None, ge=1)
+    max_missions: int = Field(3, ge=1, le=20)
+    candidates: Optional[List[MissionCandidate]] = Field(None, max_length=10000)
+    lang: Optional[str] = None
 
 class LogAnalyzeRequest(BaseModel):
     text: str = Field(..., min_length=3, max_length=1000)
     lang: Optional[str] = None
+    # "two_call": extraction then feedback; "single": one merged model call
+    # (default from LOGS_ANALYZE_STRATEGY)
+    strategy: Optional[Literal["two_call","single"]] = None
 
 # ---------- Helpers ----------
 def pick_lang(accept_language: Optional[str], explicit: Optional[str]) -> str:
+    """Language code for the request; content.table(code) is its precomputed text."""
     if explicit:
-        t = explicit.lower().split("-")[0]
-        return t if t in SUPPORTED else DEFAULT_LANG
+        return content.ALIASES.get(explicit.lower().split("-")[0], DEFAULT_LANG)
     if accept_language:
-        t = accept_language.split(",")[0].strip().lower().split("-")[0]
-        if t in SUPPORTED:
-            return t
+        return content.negotiate(accept_language) or DEFAULT_LANG
     return DEFAULT_LANG
 
-def transport_factor(mode: Optional[str]) -> float:
-    if mode == "petrol_car":
-        return EF_PETROL_CAR
-    if mode == "bus":
-        return EF_BUS
-    if mode == "electric_car":
-        return EF_ECAR
-    return EF_WALK_CYCLE
+# Routes that pick their language from Accept-Language must say so, or a shared
+# or browser cache could hand one language's body to a client asking for another
+LANG_VARY = ("Accept-Language",)
 
-def analyze_payload(a: AnalyzeInput) -> Dict[str, Any]:
+def vary_language(response: Response) -> None:
+    """Route dependency adding Vary: Accept-Language to a returned dict; Response objects set it themselves."""
+    response.headers["Vary"] = "Accept-Language"
+
+def threat_label(total: float) -> str:
+    for lo, hi, name in THREAT_BANDS:
+        if lo <= total < hi: return name
+    return "Low"
+
+def mode_column(table: emission_factors.FactorTable, mode: Optional[str]) -> int:
+    col = table.mode_column.get(mode)
+    if col is None:
+        # validated against an older table that still had this mode
+        raise ValueError(f"unknown mode '{mode}' in factor table {table.version}")
+    return col
+
+def analyze_payload(a: AnalyzeInput, day: Optional[int] = None, lang: str = DEFAULT_LANG) -> Dict[str, Any]:
+    """CO2e breakdown with the factors in effect on local `day` (default today) for a.region; tips in `lang`."""
+    table = emission_factors.current()  # one snapshot for the whole computation
+    f = table.row(a.region, day)
     # Transport
-    t_kg = transport_factor(a.mode) * max(0.0, a.distance_km)
+    col = table.mode_column.get(a.mode)
+    if col is None:
+        col = mode_column(table, a.mode)  # raises: mode validated against an older table
+    t_kg = f[col] * max(0.0, a.distance_km)
     # Meals
-    meals_kg = a.meat_meals * EF_MEAT_MEAL + a.veg_meals * EF_VEG_MEAL
+    meals_kg = a.meat_meals * f[0] + a.veg_meals * f[1]
     # Energy
-    elec_kg = a.electricity_kwh * EF_ELECTRICITY_KWH
-    lpg_kg = a.lpg_kg * EF_LPG_KG
+    elec_kg = a.electricity_kwh * f[2]
+    lpg_kg = a.lpg_kg * f[3]
     # Waste
-    waste_kg = a.waste_kg * EF_WASTE_KG
+    waste_kg = a.waste_kg * f[4]
 
     total = round(t_kg + meals_kg + elec_kg + lpg_kg + waste_kg, 2)
 
     # Threat level from CO2e only
-    label = "Low"
-    for lo, hi, name in THREAT_BANDS:
-        if lo <= total < hi: label = name; break
-
-    tips = [
-        "Prefer walking/cycling for short trips",
-        "Use public transport for commuting",
-        "Try a vegetarian meal today",
-        "Set AC to 24–26°C and use fans",
-        "Unplug idle chargers",
-        "Carry a reusable bag and bottle",
-    ]
+    label = threat_label(total)
+
+    tips = list(content.table(lang).tips)
 
     return {
         "breakdown": {
@@ -197,8 +521,102 @@ def analyze_payload(a: AnalyzeInput) -> Dict[str, Any]:
         "threat": label,
         "advice": tips,
         "period": a.period,
+        "factors_version": table.version,
     }
 
+# ---------- Batch analysis (vectorized) ----------
+@functools.lru_cache(maxsize=None)
+def batch_tables() -> Tuple["np.ndarray", "np.ndarray"]:
+    """(threat band edges, threat labels), built on first batch call."""
+    # Band edges for searchsorted; assumes THREAT_BANDS are contiguous and sorted.
+    # Totals outside [first lo, last hi) fall back to "Low", same as analyze_payload.
+    threat_edges = np.array([lo for lo, _, _ in THREAT_BANDS] + [THREAT_BANDS[-1][1]], dtype=np.float64)
+    threat_labels = np.array(["Low"] + [name for _, _, name in THREAT_BANDS] + ["Low"], dtype=object)
+    return threat_edges, threat_labels
+
+BATCH_FIELDS = ("distance_km", "meat_meals", "veg_meals", "electricity_kwh", "lpg_kg", "waste_kg")
+
+def _round2(x: "np.ndarray") -> "np.ndarray":
+    """np.round(x, 2) that agrees with Python's round() on half-way ties."""
+    out = np.round(x, 2)
+    scaled = x * 100.0
+    tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if tie.any():
+        out[tie] = [round(float(v), 2) for v in x[tie]]
+    return out
+
+def analyze_batch(columns: Dict[str, Any], n: int) -> Dict[str, Any]:
+    """
+    Vectorized analyze_payload over n rows given as columns (missing columns use
+    AnalyzeInput defaults). Returns numpy arrays; see batch_rows() for row dicts.
+    """
+    def col(name: str, default: float) -> "np.ndarray":
+        v = columns.get(name)
+        if v is None:
+            return np.full(n, default, dtype=np.float64)
+        return np.asarray(v, dtype=np.float64)
+
+    threat_edges, threat_labels = batch_tables()
+    table = emission_factors.current()
+    factors = table.matrix(table.period_at())  # (regions, columns)
+    modes = columns.get("mode")
+    if modes is None:
+        cols = np.full(n, table.mode_column[None], dtype=np.intp)
+    else:
+        cols = np.fromiter((mode_column(table, m) for m in modes), dtype=np.intp, count=n)
+    regions = columns.get("region")
+    if regions is None:
+        f = factors[0]  # default region for every row
+        mode_f = f[cols]
+    else:
+        rcodes = np.fromiter((table.region_index.get(r, 0) if r else 0 for r in regions), dtype=np.intp, count=n)
+        f = factors[rcodes].T  # f[k] is column k for every row
+        mode_f = factors[rcodes, cols]
+
+    # Same operation order as analyze_payload so float results are identical
+    t_kg = mode_f * np.maximum(0.0, col("distance_km", 0.0))
+    meals_kg = col("meat_meals", 0) * f[0] + col("veg_meals", 0) * f[1]
+    elec_kg = col("electricity_kwh", 0.0) * f[2]
+    lpg_kg = col("lpg_kg", 0.0) * f[3]
+    waste_kg = col("waste_kg", 0.0) * f[4]
+
+    total = _round2(t_kg + meals_kg + elec_kg + lpg_kg + waste_kg)
+    threat = threat_labels[np.searchsorted(threat_edges, total, side="right")]
+
+    periods = columns.get("period")
+    return {
+        "breakdown": {
+            "transport_kg": _round2(t_kg),
+            "meals_kg": _round2(meals_kg),
+            "electricity_kg": _round2(elec_kg),
+            "lpg_kg": _round2(lpg_kg),
+            "waste_kg": _round2(waste_kg),
+        },
+        "total_kg": total,
+        "threat": threat,
+        "period": list(periods) if periods is not None else ["day"] * n,
+        "factors_version": table.version,
+    }
+
+def batch_rows(batch: Dict[str, Any], advice: List[str]) -> List[Dict[str, Any]]:
+    """Expand analyze_batch() output into analyze_payload-shaped dicts."""
+    keys = list(batch["breakdown"].keys())
+    version = batch["factors_version"]
+    cols = [batch["breakdown"][k].tolist() for k in keys]
+    return [
+        {
+            "breakdown": dict(zip(keys, vals)),
+            "total_kg": total,
+            "threat": threat,
+            "advice": advice,
+            "period": period,
+            "factors_version": version,
+        }
+        for *vals, total, threat, period in zip(
+            *cols, batch["total_kg"].tolist(), batch["threat"].tolist(), batch["period"]
+        )
+    ]
+
 # ---------- Log helpers ----------
 DEFAULT_ACTIVITY_FACTORS: Dict[str, Any] = {
     "mode": "petrol_car",
@@ -210,23 +628,30 @@ DEFAULT_ACTIVITY_FACTORS: Dict[str, Any] = {
     "waste_kg": 0.0,
     "period": "day",
 }
+ACTIVITY_FACTOR_KEYS = set(DEFAULT_ACTIVITY_FACTORS)
 
-def extract_activity_factors(text: str, lang: str) -> Dict[str, Any]:
+async def extract_activity_factors(text: str, lang: str) -> Dict[str, Any]:
     """
     Use OpenAI to convert a free-text daily log into AnalyzeInput-compatible fields.
+    Identical logs (after normalize_text) in flight at once share one call.
     """
-    lang_name = "Hindi" if lang == "hi" else "English"
+    factors, _ = await extract_flight.do(_extract_activity_factors, text, lang)
+    return dict(factors)
+
+async def _extract_activity_factors(text: str, lang: str) -> Dict[str, Any]:
+    lang_name = content.table(lang).name
     system = (
         f"You convert daily activity notes into carbon analysis inputs for India. "
         f"Respond ONLY in JSON. Use kilometers for distance and kilograms for weights. "
-        f"Return keys: mode (petrol_car, bus, walk_cycle, electric_car), distance_km, meat_meals, veg_meals, "
+        f"Return keys: mode ({', '.join(emission_factors.current().modes)}), distance_km, meat_meals, veg_meals, "
         f"electricity_kwh, lpg_kg, waste_kg, period. "
         f"If information is missing set numeric fields to 0 and leave period as 'day'. "
         f"Respond in {lang_name} only when meaningful, but keep JSON keys in English."
     )
     user = json.dumps({"activity": text}, ensure_ascii=False)
 
-    resp = client.chat.completions.create(
+    resp = await llm(
+        site="extract_activity_factors",
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system},
@@ -236,20 +661,81 @@ def extract_activity_factors(text: str, lang: str) -> Dict[str, Any]:
         temperature=0.2,
     )
     data = json.loads(resp.choices[0].message.content or "{}")
-    allowed = {
-        "mode",
-        "distance_km",
-        "meat_meals",
-        "veg_meals",
-        "electricity_kwh",
-        "lpg_kg",
-        "waste_kg",
-        "period",
-    }
-    factors = {k: data[k] for k in allowed if k in data}
+    factors = {k: data[k] for k in ACTIVITY_FACTOR_KEYS if k in data}
     return factors
 
-def build_feedback_and_tips(
+def merge_factors(extracted: Dict[str, Any]) -> Dict[str, Any]:
+    factors = DEFAULT_ACTIVITY_FACTORS.copy()
+    for key, value in extracted.items():
+        if value is not None:
+            factors[key] = value
+    return factors
+
+async def resolve_activity_factors(
+    text: str,
+    lang: str,
+    parsed: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Factors for a free-text log. The rule-based parser runs first; the LLM is
+    only called when its confidence is below log_parser.MIN_CONFIDENCE.
+    extraction["path"] is "rules", "llm" or "rules_fallback" (LLM failed).
+    """
+    parsed = parsed or log_parser.parse_activity(text)
+    extraction = {"path": "rules", "confidence": parsed["confidence"]}
+    extracted = parsed["factors"]
+    if parsed["confidence"] < log_parser.MIN_CONFIDENCE:
+        try:
+            extracted = await extract_activity_factors(text, lang)
+            extraction["path"] = "llm"
+        except Exception as e:
+            # fall back to whatever the rules found but log the error for debugging
+            print(f"[logs/analyze] factor extraction failed: {e}")
+            extraction["path"] = "rules_fallback"
+    return merge_factors(extracted), extraction
+
+async def extract_factors_and_feedback(text: str, lang: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    One model call that returns both the AnalyzeInput fields and the
+    feedback/tips (used by strategy="single"). The feedback can't see the
+    computed totals, which the two-call prompt forbids quoting anyway.
+    """
+    lang_name = content.table(lang).name
+    system = (
+        f"You are EcoLearn+ India, a climate coach. You convert a daily activity note into carbon "
+        f"analysis inputs and give short feedback. Respond ONLY in JSON. "
+        f"Return keys: mode ({', '.join(emission_factors.current().modes)}), distance_km, meat_meals, veg_meals, "
+        f"electricity_kwh, lpg_kg, waste_kg, period, feedback (string) and tips (array of 1-3 short strings). "
+        f"Use kilometers for distance and kilograms for weights. If information is missing set numeric "
+        f"fields to 0 and leave period as 'day'. Keep JSON keys in English. "
+        f"Write feedback and tips in {lang_name}; reference the user's action directly, stay supportive, "
+        f"suggest actionable alternatives suitable for India, do not mention specific carbon numbers, "
+        f"and keep each string under 28 words."
+    )
+    resp = await llm(
+        site="extract_factors_and_feedback",
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": json.dumps({"activity": text}, ensure_ascii=False)},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.2,
+    )
+    data = json.loads(resp.choices[0].message.content or "{}")
+    factors = {k: data[k] for k in ACTIVITY_FACTOR_KEYS if k in data}
+    return factors, clean_feedback(data)
+
+def clean_feedback(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "feedback": (data.get("feedback") or "").strip(),
+        "tips": [tip.strip() for tip in data.get("tips", []) if isinstance(tip, str) and tip.strip()],
+    }
+
+def fallback_feedback(text: str, lang: str) -> str:
+    return content.table(lang).text("feedback.fallback", text=text.strip())
+
+async def build_feedback_and_tips(
     text: str,
     lang: str,
     analysis: Dict[str, Any],
@@ -258,7 +744,7 @@ def build_feedback_and_tips(
     """
     Generate short feedback and tips tailored to the user's log.
     """
-    lang_name = "Hindi" if lang == "hi" else "English"
+    lang_name = content.table(lang).name
     payload = {
         "activity": text,
         "analysis": {
@@ -276,7 +762,8 @@ def build_feedback_and_tips(
         f"Tips must be actionable alternatives suitable for India. "
         f"Do not mention specific carbon numbers. Each string must stay under 28 words."
     )
-    resp = client.chat.completions.create(
+    resp = await llm(
+        site="build_feedback_and_tips",
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system},
@@ -286,22 +773,85 @@ def build_feedback_and_tips(
         temperature=0.3,
     )
     data = json.loads(resp.choices[0].message.content or "{}")
-    return {
-        "feedback": data.get("feedback", "").strip(),
-        "tips": [tip.strip() for tip in data.get("tips", []) if isinstance(tip, str) and tip.strip()],
+    return clean_feedback(data)
+
+async def stream_feedback_and_tips(
+    text: str,
+    lang: str,
+    analysis: Dict[str, Any],
+    factors: Dict[str, Any],
+):
+    """
+    Streaming variant of build_feedback_and_tips(): yields text deltas of
+    "feedback line, then one '- tip' per line"; parse with parse_streamed_feedback().
+    """
+    lang_name = content.table(lang).name
+    payload = {
+        "activity": text,
+        "analysis": {
+            "threat": analysis.get("threat"),
+            "total_kg": analysis.get("total_kg"),
+            "period": analysis.get("period"),
+            "breakdown": analysis.get("breakdown", {}),
+        },
+        "factors": factors,
     }
+    system = (
+        f"You are EcoLearn+ India, a climate coach. Write in {lang_name}. "
+        f"First line: one supportive feedback sentence that references the user's action directly. "
+        f"Then 1-3 lines, each starting with '- ', with actionable alternatives suitable for India. "
+        f"No other text. Do not mention specific carbon numbers. Each line must stay under 28 words."
+    )
+    async for delta in llm_stream(
+        site="stream_feedback_and_tips",
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+        ],
+        temperature=0.3,
+    ):
+        yield delta
+
+def parse_streamed_feedback(text: str) -> Dict[str, Any]:
+    lines = [l.strip() for l in text.splitlines() if l.strip()]
+    feedback = [l for l in lines if not l.startswith(("-", "•", "*"))]
+    tips = [l.lstrip("-•* ").strip() for l in lines if l.startswith(("-", "•", "*"))]
+    return {"feedback": " ".join(feedback), "tips": [t for t in tips if t][:3]}
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {payloads.dumps(data).decode()}\n\n"
 
 # ---------- Routes ----------
-@app.get("/missions")
-def missions():
-    return {"missions": [{"id": k, **v} for k,v in MISSIONS.items()]}
+# /missions bodies per language, encoded once with the titles from the content bundle
+MISSION_LISTS = {
+    code: payloads.payload({"lang": code, "missions": [{"id": k, **v, "title": t.strings.get(f"mission.{k}", v["title"])}
+                                                       for k, v in MISSIONS.items()]})
+    for code, t in content.TABLES.items()
+}
+# climate responses built from cached results (series cache entries are never mutated)
+climate_payloads = payloads.Memo()
 
-@app.post("/missions/generate")
-def generate_missions(req: MissionGenerateRequest, accept_language: Optional[str] = Header(None)):
+@app.get("/missions")
+def missions(
+    request: Request,
+    accept_language: Optional[str] = Header(None),
+    lang: Optional[str] = Query(None, description="language code; default from Accept-Language"),
+):
+    return payloads.respond(request, MISSION_LISTS[pick_lang(accept_language, lang)], vary=LANG_VARY)
+
+@app.post("/missions/generate", dependencies=[Depends(vary_language)])
+async def generate_missions(
+    req: MissionGenerateRequest,
+    response: Response,
+    accept_language: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
+    fresh: bool = Query(False, description="skip the cache and generate new missions"),
+):
     lang = pick_lang(accept_language, req.lang)
 
     # Map language code to label for clear instructions
-    lang_name = "Hindi" if lang == "hi" else "English"
+    lang_name = content.table(lang).name
 
     system = (
         f"You create short, practical eco-missions for Indian users. "
@@ -317,7 +867,28 @@ def generate_missions(req: MissionGenerateRequest, accept_language: Optional[str
         "difficulty": req.difficulty or "easy"
     }
 
-    resp = client.chat.completions.create(
+    cache_key = ResponseCache.make_key(
+        MISSIONS_PROMPT_VERSION, lang, req.n,
+        sorted({normalize_text(c) for c in user_content["categories"]}),
+        normalize_text(user_content["difficulty"]),
+    )
+    if wants_fresh(fresh, cache_control):
+        response_cache.bypass()
+        response.headers["X-Cache"] = "bypass"
+    else:
+        cached, status = await response_cache.aget(cache_key)
+        response.headers["X-Cache"] = status
+        if cached is not None:
+            return cached
+
+    result, shared = await missions_flight.do(ask_missions, cache_key, lang, system, user_content)
+    if shared:
+        response.headers["X-Coalesced"] = "true"
+    return result
+
+async def ask_missions(cache_key: str, lang: str, system: str, user_content: Dict[str, Any]) -> Dict[str, Any]:
+    resp = await llm(
+        site="generate_missions",
         model="gpt-4o-mini",
         messages=[
             {"role": "system", "content": system},
@@ -327,7 +898,64 @@ def generate_missions(req: MissionGenerateRequest, accept_language: Optional[str
     )
 
     missions = json.loads(resp.choices[0].message.content)
-    return {"lang": lang, **missions}
+    result = {"lang": lang, **missions}
+    await response_cache.aput(cache_key, result)
+    return result
+
+# ---------- Mission recommendations ----------
+@functools.lru_cache(maxsize=None)
+def mission_catalog() -> "recommender.Catalog":
+    """MISSIONS as a recommender catalog, built on first use."""
+    return recommender.Catalog([{"id": k, **v} for k, v in MISSIONS.items()])
+
+def recommend_catalog(candidates: Optional[List[MissionCandidate]]) -> "recommender.Catalog":
+    if not candidates:
+        return mission_catalog()
+    return mission_catalog().extend([c.model_dump() for c in candidates])
+
+def recommendation(picked: List[Tuple[Dict[str, Any], float]], titles: content.Table) -> Dict[str, Any]:
+    missions = [
+        {**m, "title": titles.strings.get(f"mission.{m['id']}", m.get("title", "")), "est_saving_kg": round(kg, 3)}
+        for m, kg in picked
+    ]
+    return {
+        "missions": missions,
+        "points": sum(m["points"] for m in missions),
+        "est_saving_kg": round(sum(kg for _, kg in picked), 3),
+    }
+
+@app.post("/missions/recommend", dependencies=[Depends(vary_language)])
+def recommend_missions(req: RecommendRequest, accept_language: Optional[str] = Header(None)):
+    """
+    Missions (MISSIONS plus any `candidates`) with the largest estimated
+    saving for this routine within `budget_points`; see recommender.py.
+    """
+    lang = pick_lang(accept_language, req.lang or req.routine.lang)
+    analysis = analyze_payload(req.routine, lang=lang)
+    catalog = recommend_catalog(req.candidates)
+    with stage("recommend"):
+        kg = recommender.category_kg(analysis["breakdown"], analysis["total_kg"])
+        picks, gains = recommender.recommend(catalog, kg, req.budget_points, req.max_missions)
+    picked = recommender.selections(catalog, picks, gains)[0]
+    return {"lang": lang, "total_kg": analysis["total_kg"], "threat": analysis["threat"],
+            "budget_points": req.budget_points, **recommendation(picked, content.table(lang))}
+
+@app.post("/missions/recommend/batch", dependencies=[Depends(vary_language)])
+def recommend_missions_batch(req: RecommendBatchRequest, accept_language: Optional[str] = Header(None)):
+    """/missions/recommend for many routines at once (one vectorized pass, same budget for each)."""
+    lang = pick_lang(accept_language, req.lang)
+    columns, n = batch_columns(req.rows, req.columns)
+    batch = analyze_batch(columns, n)
+    catalog = recommend_catalog(req.candidates)
+    with stage("recommend"):
+        kg = recommender.category_kg(batch["breakdown"], batch["total_kg"])
+        picks, gains = recommender.recommend(catalog, kg, req.budget_points, req.max_missions)
+    titles = content.table(lang)
+    results = [
+        {"total_kg": total, **recommendation(picked, titles)}
+        for total, picked in zip(batch["total_kg"].tolist(), recommender.selections(catalog, picks, gains))
+    ]
+    return {"lang": lang, "count": n, "budget_points": req.budget_points, "results": results}
 
 
 @app.post("/points/calc")
@@ -337,68 +965,272 @@ def points_calc(req: PointsCalcRequest):
     invalid = [m for m in req.completed_missions if m not in MISSIONS]
     return {"awarded_points": points, "accepted": valid, "invalid": invalid}
 
-@app.post("/analyze")
-def analyze(a: AnalyzeInput, accept_language: Optional[str] = Header(None)):
+@app.post("/points/complete")
+def points_complete(
+    req: PointsCompleteRequest,
+    x_user_id: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """
+    Record completed missions for X-User-Id in the points ledger and return
+    what was credited plus the user's standing. `duplicates` were already
+    credited (same completion_id / Idempotency-Key, or same mission today).
+    """
+    ledger = require_points_ledger()
+    if not x_user_id:
+        raise HTTPException(400, "X-User-Id header is required")
+    valid = [m for m in dict.fromkeys(req.completed_missions) if m in MISSIONS]
+    invalid = [m for m in req.completed_missions if m not in MISSIONS]
+    with stage("points"):
+        new = ledger.record(x_user_id, [(m, MISSIONS[m]["points"]) for m in valid],
+                            completion_id=req.completion_id or idempotency_key, school=req.school)
+    accepted = [m for m, ok in zip(valid, new) if ok]
+    return {
+        "awarded_points": sum(MISSIONS[m]["points"] for m in accepted),
+        "accepted": accepted,
+        "duplicates": [m for m, ok in zip(valid, new) if not ok],
+        "invalid": invalid,
+        "standing": user_standing(ledger, x_user_id),
+    }
+
+def user_standing(ledger: PointsLedger, user_id: str) -> Dict[str, Any]:
+    """{global, school, week}: rank, points and board size (None where the user isn't ranked)."""
+    school = ledger.school_of(user_id)
+    boards = {"global": GLOBAL_BOARD, "week": week_board(local_day(time.time()))}
+    if school:
+        boards["school"] = school_board(school)
+    found = ledger.standing(user_id, list(boards.values()))
+    return {"school_name": school, "school": None, **{k: found[b] for k, b in boards.items()}}
+
+@app.get("/leaderboard")
+def leaderboard(
+    board: Literal["global","school","week"] = "global",
+    school: Optional[str] = Query(None, description="required for board=school"),
+    week: Optional[dt.date] = Query(None, description="any day of the week (default: this week)"),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+):
+    """Top `limit` users after `offset` on one board; tied users share a rank."""
+    ledger = require_points_ledger()
+    if board == "school":
+        if not school:
+            raise HTTPException(400, "school is required for board=school")
+        name = school_board(school)
+    elif board == "week":
+        name = week_board((week - dt.date(1970, 1, 1)).days if week else local_day(time.time()))
+    else:
+        name = GLOBAL_BOARD
+    return ledger.top(name, limit, offset)
+
+@app.get("/users/{user_id}/rank")
+def user_rank(user_id: str):
+    return {"user_id": user_id, **user_standing(require_points_ledger(), user_id)}
+
+@app.get("/points/stats")
+def points_stats():
+    if points_ledger is None:
+        return {"enabled": False}
+    return {"enabled": True, **points_ledger.stats()}
+
+@app.post("/analyze", dependencies=[Depends(vary_language)])
+def analyze(
+    a: AnalyzeInput,
+    accept_language: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+):
     lang = pick_lang(accept_language, a.lang)
-    result = analyze_payload(a)
+    result = analyze_payload(a, lang=lang)
+    record_activity(x_user_id, result, "analyze")
     return {"lang": lang, **result}
 
-@app.post("/explain")
-def explain(req: ExplainRequest, accept_language: Optional[str] = Header(None)):
+def batch_columns(rows: Optional[List[AnalyzeInput]], columns: Optional[AnalyzeColumns]) -> Tuple[Dict[str, Any], int]:
+    """analyze_batch() columns and row count from a request's `rows` or `columns`."""
+    if (rows is None) == (columns is None):
+        raise HTTPException(status_code=400, detail="Send exactly one of 'rows' or 'columns'.")
+
+    if rows is not None:
+        out: Dict[str, Any] = {"mode": [r.mode for r in rows], "period": [r.period for r in rows]}
+        if any(r.region for r in rows):
+            out["region"] = [r.region for r in rows]
+        for f in BATCH_FIELDS:
+            out[f] = [getattr(r, f) for r in rows]
+        return out, len(rows)
+    out = columns.model_dump(exclude_none=True)
+    lengths = {len(v) for v in out.values()}
+    if len(lengths) > 1:
+        raise HTTPException(status_code=400, detail="All columns must have the same length.")
+    return out, lengths.pop() if lengths else 0
+
+@app.post("/analyze/batch")
+def analyze_batch_route(req: AnalyzeBatchRequest, request: Request, accept_language: Optional[str] = Header(None)):
+    lang = pick_lang(accept_language, req.lang)
+    columns, n = batch_columns(req.rows, req.columns)
+    batch = analyze_batch(columns, n)
+    if req.format == "columns":
+        body = {
+            "lang": lang,
+            "count": n,
+            "breakdown": batch["breakdown"],
+            "total_kg": batch["total_kg"],
+            "threat": batch["threat"].tolist(),
+            "period": batch["period"],
+            "advice": content.table(lang).tips,
+            "factors_version": batch["factors_version"],
+        }
+    else:
+        body = {"lang": lang, "count": n, "results": batch_rows(batch, list(content.table(lang).tips))}
+    with stage("serialize"):
+        return payloads.respond(request, payloads.payload(body), vary=LANG_VARY)
+
+@app.post("/explain", dependencies=[Depends(vary_language)])
+async def explain(
+    req: ExplainRequest,
+    response: Response,
+    accept_language: Optional[str] = Header(None),
+    cache_control: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None),
+    x_deadline_ms: Optional[str] = Header(None),
+    fresh: bool = Query(False, description="skip the cache and ask the model again"),
+):
     lang = pick_lang(accept_language, req.lang)
+    budget = admission.Budget.from_headers(x_priority, x_deadline_ms, explain_gate)
+    cache_key = ResponseCache.make_key(EXPLAIN_PROMPT_VERSION, lang, normalize_text(req.question))
+    if wants_fresh(fresh, cache_control):
+        response_cache.bypass()
+        response.headers["X-Cache"] = "bypass"
+    else:
+        cached, status = await response_cache.aget(cache_key)
+        response.headers["X-Cache"] = status
+        if cached is not None:
+            return cached
+
+    try:
+        result, shared = await explain_flight.do(ask_explain, cache_key, lang, req.question, budget)
+    except admission.Shed as e:
+        # not cached, so the question is asked again once there is capacity
+        return {"lang": lang, "answer": content.table(lang).text("explain.busy"),
+                "degraded": degrade(explain_gate, response, e.reason)}
+    if shared:
+        response.headers["X-Coalesced"] = "true"
+    return result
+
+async def ask_explain(cache_key: str, lang: str, question: str, budget: admission.Budget) -> Dict[str, Any]:
+    """Model answer under explain_gate; the leader's budget applies to everyone sharing the call."""
+    async with explain_gate.admit(budget):
+        return await ask_explain_admitted(cache_key, lang, question)
+
+async def ask_explain_admitted(cache_key: str, lang: str, question: str) -> Dict[str, Any]:
     system = (
         f"You are EcoLearn+ India, a bilingual climate tutor. Always answer in '{lang}'. "
         f"Keep explanations short and friendly; use India-relevant examples."
     )
     try:
-        resp = client.chat.completions.create(
+        resp = await llm(
+            site="explain",
             model="gpt-4o-mini",
             messages=[
                 {"role":"system","content":system},
-                {"role":"user","content":req.question}
+                {"role":"user","content":question}
             ]
         )
         answer = resp.choices[0].message.content
-        return {"lang": lang, "answer": answer}
+    except HTTPException:
+        raise
     except Exception as e:
+        if admission.expired():
+            raise asyncio.TimeoutError() from e  # admit() turns it into a degraded answer
         raise HTTPException(status_code=502, detail=str(e))
-
-@app.post("/logs/analyze")
-def analyze_log(req: LogAnalyzeRequest, accept_language: Optional[str] = Header(None)):
+    result = {"lang": lang, "answer": answer}
+    await response_cache.aput(cache_key, result)
+    return result
+
+@app.post("/logs/analyze", dependencies=[Depends(vary_language)])
+async def analyze_log(
+    req: LogAnalyzeRequest,
+    response: Response,
+    accept_language: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None),
+    x_deadline_ms: Optional[str] = Header(None),
+):
+    """
+    When logs_gate sheds the request, or a model call fails or runs out of
+    time, the answer comes from the rule parser, the analysis advice and
+    fallback_feedback(), with "degraded": {"reason": ...} in the body.
+    """
     lang = pick_lang(accept_language, req.lang)
+    strategy = req.strategy or LOGS_ANALYZE_STRATEGY
+    budget = admission.Budget.from_headers(x_priority, x_deadline_ms, logs_gate)
 
-    factors = DEFAULT_ACTIVITY_FACTORS.copy()
+    with stage("parse"):
+        parsed = log_parser.parse_activity(req.text)
     try:
-        extracted = extract_activity_factors(req.text, lang)
-        for key, value in extracted.items():
-            if value is not None:
-                factors[key] = value
-    except Exception as e:
-        # fall back to defaults but log the error for debugging
-        print(f"[logs/analyze] factor extraction failed: {e}")
+        async with logs_gate.admit(budget):
+            result = await log_analysis(req, lang, strategy, parsed, x_user_id)
+            if result.pop("fell_back"):
+                result["degraded"] = degrade(logs_gate, response, fallback_reason())
+            return result
+    except admission.Shed as e:
+        reason = e.reason
+    result = await log_analysis(req, lang, strategy, parsed, x_user_id, use_model=False)
+    del result["fell_back"]
+    result["degraded"] = degrade(logs_gate, response, reason)
+    return result
+
+async def log_analysis(
+    req: LogAnalyzeRequest,
+    lang: str,
+    strategy: str,
+    parsed: Dict[str, Any],
+    x_user_id: Optional[str],
+    use_model: bool = True,
+) -> Dict[str, Any]:
+    """
+    The /logs/analyze body. use_model=False answers from the rules alone
+    (extraction path "rules_degraded"); "fell_back" says whether a model call
+    failed and its fallback was used.
+    """
+    feedback_data: Optional[Dict[str, Any]] = None
+    if not use_model:
+        extraction = {"path": "rules_degraded", "confidence": parsed["confidence"]}
+        factors = merge_factors(parsed["factors"])
+    elif strategy == "single" and parsed["confidence"] < log_parser.MIN_CONFIDENCE:
+        # one merged call for factors + feedback
+        extraction = {"path": "llm_single", "confidence": parsed["confidence"]}
+        try:
+            extracted, feedback_data = await extract_factors_and_feedback(req.text, lang)
+        except Exception as e:
+            print(f"[logs/analyze] single-call extraction failed: {e}")
+            extracted = parsed["factors"]
+            extraction["path"] = "rules_fallback"
+        factors = merge_factors(extracted)
+    else:
+        factors, extraction = await resolve_activity_factors(req.text, lang, parsed)
+    fell_back = extraction["path"] == "rules_fallback"
 
     try:
         analysis_input = AnalyzeInput(**factors)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid factors derived from text: {e}")
 
-    analysis = analyze_payload(analysis_input)
-
-    feedback_data = {"feedback": "", "tips": []}
-    try:
-        feedback_data = build_feedback_and_tips(
-            req.text,
-            lang,
-            analysis,
-            analysis_input.model_dump(),
-        )
-    except Exception as e:
-        print(f"[logs/analyze] feedback generation failed: {e}")
-        feedback_data["feedback"] = (
-            f"{req.text.strip()} — अच्छा निर्णय लेने के लिए छोटे बदलाव आज़माएं।"
-            if lang == "hi"
-            else f'"{req.text.strip()}" — consider a lower-carbon alternative when you can.'
-        )
+    with stage("analyze"):
+        analysis = analyze_payload(analysis_input, lang=lang)
+    record_activity(x_user_id, analysis, "log")
+
+    if feedback_data is None and use_model:
+        try:
+            feedback_data = await build_feedback_and_tips(
+                req.text,
+                lang,
+                analysis,
+                analysis_input.model_dump(),
+            )
+        except Exception as e:
+            print(f"[logs/analyze] feedback generation failed: {e}")
+            fell_back = True
+    feedback_data = feedback_data or {"feedback": "", "tips": []}
+    if not feedback_data["feedback"]:
+        feedback_data["feedback"] = fallback_feedback(req.text, lang)
 
     tips = feedback_data.get("tips") or analysis.get("advice", [])[:3]
 
@@ -408,77 +1240,525 @@ def analyze_log(req: LogAnalyzeRequest, accept_language: Optional[str] = Header(
         "analysis": analysis,
         "feedback": feedback_data.get("feedback", ""),
         "tips": tips,
+        "extraction": extraction,
+        "fell_back": fell_back,
     }
 
-@app.get("/data/india/temp")
-def india_temp_series(
-    variable: str = Query("tasmax", description="tas or tasmax"),
-    scenario: str = Query("historical", description="historical or ssp245/ssp370/etc."),
-    model_hint: str = Query("MIROC6", description="pick a model you see in the S3 index")
+@app.post("/logs/analyze/stream")
+async def analyze_log_stream(
+    req: LogAnalyzeRequest,
+    accept_language: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
 ):
     """
-    Returns annual mean temperature series (°C) for India using NEX-GDDP-CMIP6.
-    This reads ONE file (keep it small for a prototype) and aggregates to yearly means.
+    Server-Sent Events version of /logs/analyze. Events, in order:
+    `factors` and `analysis` as soon as they are known, `delta` text chunks
+    while the model writes feedback, then `feedback` (parsed feedback + tips)
+    and `done`.
     """
-    # 1) Find a file by simple pattern (after you check the S3 index for the exact layout)
-    # Note: When you first browse the S3 index, copy a real key here for reliability.
-    # Example (you must replace this with a *real* key you see in the index):
-    # key = "nex-gddp-cmip6/CMIP6/CMIP/NCC/MIROC6/historical/r1i1p1f1/{var}/..."  # <-- replace
-    raise_key_help = (
-        "Open https://nex-gddp-cmip6.s3.us-west-2.amazonaws.com/index.html , "
-        "navigate to your desired model/scenario/variable, copy ONE .nc file key, "
-        "and paste it into the code as `key` below."
-    )
-
-    # --- START: EDIT ME with a real key you select from the S3 index ---
-    key = "nex-gddp-cmip6/CMIP6/CMIP/NCC/MIROC6/historical/r1i1p1f1/tasmax/gn/v20201201/tasmax_day_MIROC6_historical_r1i1p1f1_gn_2014.nc"
-  # e.g., "nex-gddp-cmip6/.../historical/r1i1p1f1/tasmax/...nc"
-    # --- END: EDIT ME ---
+    lang = pick_lang(accept_language, req.lang)
 
-    if not key:
-        raise HTTPException(500, f"No NEX key set. {raise_key_help}")
+    async def events():
+        factors, extraction = await resolve_activity_factors(req.text, lang)
+        try:
+            analysis_input = AnalyzeInput(**factors)
+        except Exception as e:
+            yield sse("error", {"detail": f"Invalid factors derived from text: {e}"})
+            return
+        analysis = analyze_payload(analysis_input, lang=lang)
+        record_activity(x_user_id, analysis, "log")
+        yield sse("factors", {"lang": lang, "factors": analysis_input.model_dump(), "extraction": extraction})
+        yield sse("analysis", analysis)
+
+        text = ""
+        try:
+            async for delta in stream_feedback_and_tips(req.text, lang, analysis, analysis_input.model_dump()):
+                text += delta
+                yield sse("delta", {"text": delta})
+            feedback_data = parse_streamed_feedback(text)
+        except Exception as e:
+            print(f"[logs/analyze/stream] feedback generation failed: {e}")
+            feedback_data = {"feedback": "", "tips": []}
+        yield sse("feedback", {
+            "feedback": feedback_data["feedback"] or fallback_feedback(req.text, lang),
+            "tips": feedback_data["tips"] or analysis.get("advice", [])[:3],
+        })
+        yield sse("done", {})
 
-    if not s3.exists(key):
-        raise HTTPException(404, f"S3 key not found: {key}")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Accept-Language"},
+    )
 
-    # 2) Open the NetCDF via fsspec/s3fs
-    url = f"s3://{key}" if not key.startswith("s3://") else key
-    ds = xr.open_dataset(s3.open(url), engine="netcdf4")
+# ---------- Bulk ingest ----------
+# POST /ingest reads NDJSON rows as they arrive and streams one result line
+# per input line back, in input order. At most INGEST_WINDOW rows are held
+# (finished rows waiting behind a slower one) and at most INGEST_MAX_INFLIGHT
+# LLM extractions run per request; when either is full the body is not read
+# further, so memory stays flat for any file size and a slow model slows the
+# upload down instead of piling up work.
+INGEST_WINDOW = int(os.getenv("INGEST_WINDOW", "8192"))
+INGEST_MAX_INFLIGHT = int(os.getenv("INGEST_MAX_INFLIGHT", "64"))
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", "65536"))
+INGEST_FLUSH_BYTES = 64 * 1024
+INGEST_LEDGER_BATCH = 2000
+INGEST_MIN_TS = dt.datetime(2000, 1, 1, tzinfo=dt.timezone.utc).timestamp()
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator itself reads the request body.
+    The stock class listens for client disconnects on `receive` while
+    streaming, which would swallow the request chunks; here only the
+    iterator calls receive (through request.stream()) until it sets
+    `body_read`. From then on the response listens, and a disconnect
+    cancels the iterator (a disconnect mid-body already ends request.stream()).
+    """
 
-    # NEX variables are typically Kelvin for temperature; check variable name
-    vname = variable  # "tas" or "tasmax"
-    if vname not in ds:
-        # Try common alternatives
-        for cand in ("tas", "tasmax"):
-            if cand in ds:
-                vname = cand
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.body_read = asyncio.Event()
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            async with anyio.create_task_group() as task_group:
+                async def stream() -> None:
+                    await self.stream_response(send)
+                    task_group.cancel_scope.cancel()
+
+                task_group.start_soon(stream)
+                await self.body_read.wait()
+                await self.listen_for_disconnect(receive)
+                task_group.cancel_scope.cancel()
+        finally:
+            # cancelled while waiting on send(): close it here, not on GC
+            await self.body_iterator.aclose()
+        if self.background is not None:
+            await self.background()
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[bytes]]:
+    """
+    Lines of a byte stream. Keeps at most one partial line buffered; a line
+    longer than INGEST_MAX_LINE_BYTES is skipped and yielded as None.
+    """
+    buf = bytearray()
+    skipping = False
+    async for chunk in chunks:
+        buf += chunk
+        start = 0
+        while True:
+            nl = buf.find(b"\n", start)
+            if nl < 0:
                 break
-        if vname not in ds:
-            raise HTTPException(500, f"Variable '{variable}' not found in dataset vars: {list(ds.data_vars)}")
-
-    # 3) Subset India bbox (lat may be descending in some datasets)
-    lat = ds["lat"] if "lat" in ds.coords else ds["latitude"]
-    lon = ds["lon"] if "lon" in ds.coords else ds["longitude"]
-
-    lat_slice = slice(INDIA_BBOX["lat_min"], INDIA_BBOX["lat_max"]) if float(lat[0]) < float(lat[-1]) \
-                else slice(INDIA_BBOX["lat_max"], INDIA_BBOX["lat_min"])
-    lon_slice = slice(INDIA_BBOX["lon_min"], INDIA_BBOX["lon_max"])
-
-    ds_sub = ds[vname].sel(lat=lat_slice, lon=lon_slice)
-
-    # 4) Convert K->°C if needed
-    da = ds_sub
-    if da.attrs.get("units", "").lower().startswith("k"):
-        da = da - 273.15
-
-    # 5) Aggregate daily -> annual mean over the India bbox
-    #    time dimension is usually "time"
-    annual = da.resample(time="1Y").mean(dim=("time","lat","lon"))
+            if skipping:
+                skipping = False
+            else:
+                yield bytes(buf[start:nl])
+            start = nl + 1
+        del buf[:start]
+        if len(buf) > INGEST_MAX_LINE_BYTES:
+            if not skipping:
+                yield None
+            skipping = True
+            buf.clear()
+    if buf and not skipping:
+        yield bytes(buf)
+
+async def ingest_text_row(text: str, lang: str, parsed: Dict[str, Any], region: Optional[str] = None,
+                          day: Optional[int] = None) -> Dict[str, Any]:
+    factors, extraction = await resolve_activity_factors(text, lang, parsed)
+    analysis_input = AnalyzeInput(**factors, region=region)
+    return {"factors": analysis_input.model_dump(), "analysis": analyze_payload(analysis_input, day, lang),
+            "extraction": extraction}
+
+def ingest_row(raw: Optional[bytes], lang: str, default_user: Optional[str]) -> Tuple[Optional[Tuple[str, Optional[float]]], Any]:
+    """
+    Score one input line. Returns (ledger target, result) where the target is
+    (user_id, ts) or None, and the result is a dict or, for free-text rows the
+    rule parser can't handle confidently, an asyncio.Task (LLM extraction).
+    A row's own user_id overrides the X-User-Id header; a row's ts also picks
+    the factor period in effect on that day.
+    """
+    if raw is None:
+        return None, {"error": f"line longer than {INGEST_MAX_LINE_BYTES} bytes"}
+    try:
+        row = json.loads(raw)
+        if not isinstance(row, dict):
+            return None, {"error": "row must be a JSON object"}
+        user = row.get("user_id") or default_user
+        ts = parse_ts(row["ts"]) if row.get("ts") is not None else None
+        if ts is not None and not INGEST_MIN_TS <= ts <= time.time() + 86400:
+            # e.g. milliseconds; out of range it would fail the whole ledger batch
+            return None, {"error": "invalid row: ts must be unix seconds or ISO 8601 between 2000-01-01 and tomorrow"}
+        day = local_day(ts) if ts is not None else None
+        target = (str(user), ts) if user else None
+        row_lang = pick_lang(None, str(row.get("lang") or lang))
+
+        text = row.get("text")
+        if text is None:
+            return target, {"analysis": analyze_payload(AnalyzeInput.model_validate(row), day, row_lang)}
+        if not isinstance(text, str) or not 3 <= len(text) <= 1000:
+            return None, {"error": "text must be a string of 3-1000 characters"}
+        parsed = log_parser.parse_activity(text)
+        if parsed["confidence"] >= log_parser.MIN_CONFIDENCE:
+            analysis_input = AnalyzeInput(**merge_factors(parsed["factors"]), region=row.get("region"))
+            return target, {"factors": analysis_input.model_dump(), "analysis": analyze_payload(analysis_input, day, row_lang),
+                            "extraction": {"path": "rules", "confidence": parsed["confidence"]}}
+        region = AnalyzeInput(region=row.get("region")).region  # validate before spending an LLM call
+        return target, asyncio.ensure_future(ingest_text_row(text, row_lang, parsed, region, day))
+    except ValidationError as e:
+        detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        return None, {"error": f"invalid row: {detail}"}
+    except ValueError as e:
+        return None, {"error": f"invalid row: {e}"}
+
+@app.post("/ingest")
+async def ingest(
+    request: Request,
+    lang: Optional[str] = None,
+    accept_language: Optional[str] = Header(None),
+    x_user_id: Optional[str] = Header(None),
+):
+    """
+    NDJSON in, NDJSON out. Each input line is either AnalyzeInput fields or
+    {"text": "..."} (scored like /logs/analyze, without feedback), optionally
+    with "user_id" and "ts" to record it in the activity history. Output
+    lines are {"line": n, ...result} or {"line": n, "error": ...} in input
+    order, followed by one {"summary": {...}} line. Blank lines are skipped.
+    """
+    lang = pick_lang(accept_language, lang)
+
+    async def results():
+        t0 = time.perf_counter()
+        window: "deque[Tuple[int, Any, Any]]" = deque()
+        inflight: set = set()  # unfinished extraction tasks
+        out: List[str] = []
+        out_bytes = 0
+        to_record: List[Tuple[str, Dict[str, Any], str, Optional[float]]] = []
+        counts = {"rows": 0, "errors": 0, "llm": 0, "unrecorded": 0}
+
+        def finish(n: int, target: Optional[Tuple[str, Optional[float]]], item: Any) -> None:
+            nonlocal out_bytes
+            if isinstance(item, asyncio.Future):
+                counts["llm"] += 1
+                try:
+                    item = item.result()
+                except Exception as e:
+                    item = {"error": f"extraction failed: {e}"}
+            counts["rows"] += 1
+            if "error" in item:
+                counts["errors"] += 1
+            elif target is not None and activity_ledger is not None:
+                to_record.append((target[0], item["analysis"], "ingest", target[1]))
+            line = payloads.dumps({"line": n, **item}).decode() + "\n"
+            out.append(line)
+            out_bytes += len(line)
+
+        def ready() -> bool:
+            head = window[0][2]
+            return not isinstance(head, asyncio.Future) or head.done()
+
+        async def flush_ledger() -> None:
+            if to_record:
+                batch = to_record[:]
+                to_record.clear()
+                try:
+                    await asyncio.to_thread(activity_ledger.record_many, batch)
+                except Exception as e:
+                    # the batch is one transaction: none of it was stored
+                    counts["unrecorded"] += len(batch)
+                    print(f"[ingest] activity record failed: {e}")
+
+        def take_output() -> str:
+            nonlocal out_bytes
+            chunk = "".join(out)
+            out.clear()
+            out_bytes = 0
+            return chunk
+
+        n = 0
+        try:
+            async for raw in ndjson_lines(request.stream()):
+                n += 1
+                if raw is not None and not raw.strip():
+                    continue
+                target, item = ingest_row(raw, lang, x_user_id)
+                window.append((n, target, item))
+                if isinstance(item, asyncio.Future):
+                    inflight.add(item)
+                    item.add_done_callback(inflight.discard)
+                while window and ready():
+                    finish(*window.popleft())
+                if len(window) >= INGEST_WINDOW or len(inflight) >= INGEST_MAX_INFLIGHT:
+                    # full: send what we have, then wait for the oldest row / any extraction
+                    if out:
+                        yield take_output()
+                    if len(window) >= INGEST_WINDOW:
+                        await asyncio.wait([window[0][2]])
+                    else:
+                        await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                    while window and ready():
+                        finish(*window.popleft())
+                if out_bytes >= INGEST_FLUSH_BYTES:
+                    yield take_output()
+                if len(to_record) >= INGEST_LEDGER_BATCH:
+                    await flush_ledger()
+            response.body_read.set()
+
+            while window:
+                if out:
+                    yield take_output()
+                if isinstance(window[0][2], asyncio.Future):
+                    await asyncio.wait([window[0][2]])
+                finish(*window.popleft())
+        finally:
+            # client went away: drop extractions nobody will read
+            for _, _, item in window:
+                if isinstance(item, asyncio.Future):
+                    item.cancel()
+        await flush_ledger()
+        summary = {**counts, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+        yield take_output() + payloads.dumps({"summary": summary}).decode() + "\n"
+
+    response = DuplexStreamingResponse(results(), media_type="application/x-ndjson", headers={"Vary": "Accept-Language"})
+    return response
+
+@app.get("/users/{user_id}/activity")
+def user_activity(
+    user_id: str,
+    grain: Literal["day","week","month"] = "day",
+    days: int = Query(30, ge=1, le=3660),
+    end: Optional[dt.date] = None,
+):
+    """
+    Recorded activity for the last `days` local days up to `end` (default
+    today), summed per `grain` bucket from the incremental rollups; the range
+    is widened to whole buckets. `threat` is the band of the average daily
+    total over the days a bucket covers.
+    """
+    if activity_ledger is None:
+        raise HTTPException(404, "Activity history is disabled (ACTIVITY_DB is not set).")
+    end_day = (end - dt.date(1970, 1, 1)).days if end else local_day(time.time())
+    start_day = end_day - days + 1
+    # whole buckets: the range starts at the first day of start_day's bucket
+    start_day = first_day(bucket_of(start_day, grain), grain)
+    buckets = activity_ledger.rollup(user_id, grain, start_day, end_day)
+    for b in buckets:
+        b["threat"] = threat_label(round(b["total_kg"] / b["days"], 2))
+
+    totals = {c: round(sum(b["breakdown"][c] for b in buckets), 2) for c in ACTIVITY_CATEGORIES}
+    total_kg = round(sum(b["total_kg"] for b in buckets), 2)
+    return {
+        "user_id": user_id,
+        "grain": grain,
+        "from": (dt.date(1970, 1, 1) + dt.timedelta(days=start_day)).isoformat(),
+        "to": (dt.date(1970, 1, 1) + dt.timedelta(days=end_day)).isoformat(),
+        "buckets": buckets,
+        "totals": {
+            "n": sum(b["n"] for b in buckets),
+            "breakdown": totals,
+            "total_kg": total_kg,
+            "avg_daily_kg": round(total_kg / (end_day - start_day + 1), 2),
+            "threat": threat_label(round(total_kg / (end_day - start_day + 1), 2)),
+        },
+    }
 
-    years = [int(str(t.values)[:4]) for t in annual["time"].values]
-    vals  = [float(x) for x in annual.values]
+@app.get("/activity/stats")
+def activity_stats():
+    if activity_ledger is None:
+        return {"enabled": False}
+    return {"enabled": True, **activity_ledger.stats()}
+
+@app.get("/factors")
+def factor_table():
+    """Version, regions, modes and periods of the emission factor table in use (plus reload counters)."""
+    return emission_factors.status()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus text exposition of this worker's counters and histograms (see metrics.py)."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admission/stats")
+def admission_stats():
+    """Per-route admission: slots, queue depth, service time EWMA, admitted/queued/shed/degraded counts."""
+    return admission.stats()
+
+@app.get("/llm/cache/stats")
+def llm_cache_stats():
+    return {**response_cache.stats(), "single_flight": single_flight.stats()}
+
+def climate_headers(status: str, shared: bool) -> Dict[str, str]:
+    headers = {"X-Cache": status}
+    if shared:
+        headers["X-Coalesced"] = "true"
+    return headers
 
-    return {"series": [{"year": y, "t_mean_c": round(v, 2)} for y, v in zip(years, vals)]}
+@app.get("/data/india/temp")
+async def india_temp_series(
+    request: Request,
+    variable: str = Query("tasmax", description="tas or tasmax"),
+    scenario: str = Query("historical", description="historical or ssp245/ssp370/etc."),
+    model_hint: str = Query("MIROC6", description="pick a model you see in the S3 index"),
+    region: Optional[str] = Query(None, description="state code(s), comma-separated, or 'all' (default: India)"),
+    refresh: bool = Query(False, description="bypass the cache and recompute"),
+):
+    """
+    Returns annual mean temperature series (°C) for India using NEX-GDDP-CMIP6.
+    This reads ONE file (keep it small for a prototype) and aggregates to yearly means.
+    Means are cos(latitude) weighted over the region masks (see region_masks.py);
+    all regions come out of the same read, so any `region` is served from one
+    cache entry. Reduced series are cached in memory and on disk (see climate_cache.py).
+    """
+    b = region_masks.boundaries()
+    codes = region_masks.parse_regions(region, b)
+    (by_region, status), shared = await india_temp_flight.do_in_thread(
+        climate.cached_region_series, variable, scenario, model_hint, refresh=refresh)
+    body = climate_payloads.get(by_region, (tuple(codes), b.source), lambda: {
+        "series": by_region[codes[0]],
+        "regions": {c: {"name": b.names[c], "series": by_region[c]} for c in codes},
+        "weighting": "cos_lat",
+        "mask": b.source,
+    })
+    return payloads.respond(request, body, climate_headers(status, shared))
+
+@app.get("/data/india/heat")
+async def india_heat_extremes(
+    request: Request,
+    scenario: str = Query("historical", description="historical or ssp245/ssp370/etc."),
+    model: str = Query("MIROC6", description="model name as in the S3 index"),
+    start_year: int = Query(2014, ge=1950, le=2100),
+    end_year: int = Query(2014, ge=1950, le=2100),
+    region: Optional[str] = Query(None, description="state code(s), comma-separated, or 'all' (default: India)"),
+    threshold_c: Optional[float] = Query(None, description="hot-day threshold, °C (default HEAT_THRESHOLD_C)"),
+    min_days: Optional[int] = Query(None, ge=1, le=30, description="consecutive hot days that make a heatwave"),
+    percentiles: str = Query("95", description="comma-separated tasmax percentiles, e.g. 95,99"),
+    refresh: bool = Query(False, description="bypass the cache and recompute"),
+):
+    """
+    Yearly heat extremes from daily tasmax per region: hot days above
+    `threshold_c`, heatwave days (runs of >= `min_days` hot days) and tasmax
+    percentiles. Files are streamed in time blocks, so memory doesn't grow
+    with the year range (see climate_extremes.py).
+    """
+    b = region_masks.boundaries()
+    codes = region_masks.parse_regions(region, b)
+    (data, status), shared = await heat_flight.do_in_thread(
+        climate_extremes.cached_heat_extremes,
+        scenario, model, start_year, end_year,
+        climate_extremes.HEAT_THRESHOLD_C if threshold_c is None else threshold_c,
+        climate_extremes.HEATWAVE_MIN_DAYS if min_days is None else min_days,
+        tuple(climate_extremes.parse_percentiles(percentiles)),
+        refresh=refresh,
+    )
+    by_region = data["regions"]
+    body = climate_payloads.get(data, (tuple(codes), b.source), lambda: {
+        **{k: v for k, v in data.items() if k != "regions"},
+        "series": by_region[codes[0]],
+        "regions": {c: {"name": b.names[c], "series": by_region[c]} for c in codes},
+        "mask": b.source,
+    })
+    return payloads.respond(request, body, climate_headers(status, shared))
+
+@app.get("/data/india/tiles")
+async def india_tiles(
+    request: Request,
+    variable: str = Query("tasmax", description="tasmax or tas"),
+    scenario: str = Query("historical", description="historical or ssp245/ssp370/etc."),
+    model: str = Query("MIROC6", description="model name as in the S3 index"),
+    year: int = Query(2014, ge=1950, le=2100),
+    month: Optional[int] = Query(None, ge=1, le=12, description="1-12 for a monthly mean (default: annual)"),
+    bbox: Optional[str] = Query(None, description="viewport lon_min,lat_min,lon_max,lat_max (default: India)"),
+    width: int = Query(512, ge=1, le=8192, description="viewport width in pixels"),
+    height: int = Query(512, ge=1, le=8192, description="viewport height in pixels"),
+    level: Optional[int] = Query(None, ge=0, description="pyramid level (0 = native grid; default from bbox and size)"),
+    format: Literal["bin", "json"] = Query("bin"),
+    dtype: Literal["int16", "float16"] = Query("int16", description="cell encoding of format=bin"),
+):
+    """
+    Gridded mean °C of one year (or month) for a map viewport, from a
+    precomputed pyramid of block-mean levels (built on first use; see
+    climate_tiles.py). The level is the coarsest whose cells are no larger
+    than one pixel of width x height.
+    """
+    box = climate_tiles.parse_bbox(bbox)
+    (p, status), shared = await tiles_flight.do_in_thread(climate_tiles.pyramid, variable, scenario, model, year)
+    body, header = climate_tiles.payload(p, month, box, width, height, level, format, dtype)
+    return payloads.respond(request, body, {**climate_headers(status, shared), "X-Tile-Level": str(header["level"])},
+                            media_type="application/json" if format == "json" else "application/octet-stream")
+
+@app.get("/data/india/regions")
+def india_regions(request: Request):
+    """Region codes accepted by /data/india/temp?region=..., and where their masks come from."""
+    b = region_masks.boundaries()
+    body = {"regions": [{"code": c, "name": b.names[c]} for c in b.codes], "masks": region_masks.stats()}
+    return payloads.respond(request, payloads.payload(body))
+
+@app.get("/data/india/temp/ensemble")
+async def india_temp_ensemble(
+    request: Request,
+    variable: str = Query("tasmax", description="tas or tasmax"),
+    scenario: str = Query("historical", description="historical or ssp245/ssp370/etc."),
+    models: str = Query("MIROC6", description="comma-separated model names"),
+    start_year: int = Query(2014, ge=1950, le=2100),
+    end_year: int = Query(2014, ge=1950, le=2100),
+    refresh: bool = Query(False, description="bypass the cache and recompute"),
+):
+    """
+    Annual India mean series (°C) over a year range and several models, with
+    per-model values and an ensemble mean (`t_mean_c`). Files are reduced in parallel.
+    """
+    model_list = [m.strip() for m in models.split(",") if m.strip()]
+    if not model_list:
+        raise HTTPException(400, "Pass at least one model.")
+    (data, status), shared = await ensemble_flight.do_in_thread(
+        climate_pipeline.cached_multi_model_series,
+        variable, scenario, model_list, start_year, end_year, refresh=refresh,
+    )
+    return payloads.respond(request, climate_payloads.get(data, None, lambda: data), climate_headers(status, shared))
+
+@app.get("/data/cache/stats")
+def climate_cache_stats():
+    return {**climate.series_cache.stats(), "partial_reads": nc_partial.read_stats(),
+            "single_flight": single_flight.stats(), "payloads": climate_payloads.stats()}
+
+# ---------- Metrics collectors ----------
+# Cache and reader stats already kept by their modules, reported at scrape
+# time. Climate modules are only asked once something has imported them.
+def _stat_samples(stats: Dict[str, Any], keys: Tuple[str, ...], **labels: str) -> List[Tuple[Dict[str, str], float]]:
+    return [({**labels, "kind": k}, stats.get(k, 0)) for k in keys]
+
+@metrics.collector
+def _cache_metrics():
+    families = [("eco_response_cache_ops_total", "counter", "LLM response cache lookups and evictions",
+                 _stat_samples(response_cache.stats(), ("memory_hits", "db_hits", "misses", "bypass", "expired", "evictions", "db_evictions")))]
+    if is_loaded(climate):
+        families.append(("eco_series_cache_ops_total", "counter", "Climate series cache lookups and evictions",
+                         _stat_samples(climate.series_cache.stats(),
+                                       ("memory_hits", "disk_hits", "misses", "expired", "evictions", "disk_evictions"))))
+    if is_loaded(nc_partial):
+        stats = nc_partial.read_stats()
+        families += [
+            ("eco_partial_read_bytes_total", "counter", "Bytes fetched by byte-range NetCDF reads vs size of the files touched",
+             _stat_samples(stats, ("bytes_read", "file_bytes"))),
+            ("eco_partial_read_chunks_total", "counter", "Chunks fetched by byte-range NetCDF reads", [({}, stats["chunks"])]),
+        ]
+    return families
+
+@metrics.collector
+def _ledger_metrics():
+    if activity_ledger is None:
+        return []
+    stats = activity_ledger.stats(rollup_rows=False)
+    return [("eco_activity_ledger_rows", "gauge", "Rows in the activity ledger", _stat_samples(stats, ("users", "events")))]
+
+@metrics.collector
+def _points_metrics():
+    if points_ledger is None:
+        return []
+    stats = points_ledger.stats()
+    return [("eco_points_ledger_rows", "gauge", "Users and credited completions in the points ledger",
+             _stat_samples(stats, ("users", "completions")))]
 
 # ---------- Agent ----------
 CHAT_TOOLS = [
@@ -515,10 +1795,7 @@ CHAT_TOOLS = [
             "parameters": {
                 "type": "object",
                 "properties": {
-                    "mode": {
-                        "type": "string",
-                        "enum": ["petrol_car", "bus", "walk_cycle", "electric_car"],
-                    },
+                    "mode": {"type": "string"},  # enum: the current factor table's modes, see chat_tools()
                     "distance_km": {"type": "number"},
                     "meat_meals": {"type": "integer"},
                     "veg_meals": {"type": "integer"},
@@ -533,6 +1810,17 @@ CHAT_TOOLS = [
     },
 ]
 
+@functools.lru_cache(maxsize=8)
+def _chat_tools(modes: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    tools = json.loads(json.dumps(CHAT_TOOLS))
+    for t in tools:
+        if t["function"]["name"] == "analyze_co2e":
+            t["function"]["parameters"]["properties"]["mode"]["enum"] = list(modes)
+    return tools
+
+def chat_tools() -> List[Dict[str, Any]]:
+    """CHAT_TOOLS with analyze_co2e's mode enum taken from the current factor table."""
+    return _chat_tools(emission_factors.current().modes)
 
 def tool_missions_catalog():
     return {"missions": [{"id": k, **v} for k,v in MISSIONS.items()]}
@@ -547,9 +1835,125 @@ def tool_analyze_co2e(payload: Dict[str, Any]):
     a = AnalyzeInput(**payload)
     return analyze_payload(a)
 
-@app.post("/agent")
-def agent(req: AgentRequest, accept_language: Optional[str] = Header(None)):
-    lang = pick_lang(accept_language, req.lang)
+# name -> callable(args) for every tool advertised in CHAT_TOOLS
+TOOL_IMPLS = {
+    "missions_catalog": lambda args: tool_missions_catalog(),
+    "points_calc": lambda args: tool_points_calc(args.get("completed_missions", [])),
+    "analyze_co2e": tool_analyze_co2e,
+}
+TOOL_REGISTRY = {t["function"]["name"]: TOOL_IMPLS[t["function"]["name"]] for t in CHAT_TOOLS}
+
+AGENT_MAX_ROUNDS = int(os.getenv("AGENT_MAX_ROUNDS", "4"))
+AGENT_TOKEN_BUDGET = int(os.getenv("AGENT_TOKEN_BUDGET", "8000"))
+AGENT_ROUTES = metrics.counter("eco_agent_routes_total", "/agent tasks by router outcome", ("outcome",))
+
+def ms_since(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+async def run_tool(call: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Execute one tool call; returns (tool message, timing)."""
+    t0 = time.perf_counter()
+    name = call["function"]["name"]
+    fn = TOOL_REGISTRY.get(name)
+    try:
+        args = json.loads(call["function"].get("arguments") or "{}")
+        out = await asyncio.to_thread(fn, args) if fn else {"error": "unknown tool"}
+    except Exception as e:
+        out = {"error": str(e)}
+    message = {"role": "tool", "tool_call_id": call["id"], "content": payloads.dumps(out).decode()}
+    return message, {"name": name, "ms": ms_since(t0), "ok": "error" not in out}
+
+async def agent_round(messages: List[Any], tools: Optional[List[Dict[str, Any]]], stream: bool):
+    """
+    One model call. Yields ("token", text) while streaming, then
+    ("message", assistant_message_dict, total_tokens).
+    """
+    if not stream:
+        resp = await chat(messages, tools=tools)
+        tokens = resp.usage.total_tokens if resp.usage else 0
+        yield "message", resp.choices[0].message.model_dump(exclude_none=True), tokens
+        return
+
+    content: List[str] = []
+    calls: Dict[int, Dict[str, Any]] = {}
+    tokens = 0
+    async for chunk in llm_stream_chunks(
+        site="chat",
+        model="gpt-4o-mini",
+        messages=messages,
+        tools=tools or None,
+        tool_choice="auto" if tools else None,
+        temperature=0.3,
+        stream_options={"include_usage": True},
+    ):
+        if chunk.usage:
+            tokens = chunk.usage.total_tokens
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+            yield "token", delta.content
+        for tc in delta.tool_calls or []:
+            slot = calls.setdefault(tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+            if tc.id:
+                slot["id"] = tc.id
+            if tc.function and tc.function.name:
+                slot["function"]["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                slot["function"]["arguments"] += tc.function.arguments
+
+    msg: Dict[str, Any] = {"role": "assistant", "content": "".join(content) or None}
+    if calls:
+        msg["tool_calls"] = [calls[i] for i in sorted(calls)]
+    yield "message", msg, tokens
+
+def tool_args(req: AgentRequest, name: str) -> Dict[str, Any]:
+    """Arguments of a routed tool call, from the request's own fields."""
+    if name == "points_calc":
+        return {"completed_missions": req.completed_missions or []}
+    if name == "analyze_co2e":
+        return req.emissions.model_dump() if req.emissions else {}
+    return {}
+
+def run_routed(req: AgentRequest, tools: Tuple[str, ...]) -> Tuple[Dict[str, Any], List[Any], Dict[str, Any]]:
+    """
+    Run the tools agent_router picked, as the model would have called them.
+    Returns (output by tool, the assistant + tool messages, round timing).
+    """
+    t0 = time.perf_counter()
+    outputs, calls, replies, timings = {}, [], [], []
+    for name in tools:
+        t_tool = time.perf_counter()
+        args = tool_args(req, name)
+        try:
+            out = TOOL_REGISTRY[name](args)
+        except Exception as e:
+            out = {"error": str(e)}
+        outputs[name] = out
+        call_id = f"local_{name}"
+        calls.append({"id": call_id, "type": "function",
+                      "function": {"name": name, "arguments": payloads.dumps(args).decode()}})
+        replies.append({"role": "tool", "tool_call_id": call_id, "content": payloads.dumps(out).decode()})
+        timings.append({"name": name, "ms": ms_since(t_tool), "ok": "error" not in out})
+    timing = {"round": 1, "llm_ms": 0.0, "tokens": 0, "tools": timings, "tools_ms": ms_since(t0), "routed": True}
+    return outputs, [{"role": "assistant", "content": None, "tool_calls": calls}, *replies], timing
+
+async def run_agent(req: AgentRequest, lang: str, stream: bool = False):
+    """
+    Tool loop: each round the model may call tools; all calls of a round run
+    concurrently and their results feed the next round. Stops when the model
+    answers, or forces a tool-less final answer once max rounds or the token
+    budget are used up. Yields ("token", text), ("tool", timing),
+    ("round", timing) and finally ("done", {"reply": ..., "meta": ...}).
+
+    Tasks agent_router recognizes skip the planning round: their tools run
+    locally as round 1, then one tool-less model call phrases the answer
+    (or, with answer="template", the local reply is returned with no call).
+    """
+    t_start = time.perf_counter()
+    max_rounds = min(req.max_rounds or AGENT_MAX_ROUNDS, AGENT_MAX_ROUNDS)
+    budget = min(req.token_budget or AGENT_TOKEN_BUDGET, AGENT_TOKEN_BUDGET)
 
     system = (
         f"You are EcoLearn+ India, a carbon-first assistant. "
@@ -558,7 +1962,7 @@ def agent(req: AgentRequest, accept_language: Optional[str] = Header(None)):
     )
 
     # build initial message list
-    messages = [
+    messages: List[Any] = [
         {"role": "system", "content": system},
         {"role": "user", "content": req.task},
     ]
@@ -573,40 +1977,157 @@ def agent(req: AgentRequest, accept_language: Optional[str] = Header(None)):
             "content": f"Emissions input: {req.emissions.model_dump()}"
         })
 
-    # 1st model call (allows tool calls)
-    resp = chat(messages, tools=CHAT_TOOLS)
-    msg = resp.choices[0].message
-
-    # If the model didn’t call tools, return the answer
-    if not getattr(msg, "tool_calls", None):
-        return {"lang": lang, "reply": msg.content}
-
-    # Otherwise, execute each tool call and append tool outputs as messages
-    tool_messages = []
-    for call in msg.tool_calls:
-        name = call.function.name
-        args = json.loads(call.function.arguments or "{}")
-
-        if name == "missions_catalog":
-            out = tool_missions_catalog()
-        elif name == "points_calc":
-            out = tool_points_calc(args.get("completed_missions", []))
-        elif name == "analyze_co2e":
-            out = tool_analyze_co2e(args)
-        else:
-            out = {"error": "unknown tool"}
-
-        tool_messages.append({
-            "role": "tool",
-            "tool_call_id": call.id,
-            "content": json.dumps(out)
-        })
+    rounds: List[Dict[str, Any]] = []
+    tokens_used = 0
+    routed = agent_router.route(req.task, bool(req.completed_missions), req.emissions is not None) \
+        if agent_router.ENABLED else None
+    if routed:
+        outputs, local, timing = run_routed(req, routed)
+        for t in timing["tools"]:
+            yield "tool", t
+        rounds.append(timing)
+        yield "round", timing
+        if req.answer == "template":
+            AGENT_ROUTES.inc(outcome="template")
+            reply = local_reply(content.table(lang), outputs)
+            if stream:
+                yield "token", reply
+            yield "done", {"reply": reply, "meta": {"rounds": rounds, "tokens": 0, "stopped": "template",
+                                                    "routed": list(routed), "total_ms": ms_since(t_start)}}
+            return
+        messages.extend(local)
+    AGENT_ROUTES.inc(outcome="summary" if routed else "model")
+
+    while True:
+        # out of rounds or tokens: offer no tools, so the model has to answer;
+        # routed tasks already have their tool results
+        limit = "token_budget" if tokens_used >= budget else "max_rounds" if len(rounds) + 1 >= max_rounds \
+            else "routed" if routed else None
+
+        t_round = time.perf_counter()
+        msg, tokens = None, 0
+        async for kind, *payload in agent_round(messages, None if limit else chat_tools(), stream):
+            if kind == "token":
+                yield "token", payload[0]
+            else:
+                msg, tokens = payload
+        tokens_used += tokens
+        timing: Dict[str, Any] = {"round": len(rounds) + 1, "llm_ms": ms_since(t_round), "tokens": tokens, "tools": []}
+
+        calls = msg.get("tool_calls") or []
+        if not calls:
+            rounds.append(timing)
+            yield "round", timing
+            break
+
+        # run every tool call of this round concurrently
+        t_tools = time.perf_counter()
+        results = await asyncio.gather(*(run_tool(c) for c in calls))
+        timing["tools_ms"] = ms_since(t_tools)
+        timing["tools"] = [t for _, t in results]
+        for _, t in results:
+            yield "tool", t
+        rounds.append(timing)
+        yield "round", timing
+        messages.extend([msg, *(m for m, _ in results)])
+
+    yield "done", {
+        "reply": msg.get("content"),
+        "meta": {
+            "rounds": rounds,
+            "tokens": tokens_used,
+            "stopped": limit or "answer",  # what forced the final round, if anything
+            "routed": list(routed or ()),
+            "total_ms": ms_since(t_start),
+        },
+    }
 
-    # 2nd model call with tool results for final answer
-    messages.extend([
-        msg,  # assistant message that contained the tool calls
-        *tool_messages
-    ])
-    final = chat(messages)
-    return {"lang": lang, "reply": final.choices[0].message.content}
+def local_reply(t: content.Table, outputs: Dict[str, Any]) -> str:
+    """Templated answer from tool outputs by name (missions_catalog, points_calc, analyze_co2e)."""
+    parts = []
+    if "missions_catalog" in outputs:
+        titles = [t.strings.get(f"mission.{m['id']}", m["title"]) for m in outputs["missions_catalog"]["missions"]]
+        parts.append(t.text("agent.missions", missions=", ".join(titles)))
+    pts = outputs.get("points_calc")
+    if pts and "error" not in pts:
+        parts.append(t.text("agent.points", points=pts["awarded_points"]))
+        if pts["invalid"]:
+            parts.append(t.text("agent.unknown_missions", missions=", ".join(pts["invalid"])))
+    a = outputs.get("analyze_co2e")
+    if a and "error" not in a:
+        parts.append(t.text("agent.footprint", total_kg=a["total_kg"], period=a["period"], threat=a["threat"]))
+        parts.extend(t.tips[:1])
+    return " ".join(parts) or t.text("agent.busy")
+
+def agent_fallback(req: AgentRequest, lang: str) -> Dict[str, Any]:
+    """
+    Deterministic /agent answer from the local tools (points_calc for
+    completed_missions, analyze_co2e for emissions), used when agent_gate
+    sheds the request or the model runs out of time.
+    """
+    t0 = time.perf_counter()
+    outputs = {}
+    if req.completed_missions:
+        outputs["points_calc"] = tool_points_calc(req.completed_missions)
+    if req.emissions:
+        outputs["analyze_co2e"] = tool_analyze_co2e(req.emissions.model_dump())
+    return {
+        "reply": local_reply(content.table(lang), outputs),
+        "meta": {"rounds": [], "tokens": 0, "stopped": "degraded", "tools": list(outputs), "total_ms": ms_since(t0)},
+    }
 
+@app.post("/agent", dependencies=[Depends(vary_language)])
+async def agent(
+    req: AgentRequest,
+    response: Response,
+    accept_language: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None),
+    x_deadline_ms: Optional[str] = Header(None),
+):
+    lang = pick_lang(accept_language, req.lang)
+    budget = admission.Budget.from_headers(x_priority, x_deadline_ms, agent_gate)
+    try:
+        async with agent_gate.admit(budget):
+            async for kind, data in run_agent(req, lang):
+                if kind == "done":
+                    return {"lang": lang, **data}
+    except admission.Shed as e:
+        return {"lang": lang, **agent_fallback(req, lang), "degraded": degrade(agent_gate, response, e.reason)}
+
+@app.post("/agent/stream")
+async def agent_stream(
+    req: AgentRequest,
+    accept_language: Optional[str] = Header(None),
+    x_priority: Optional[str] = Header(None),
+    x_deadline_ms: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events version of /agent: `token` events carry answer text as
+    it is generated, `tool` / `round` events carry timings, `done` has the
+    full reply and metadata (a degraded `done` when agent_gate sheds the
+    request or it runs out of time).
+    """
+    lang = pick_lang(accept_language, req.lang)
+    budget = admission.Budget.from_headers(x_priority, x_deadline_ms, agent_gate)
+
+    async def events():
+        try:
+            async with agent_gate.admit(budget):
+                async for kind, data in run_agent(req, lang, stream=True):
+                    if kind == "token":
+                        yield sse("token", {"text": data})
+                    elif kind == "done":
+                        yield sse("done", {"lang": lang, **data})
+                    else:
+                        yield sse(kind, data)
+        except admission.Shed as e:
+            yield sse("done", {"lang": lang, **agent_fallback(req, lang), "degraded": degrade(agent_gate, None, e.reason)})
+        except Exception as e:
+            print(f"[agent/stream] failed: {e}")
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Vary": "Accept-Language"},
+    )
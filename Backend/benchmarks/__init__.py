@@ -0,0 +1,2 @@
+# Standalone benchmark scripts (no pytest needed).
+# Run from Backend/, e.g.:  python -m benchmarks.batch
@@ -0,0 +1,69 @@
+# benchmarks/activity_ledger.py
+# Ingest rate of the activity ledger and range-query latency from the
+# incremental rollups vs a scan over raw events, on a synthetic user base
+# (events spread over two years). Rollup and scan results are compared.
+#   python -m benchmarks.activity_ledger [--users 10000] [--events 2000000]
+import os, sys, time, random, argparse, tempfile, statistics
+
+from activity_ledger import ActivityLedger, CATEGORIES
+from local_days import local_day
+
+DAY = 86400
+
+def make_analysis(rnd):
+    b = {c: round(rnd.uniform(0, 4), 2) for c in CATEGORIES}
+    return {"breakdown": b, "total_kg": round(sum(b.values()), 2)}
+
+def timed(fn, reps):
+    xs = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        out = fn()
+        xs.append(time.perf_counter() - t0)
+    return statistics.median(xs), out
+
+def run(users, events, batch, db):
+    rnd = random.Random(11)
+    ledger = ActivityLedger(db)
+    now = time.time()
+    # a few heavy users get a large share of the events
+    heavy = [f"heavy-{i}" for i in range(5)]
+
+    t_ingest = 0.0
+    done = 0
+    while done < events:
+        n = min(batch, events - done)
+        items = []
+        for _ in range(n):
+            user = rnd.choice(heavy) if rnd.random() < 0.1 else f"user-{rnd.randrange(users)}"
+            items.append((user, make_analysis(rnd), "analyze", now - rnd.uniform(0, 730) * DAY))
+        t0 = time.perf_counter()
+        ledger.record_many(items)
+        t_ingest += time.perf_counter() - t0
+        done += n
+
+    end = local_day(now)
+    print(f"events={events:,} users={users:,} db={os.path.getsize(db) / 1e6:.0f} MB")
+    print(f"ingest: {t_ingest:.1f}s  ({events / t_ingest:,.0f} events/s, batches of {batch})")
+    print(f"stats : {ledger.stats()}")
+
+    ok = True
+    for user in (heavy[0], "user-1"):
+        for grain, days in (("day", 30), ("week", 90), ("month", 365)):
+            t_roll, rolled = timed(lambda: ledger.rollup(user, grain, end - days + 1, end), 20)
+            t_scan, scanned = timed(lambda: ledger.scan(user, grain, end - days + 1, end), 3)
+            same = [{k: v for k, v in r.items() if k != "days"} for r in rolled] == scanned
+            ok &= same
+            print(f"{user:8s} {grain:5s} last {days:3d}d: rollup {t_roll * 1000:7.2f}ms ({len(rolled)} buckets)  "
+                  f"scan {t_scan * 1000:8.2f}ms ({sum(r['n'] for r in scanned):,} events)  match={same}")
+    ledger.close()
+    return ok
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.activity_ledger")
+    p.add_argument("--users", type=int, default=10_000)
+    p.add_argument("--events", type=int, default=2_000_000)
+    p.add_argument("--batch", type=int, default=10_000)
+    p.add_argument("--db", default=os.path.join(tempfile.mkdtemp(), "activity.sqlite"))
+    a = p.parse_args()
+    sys.exit(0 if run(a.users, a.events, a.batch, a.db) else 1)
@@ -0,0 +1,107 @@
+# benchmarks/admission.py
+# A traffic spike on the LLM-bound routes with ADMISSION=0 and =1. Each burst
+# fires --clients concurrent, distinct requests (no cache hits, nothing to
+# coalesce) at a model slower than the routes can absorb, with every client
+# giving up after --client-timeout seconds (sent as X-Deadline-Ms too). One
+# request in --high-every is sent with X-Priority: high.
+#   explain         /explain
+#   logs_analyze    /logs/analyze with a log the rules can't parse
+#   agent           /agent with completed missions and emissions
+# Reported per burst: answers from the model ("full"), flagged fallback
+# answers ("degraded"), clients that timed out or got an error, and latency
+# of each kind. With admission on, a spike should cost degraded answers
+# served at once instead of client timeouts.
+#   python -m benchmarks.admission [--clients 120] [--stub-latency 1.0] [--client-timeout 4]
+import sys, time, asyncio, argparse
+
+import httpx
+
+from benchmarks.servers import stub_and_app
+
+ANALYZE = {"mode": "bus", "distance_km": 12, "meat_meals": 1, "veg_meals": 2,
+           "electricity_kwh": 4, "lpg_kg": 0.2, "waste_kg": 0.3, "period": "day"}
+
+# route -> (path, body of the i-th request, model calls per full answer)
+BURSTS = {
+    "explain": ("/explain", lambda i: {"question": f"Why does heat stress rise in city {i}?"}, 1),
+    "logs_analyze": ("/logs/analyze", lambda i: {"text": f"went to the market for errand {i} and cooked dinner"}, 2),
+    "agent": ("/agent", lambda i: {"task": f"How am I doing this week? ({i})",
+                                   "completed_missions": ["m_walk", "m_veg"], "emissions": ANALYZE}, 2),
+}
+
+def pct(xs, q):
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1000 if xs else float("nan")
+
+async def burst(base, path, body, n, timeout, high_every):
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=n + 4)) as client:
+        async def one(i):
+            high = i % high_every == 0
+            headers = {"X-Deadline-Ms": str(int(timeout * 1000)), "X-Priority": "high" if high else "normal"}
+            t0 = time.perf_counter()
+            try:
+                r = await client.post(base + path, json=body(i), headers=headers, timeout=timeout)
+            except httpx.TimeoutException:
+                return "timeout", time.perf_counter() - t0, high
+            except httpx.HTTPError:
+                return "error", time.perf_counter() - t0, high
+            if r.status_code != 200:
+                return "error", time.perf_counter() - t0, high
+            kind = "degraded" if r.json().get("degraded") else "full"
+            return kind, time.perf_counter() - t0, high
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(n)))
+        wall = time.perf_counter() - t0
+    out = {"wall": wall}
+    for kind in ("full", "degraded", "timeout", "error"):
+        lat = sorted(t for k, t, _ in results if k == kind)
+        out[kind] = {"n": len(lat), "p50": pct(lat, 0.5), "p95": pct(lat, 0.95)}
+    highs = [k for k, _, h in results if h]
+    out["high_full"] = f"{highs.count('full')}/{len(highs)}"
+    return out
+
+async def run_mode(base, a):
+    out = {}
+    for name, (path, body, _) in BURSTS.items():
+        out[name] = await burst(base, path, body, a.clients, a.client_timeout, a.high_every)
+        await asyncio.sleep(a.stub_latency * 2)  # let stragglers from timed-out clients drain
+    async with httpx.AsyncClient() as client:
+        out["stats"] = (await client.get(base + "/admission/stats")).json()
+    return out
+
+def main(a):
+    runs = {}
+    for mode in ("0", "1"):
+        env = {"ADMISSION": mode, "ACTIVITY_DB": "", "LLM_MAX_CONCURRENCY": str(a.llm_slots)}
+        for route, (_, _, calls) in BURSTS.items():
+            env[f"ADMIT_{route.upper()}_SLOTS"] = str(a.llm_slots)
+            env[f"ADMIT_{route.upper()}_QUEUE"] = str(a.llm_slots * 2)
+            env[f"ADMIT_{route.upper()}_SERVICE_S"] = str(a.stub_latency * calls)
+        with stub_and_app(a.stub_latency, env) as (base, _):
+            runs[mode] = results = asyncio.run(run_mode(base, a))
+        print(f"\nADMISSION={mode}: {a.clients} concurrent clients per route, model {a.stub_latency}s/call, "
+              f"{a.llm_slots} LLM slots, clients give up after {a.client_timeout}s")
+        for name in BURSTS:
+            r = results[name]
+            cells = "  ".join(f"{k} {r[k]['n']:3d} (p50 {r[k]['p50']:7.0f}ms p95 {r[k]['p95']:7.0f}ms)"
+                              for k in ("full", "degraded", "timeout") if r[k]["n"])
+            print(f"  {name:13s} wall {r['wall']:5.1f}s  {cells}  errors {r['error']['n']}  high-priority full {r['high_full']}")
+        if mode == "1":
+            for route, st in results["stats"]["routes"].items():
+                print(f"  /admission/stats {route:13s} admitted {st['admitted']:3d}  queued {st['queued']:3d}  "
+                      f"shed {st['shed']}  degraded {st['degraded']}")
+
+    answered = {m: sum(runs[m][b]["full"]["n"] + runs[m][b]["degraded"]["n"] for b in BURSTS) for m in runs}
+    failed = {m: sum(runs[m][b]["timeout"]["n"] + runs[m][b]["error"]["n"] for b in BURSTS) for m in runs}
+    print(f"\nanswered within the client timeout, off -> on: {answered['0']} -> {answered['1']}"
+          f"  (timeouts/errors {failed['0']} -> {failed['1']})")
+    return 0 if failed["1"] <= failed["0"] and answered["1"] >= answered["0"] else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.admission")
+    p.add_argument("--clients", type=int, default=120)
+    p.add_argument("--stub-latency", type=float, default=1.0)
+    p.add_argument("--client-timeout", type=float, default=4.0)
+    p.add_argument("--llm-slots", type=int, default=8, help="LLM_MAX_CONCURRENCY and each route's admission slots")
+    p.add_argument("--high-every", type=int, default=10, help="every n-th request is X-Priority: high")
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,58 @@
+# benchmarks/agent_latency.py
+# /agent vs /agent/stream against the local OpenAI stub (which answers the
+# first round with tool calls). Prints total latency, time to the first
+# answer token, and the per-round / per-tool breakdown from `meta`.
+#   python -m benchmarks.agent_latency [--stub-latency 0.5] [--n 5]
+import sys, json, time, argparse, statistics
+
+import httpx
+
+from benchmarks.servers import stub_and_app
+
+BODY = {"task": "How many points do I have and what did my bus commute emit?",
+        "completed_missions": ["m1", "m2"]}
+
+def summary(xs):
+    return f"p50={statistics.median(xs) * 1000:7.0f}ms  mean={statistics.mean(xs) * 1000:7.0f}ms"
+
+def run_stream(client, url):
+    t0 = time.perf_counter()
+    first_token, done = None, None
+    with client.stream("POST", url, json=BODY) as r:
+        event = None
+        for line in r.iter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - t0
+                elif event == "done":
+                    done = json.loads(line[6:])
+    return first_token, time.perf_counter() - t0, done
+
+def run(stub_latency, n):
+    with stub_and_app(stub_latency) as (base, _):
+        with httpx.Client(timeout=60) as client:
+            blocking, meta = [], None
+            for _ in range(n):
+                t0 = time.perf_counter()
+                r = client.post(base + "/agent", json=BODY)
+                r.raise_for_status()
+                blocking.append(time.perf_counter() - t0)
+                meta = r.json()["meta"]
+            streamed = [run_stream(client, base + "/agent/stream") for _ in range(n)]
+
+    print(f"stub latency per call = {stub_latency}s, n={n}")
+    print(f"/agent         total     {summary(blocking)}")
+    print(f"/agent/stream  1st token {summary([s[0] for s in streamed])}")
+    print(f"/agent/stream  total     {summary([s[1] for s in streamed])}")
+    print("last /agent meta:")
+    print(json.dumps(meta, indent=2))
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.agent_latency")
+    p.add_argument("--stub-latency", type=float, default=0.5)
+    p.add_argument("--n", type=int, default=3)
+    a = p.parse_args()
+    run(a.stub_latency, a.n)
+    sys.exit(0)
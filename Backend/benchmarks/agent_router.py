@@ -0,0 +1,77 @@
+# benchmarks/agent_router.py
+# The /agent intent router on a replayed task corpus
+# (benchmarks/data/agent_tasks.jsonl: task, request fields, and the tools a
+# correct route runs, or null when the model should plan):
+#   routing   hit rate, wrong routes (routed a task the model should plan,
+#             or with other tools) and route() latency
+#   http      every task through /agent against the OpenAI stub (which
+#             answers the first tool-enabled round with tool calls), with
+#             AGENT_ROUTER=0, AGENT_ROUTER=1, and AGENT_ROUTER=1 with
+#             answer="template": p50/mean latency, model calls and tokens
+#   python -m benchmarks.agent_router [corpus.jsonl] [--stub-latency 0.5] [--repeat 2]
+import os, sys, json, time, argparse, statistics
+
+import httpx
+
+import agent_router
+from benchmarks.servers import stub_and_app
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def routing(rows):
+    hits = wrong = 0
+    t = time.perf_counter()
+    for r in rows:
+        got = agent_router.route(r["task"], bool(r.get("completed_missions")), r.get("emissions") is not None)
+        want = tuple(n for n in agent_router.TOOLS if n in r["expect"]) if r["expect"] else None
+        hits += got is not None
+        if got != want:
+            wrong += 1
+            print(f"  route {got} != expected {want}: {r['task']}")
+    us = (time.perf_counter() - t) / len(rows) * 1e6
+    routable = sum(1 for r in rows if r["expect"])
+    print(f"routing: {len(rows)} tasks, {routable} routable; routed {hits} ({hits / len(rows):.0%} hit rate, "
+          f"{hits / max(routable, 1):.0%} of routable), wrong {wrong}, route() {us:.0f}us/task")
+    return wrong == 0
+
+def replay(base, rows, repeat, answer):
+    lat, calls, tokens = [], 0, 0
+    with httpx.Client(timeout=120) as client:
+        for _ in range(repeat):
+            for r in rows:
+                body = {k: v for k, v in r.items() if k != "expect"}
+                if answer:
+                    body["answer"] = answer
+                t = time.perf_counter()
+                resp = client.post(base + "/agent", json=body)
+                lat.append(time.perf_counter() - t)
+                resp.raise_for_status()
+                meta = resp.json()["meta"]
+                calls += sum(1 for rd in meta["rounds"] if not rd.get("routed"))
+                tokens += meta["tokens"]
+    return lat, calls, tokens
+
+def main(a):
+    rows = load(a.corpus)
+    ok = routing(rows)
+    runs = (("router off", "0", None), ("router on", "1", None), ("router on, template", "1", "template"))
+    base_lat = None
+    for name, enabled, answer in runs:
+        with stub_and_app(a.stub_latency, {"AGENT_ROUTER": enabled, "ACTIVITY_DB": ""}) as (base, _):
+            replay(base, rows[:2], 1, answer)  # warm up
+            lat, calls, tokens = replay(base, rows, a.repeat, answer)
+        n = len(lat)
+        saved = "" if base_lat is None else f"  saved {(base_lat - statistics.mean(lat)) * 1000:6.0f}ms/request"
+        base_lat = base_lat or statistics.mean(lat)
+        print(f"{name:20s} p50 {statistics.median(lat) * 1000:6.0f}ms  mean {statistics.mean(lat) * 1000:6.0f}ms  "
+              f"model calls {calls / n:4.2f}/request  tokens {tokens / n:5.1f}/request{saved}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.agent_router")
+    p.add_argument("corpus", nargs="?", default=os.path.join(os.path.dirname(__file__), "data", "agent_tasks.jsonl"))
+    p.add_argument("--stub-latency", type=float, default=0.5)
+    p.add_argument("--repeat", type=int, default=2)
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,53 @@
+# benchmarks/batch.py
+# Compares per-row analyze_payload against the vectorized analyze_batch and
+# checks that both produce identical results.
+#   python -m benchmarks.batch [rows]
+import os, sys, time, random
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+import app
+
+MODES = ["petrol_car", "bus", "walk_cycle", "electric_car", None]
+
+def make_rows(n, seed=7):
+    rnd = random.Random(seed)
+    return [
+        {
+            "mode": rnd.choice(MODES),
+            "distance_km": round(rnd.uniform(-1, 60), rnd.choice([0, 1, 2, 3])),
+            "meat_meals": rnd.randint(0, 3),
+            "veg_meals": rnd.randint(0, 3),
+            "electricity_kwh": round(rnd.uniform(0, 20), 3),
+            "lpg_kg": round(rnd.uniform(0, 2), 3),
+            "waste_kg": round(rnd.uniform(0, 3), 3),
+            "period": rnd.choice(["day", "week"]),
+        }
+        for _ in range(n)
+    ]
+
+def run(n):
+    rows = make_rows(n)
+
+    t0 = time.perf_counter()
+    expected = [app.analyze_payload(app.AnalyzeInput(**r)) for r in rows]
+    t_row = time.perf_counter() - t0
+
+    columns = {k: [r[k] for r in rows] for k in rows[0]}
+    t0 = time.perf_counter()
+    batch = app.analyze_batch(columns, n)
+    t_vec = time.perf_counter() - t0
+    got = app.batch_rows(batch, list(app.DEFAULT_TIPS))
+    t_vec_rows = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(expected, got) if a != b)
+    print(f"rows={n}")
+    print(f"  per-row analyze_payload : {t_row:.3f}s")
+    print(f"  analyze_batch (arrays)  : {t_vec:.3f}s")
+    print(f"  analyze_batch + rows    : {t_vec_rows:.3f}s")
+    print(f"  mismatches              : {mismatches}")
+    return mismatches
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    sys.exit(1 if run(n) else 0)
@@ -0,0 +1,114 @@
+# benchmarks/climate_tiles.py
+# Map tile pyramids on a synthetic year of daily tasmax (--res° fixtures):
+#   build     wall time of climate_tiles.build (one streamed pass over the file)
+#   levels    per pyramid level, the full-India annual window: shape, bytes as
+#             JSON / int16 / float16 / gzipped int16, and encode latency cold
+#             (response cache cleared) vs hot
+#   error     max |dequantized - exact float64 mean| per level (int16 and float16)
+#   viewport  level picked for typical map viewports
+#   http      GET /data/india/tiles in process, p50/p99 per level, and p50 of
+#             a revalidation (If-None-Match -> 304)
+#   python -m benchmarks.climate_tiles [--root /tmp/nex-tiles] [--res 0.25] [--repeat 200]
+import os, sys, time, shutil, argparse
+
+import numpy as np
+
+from benchmarks.fixtures import write_fixtures
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1000
+
+def main(a):
+    root = os.path.join(a.root, "nex")
+    os.environ["CLIMATE_TILE_DIR"] = tiles = os.path.join(a.root, "tiles")
+    os.environ.setdefault("ACTIVITY_DB", "")
+    write_fixtures(root, years=(a.year, a.year), res=a.res)
+    shutil.rmtree(tiles, ignore_errors=True)
+    import climate, climate_tiles
+
+    t = time.perf_counter()
+    directory = climate_tiles.build("tasmax", "historical", "MIROC6", a.year, root)
+    print(f"build: {(time.perf_counter() - t) * 1000:.0f}ms at {a.res}° "
+          f"({sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 1024:.0f} KiB on disk)")
+    p, _ = climate_tiles.pyramid("tasmax", "historical", "MIROC6", a.year)
+    full = dict(climate.INDIA_BBOX)
+
+    # exact float64 means to measure quantization against
+    src = climate_tiles.monthly_sums(climate.nex_key("tasmax", "historical", "MIROC6", a.year), "tasmax", root)
+    sums = np.concatenate([src["sums"].sum(axis=0, keepdims=True), src["sums"]])
+    counts = np.concatenate([src["counts"].sum(axis=0, keepdims=True), src["counts"]])
+
+    ok = True
+    print(f"{'level':>5} {'shape':>9} {'json':>9} {'int16':>9} {'float16':>9} {'int16+gz':>9}  "
+          f"{'cold p50':>8} {'hot p50':>8} {'hot p99':>8}  {'err int16':>9} {'err f16':>8}")
+    for level in range(len(p.levels)):
+        window = p.window(level, full)
+        size = {}
+        for name, fmt, dtype, coding in (("json", "json", "int16", "identity"), ("int16", "bin", "int16", "identity"),
+                                         ("float16", "bin", "float16", "identity"), ("gz", "bin", "int16", "gzip")):
+            size[name] = len(climate_tiles.encoded(p.directory, level, 0, window, fmt, dtype)[0].coded(coding))
+        cold, hot = [], []
+        for _ in range(a.repeat):
+            climate_tiles.encoded.cache_clear()
+            t = time.perf_counter()
+            climate_tiles.encoded(p.directory, level, 0, window, "bin", "int16")
+            cold.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            climate_tiles.encoded(p.directory, level, 0, window, "bin", "int16")
+            hot.append(time.perf_counter() - t)
+        f = 2 ** level
+        exact = climate_tiles.block_mean(sums, counts, f)[0] if f > 1 else np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        stored = climate_tiles.dequantize(np.asarray(p.arrays[level]))
+        body, _ = climate_tiles.encoded(p.directory, level, 0, window, "bin", "float16")
+        _, half = climate_tiles.decode(body.body)
+        i0, i1, j0, j1 = window
+        err16 = float(np.nanmax(np.abs(stored - exact)))
+        errf = float(np.nanmax(np.abs(half - exact[0, i0:i1, j0:j1])))
+        ok &= err16 <= climate_tiles.SCALE / 2 + 1e-6
+        shape = f"{i1 - i0}x{j1 - j0}"
+        print(f"{level:5d} {shape:>9} {size['json']:9,d} {size['int16']:9,d} {size['float16']:9,d} {size['gz']:9,d}  "
+              f"{pct(cold, 0.5):7.3f}ms {pct(hot, 0.5):7.4f}ms {pct(hot, 0.99):7.4f}ms  {err16:9.4f} {errf:8.4f}")
+
+    viewports = {
+        "India, 1024px": (full, 1024, 1024),
+        "India, 128px": (full, 128, 128),
+        "India, 32px": (full, 32, 32),
+        "India, 8px": (full, 8, 8),
+        "state 8°, 256px": (climate_tiles.parse_bbox("72,15,80,23"), 256, 256),
+        "city 1°, 256px": (climate_tiles.parse_bbox("77,28,78,29"), 256, 256),
+    }
+    for name, (bbox, w, h) in viewports.items():
+        level = p.pick_level(bbox, w, h)
+        i0, i1, j0, j1 = p.window(level, bbox)
+        print(f"viewport {name:16s} -> level {level} ({i1 - i0}x{j1 - j0} cells)")
+
+    from fastapi.testclient import TestClient
+    import app
+    client = TestClient(app.app)
+    for level in range(len(p.levels)):
+        params = {"year": a.year, "level": level}
+        client.get("/data/india/tiles", params=params)
+        lat = []
+        for _ in range(a.repeat):
+            t = time.perf_counter()
+            r = client.get("/data/india/tiles", params=params, headers={"Accept-Encoding": "identity"})
+            lat.append(time.perf_counter() - t)
+            assert r.status_code == 200, r.text
+        revalidate = []
+        for _ in range(a.repeat):
+            t = time.perf_counter()
+            r304 = client.get("/data/india/tiles", params=params, headers={"If-None-Match": r.headers["etag"]})
+            revalidate.append(time.perf_counter() - t)
+            assert r304.status_code == 304, r304.status_code
+        print(f"http level {level}: p50 {pct(lat, 0.5):6.2f}ms  p99 {pct(lat, 0.99):6.2f}ms  {len(r.content):,d} bytes  "
+              f"304 p50 {pct(revalidate, 0.5):6.2f}ms")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.climate_tiles")
+    p.add_argument("--root", default="/tmp/nex-tiles")
+    p.add_argument("--res", type=float, default=0.25)
+    p.add_argument("--year", type=int, default=2014)
+    p.add_argument("--repeat", type=int, default=200)
+    sys.exit(main(p.parse_args()))
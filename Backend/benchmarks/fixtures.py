@@ -0,0 +1,100 @@
+# benchmarks/fixtures.py
+# Writes small synthetic NEX-GDDP-CMIP6-like NetCDF files laid out like the
+# S3 bucket, so climate code can run offline with NEX_LOCAL_ROOT=<root>, and
+# a synthetic state boundaries GeoJSON for REGION_BOUNDARIES_FILE.
+#   python -m benchmarks.fixtures <root> [--years 2010 2014] [--models MIROC6 ...] [--boundaries <file>]
+import os, sys, json, zlib, argparse
+
+import numpy as np, pandas as pd, xarray as xr
+
+from climate import nex_key
+
+def make_dataset(variable, model, year, res=0.5, lon=(60.0, 100.0), lat=(0.0, 40.0)):
+    lats = np.arange(lat[0] + res / 2, lat[1], res)
+    lons = np.arange(lon[0] + res / 2, lon[1], res)
+    time = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D")
+    seed = zlib.crc32(f"{variable}/{model}/{year}".encode())
+    rnd = np.random.default_rng(seed)
+    doy = np.arange(len(time))[:, None, None]
+    base = 300.0 - 0.4 * np.abs(lats - 20.0)[None, :, None] + 0.02 * (year - 2000)
+    seasonal = 6.0 * np.sin(2 * np.pi * (doy - 100) / 365.0)
+    data = (base + seasonal + rnd.normal(0, 1.5, (len(time), len(lats), len(lons)))).astype("float32")
+    da = xr.DataArray(data, coords={"time": time, "lat": lats, "lon": lons},
+                      dims=("time", "lat", "lon"), attrs={"units": "K"})
+    return xr.Dataset({variable: da})
+
+# "india" keeps fixtures small; "global" mimics the real NEX grid extent
+EXTENTS = {"india": ((60.0, 100.0), (0.0, 40.0)), "global": ((0.0, 360.0), (-60.0, 90.0))}
+
+def write_fixtures(root, variables=("tasmax",), scenario="historical", models=("MIROC6",),
+                   years=(2014, 2014), res=0.5, chunk_days=None, extent="india"):
+    paths = []
+    for variable in variables:
+        for model in models:
+            for year in range(years[0], years[1] + 1):
+                key = nex_key(variable, scenario, model, year)
+                path = os.path.join(root, key)
+                if os.path.exists(path):
+                    paths.append(path)
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                lon, lat = EXTENTS[extent]
+                ds = make_dataset(variable, model, year, res=res, lon=lon, lat=lat)
+                enc = {variable: {"zlib": True, "complevel": 1}}
+                if chunk_days:
+                    n_lat, n_lon = ds.sizes["lat"], ds.sizes["lon"]
+                    enc[variable]["chunksizes"] = (chunk_days, min(n_lat, 20), min(n_lon, 20))
+                ds.to_netcdf(path, engine="netcdf4", encoding=enc)
+                paths.append(path)
+    return paths
+
+def write_boundaries(path, cols=6, rows=6, lon=(68.0, 98.0), lat=(8.0, 36.0)):
+    """
+    cols x rows synthetic "states" S01.. tiling lon x lat, with slanted
+    column edges. S01 has a hole filled by enclave "UT1", and S02 also owns
+    an island south of the tiling (MultiPolygon). No "IN" feature, so India
+    is the union of the states. Returns the number of regions.
+    """
+    dx, dy = (lon[1] - lon[0]) / cols, (lat[1] - lat[0]) / rows
+    edge = lambda i, y: lon[0] + i * dx + (0.0 if i in (0, cols) else 0.4 * dx * (y - lat[0]) / (lat[1] - lat[0]))
+    features = []
+    for r in range(rows):
+        y0, y1 = lat[0] + r * dy, lat[0] + (r + 1) * dy
+        for c in range(cols):
+            ring = [[edge(c, y0), y0], [edge(c + 1, y0), y0], [edge(c + 1, y1), y1], [edge(c, y1), y1], [edge(c, y0), y0]]
+            features.append({"code": f"S{r * cols + c + 1:02d}", "rings": [ring]})
+    cx, cy = lon[0] + 0.45 * dx, lat[0] + 0.5 * dy
+    hole = [[cx - 1, cy - 1], [cx - 1, cy + 1], [cx + 1, cy + 1], [cx + 1, cy - 1], [cx - 1, cy - 1]]
+    features[0]["rings"].append(hole)
+    island = [[72.0, 6.5], [74.0, 6.5], [73.0, 7.8], [72.0, 6.5]]
+
+    out = []
+    for f in features:
+        geom = {"type": "Polygon", "coordinates": f["rings"]}
+        if f["code"] == "S02":
+            geom = {"type": "MultiPolygon", "coordinates": [f["rings"], [island]]}
+        out.append({"type": "Feature", "properties": {"code": f["code"], "name": f"State {f['code'][1:]}"}, "geometry": geom})
+    out.append({"type": "Feature", "properties": {"code": "UT1", "name": "Enclave 1"},
+                "geometry": {"type": "Polygon", "coordinates": [hole[::-1]]}})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as fh:
+        json.dump({"type": "FeatureCollection", "features": out}, fh)
+    return len(out) + 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.fixtures")
+    p.add_argument("root")
+    p.add_argument("--variables", nargs="+", default=["tasmax"])
+    p.add_argument("--scenario", default="historical")
+    p.add_argument("--models", nargs="+", default=["MIROC6"])
+    p.add_argument("--years", nargs=2, type=int, default=[2014, 2014])
+    p.add_argument("--res", type=float, default=0.5)
+    p.add_argument("--chunk-days", type=int, default=None)
+    p.add_argument("--extent", choices=sorted(EXTENTS), default="india")
+    p.add_argument("--boundaries", help="also write synthetic state boundaries GeoJSON here")
+    a = p.parse_args()
+    out = write_fixtures(a.root, a.variables, a.scenario, a.models, tuple(a.years), a.res, a.chunk_days, a.extent)
+    print(f"{len(out)} files under {a.root}")
+    if a.boundaries:
+        print(f"{write_boundaries(a.boundaries)} regions in {a.boundaries}")
+    sys.exit(0)
@@ -0,0 +1,180 @@
+# benchmarks/heat_extremes.py
+# Peak RSS and wall time of the heat-extreme indicators over growing year
+# ranges: climate_extremes (streamed blocks + histogram sketch) vs loading
+# every year's daily cube into memory and reducing it with exact numpy
+# percentiles. Each run is a fresh subprocess so ru_maxrss is its own peak
+# (the baseline after imports is printed alongside). Hot/heatwave
+# days must match exactly, percentiles within one histogram bin. First,
+# HeatAccumulator's hot/heatwave day counts are checked against a brute-force
+# run count on --fuzz random series fed in random block sizes (1-9 days,
+# min_days 1-5, a reset_runs() now and then).
+#   python -m benchmarks.heat_extremes [--root /tmp/nex-heat] [--years 1 2 4 8] [--res 0.25] [--threshold 32] [--fuzz 400]
+import os, sys, json, time, argparse, resource, subprocess
+
+import numpy as np
+
+from benchmarks.fixtures import write_fixtures, write_boundaries
+from benchmarks.servers import BACKEND_DIR
+
+START = 2001
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def naive(root, years, threshold_c, min_days, q):
+    """Whole cube in memory, exact weighted percentiles; same definitions as HeatAccumulator."""
+    import numpy as np
+    import climate, region_masks
+
+    cubes, day_years = [], []
+    for y in range(START, START + years):
+        ds = climate.open_nex_dataset(climate.nex_key("tasmax", "historical", "MIROC6", y), root=root)
+        da = climate.to_celsius(climate.subset_bbox(ds["tasmax"]))
+        lat, lon = da["lat"].values, da["lon"].values
+        cubes.append(np.asarray(da.values, dtype=np.float64).reshape(da.sizes["time"], -1))
+        day_years.append(da["time"].dt.year.values)
+        ds.close()
+    cube, day_years = np.concatenate(cubes), np.concatenate(day_years)
+    del cubes
+    codes, w = region_masks.weights(lat, lon)
+
+    hot = cube > threshold_c
+    runs = np.zeros(cube.shape, dtype=np.int32)
+    for i in range(len(cube)):
+        runs[i] = (runs[i - 1] + 1) * hot[i] if i else hot[i]
+    # a day is in a heatwave if the run it belongs to reaches min_days
+    wave = np.zeros(cube.shape, dtype=bool)
+    for i in range(len(cube) - 1, -1, -1):
+        ends = runs[i] >= min_days
+        wave[i] = ends | (wave[i + 1] & hot[i] if i + 1 < len(cube) else False)
+
+    out = {c: [] for c in codes}
+    for y in np.unique(day_years):
+        d = day_years == y
+        area = w.sum(axis=1)
+        hot_days = (hot[d].astype(np.float64) @ w.T).sum(axis=0) / area
+        wave_days = (wave[d].astype(np.float64) @ w.T).sum(axis=0) / area
+        for j, c in enumerate(codes):
+            cells = np.nonzero(w[j])[0]
+            vals = cube[d][:, cells].ravel()
+            wts = np.broadcast_to(w[j, cells], (int(d.sum()), len(cells))).ravel()
+            order = np.argsort(vals)
+            cum = np.cumsum(wts[order])
+            p = float(vals[order][np.searchsorted(cum, q / 100 * cum[-1])])
+            out[c].append({"year": int(y), "hot_days": round(float(hot_days[j]), 2),
+                           "heatwave_days": round(float(wave_days[j]), 2), "p": p})
+    return out
+
+def streamed(root, years, threshold_c, min_days, q):
+    import climate_extremes
+    data = climate_extremes.heat_extremes("historical", "MIROC6", START, START + years - 1,
+                                          threshold_c, min_days, (q,), root=root)
+    key = climate_extremes.percentile_key(q)
+    return {c: [{**{k: v for k, v in r.items() if k != key}, "p": r[key]} for r in rows]
+            for c, rows in data["regions"].items()}
+
+def brute_force(hot, years, k, breaks):
+    """Per year, hot and heatwave days per cell; runs are cut at the `breaks` day indices."""
+    hot_days, wave_days = {}, {}
+    for c in range(hot.shape[1]):
+        start = None
+        for i in range(len(hot) + 1):
+            if i < len(hot) and hot[i, c] and not (i in breaks and start is not None):
+                start = i if start is None else start
+                continue
+            if start is not None and i - start >= k:
+                for d in range(start, i):
+                    wave_days.setdefault(int(years[d]), np.zeros(hot.shape[1]))[c] += 1
+            start = i if i < len(hot) and hot[i, c] else None
+    for y in np.unique(years):
+        hot_days[int(y)] = hot[years == y].sum(axis=0).astype(np.float64)
+    return hot_days, wave_days
+
+def fuzz(runs, seed=5):
+    """HeatAccumulator vs brute_force on random blocks; returns the number of mismatches."""
+    import climate_extremes
+    rnd = np.random.default_rng(seed)
+    bad = 0
+    for _ in range(runs):
+        cells, k = int(rnd.integers(1, 4)), int(rnd.integers(1, 6))
+        n = int(rnd.integers(1, 40))
+        years = 2000 + np.sort(rnd.integers(0, 3, n))
+        block = np.where(rnd.random((n, cells)) < 0.7, 35.0, 20.0)
+        block[rnd.random((n, cells)) < 0.05] = np.nan
+        acc = climate_extremes.HeatAccumulator([f"C{c}" for c in range(cells)], np.eye(cells), 30.0, k)
+        i, breaks = 0, set()
+        while i < n:
+            if i and rnd.random() < 0.1:
+                acc.reset_runs()
+                breaks.add(i)
+            size = int(rnd.integers(1, 10))
+            acc.add(block[i:i + size], years[i:i + size])
+            i += size
+        hot_days, wave_days = brute_force(block > 30.0, years, k, breaks)
+        for y in hot_days:
+            want = wave_days.get(y, np.zeros(cells))
+            if not (np.allclose(acc.hot[y], hot_days[y]) and np.allclose(acc.wave.get(y, 0), want)):
+                bad += 1
+                break
+    return bad
+
+def child(a):
+    os.environ["REGION_BOUNDARIES_FILE"] = os.path.join(a.root, "india_states.geojson")
+    os.environ["REGION_MASK_DIR"] = os.path.join(a.root, "masks")
+    import numpy, xarray, climate, climate_extremes, region_masks  # noqa: F401 (baseline includes imports)
+    base = rss_mb()
+    t0 = time.perf_counter()
+    fn = naive if a.child == "naive" else streamed
+    result = fn(a.root, a.years[0], a.threshold, a.min_days, a.percentile)
+    print(json.dumps({"wall_s": time.perf_counter() - t0, "rss_mb": rss_mb(), "base_mb": base, "result": result}))
+    return 0
+
+def run(a):
+    bad = fuzz(a.fuzz)
+    print(f"fuzz: {a.fuzz} random series in random block sizes, {bad} mismatches vs brute-force run counts")
+    if bad:
+        return 1
+    t0 = time.perf_counter()
+    write_fixtures(a.root, years=(START, START + max(a.years) - 1), res=a.res)
+    write_boundaries(os.path.join(a.root, "india_states.geojson"))
+    print(f"fixtures: {max(a.years)} years at {a.res}° ({time.perf_counter() - t0:.1f}s to prepare)")
+
+    ok = True
+    print(f"{'years':>5}  {'streamed s':>10} {'peak MB':>8}   {'in-memory s':>11} {'peak MB':>8}   counts equal  max p{a.percentile:g} diff")
+    for n in a.years:
+        runs = {}
+        for mode in ("stream", "naive"):
+            cmd = [sys.executable, "-m", "benchmarks.heat_extremes", "--child", mode, "--root", a.root,
+                   "--years", str(n), "--threshold", str(a.threshold), "--min-days", str(a.min_days),
+                   "--percentile", str(a.percentile)]
+            out = subprocess.run(cmd, cwd=BACKEND_DIR, capture_output=True, text=True)
+            if out.returncode:
+                print(out.stderr)
+                return 1
+            runs[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+        s, m = runs["stream"], runs["naive"]
+        counts = all(
+            (rs["year"], rs["hot_days"], rs["heatwave_days"]) == (rm["year"], rm["hot_days"], rm["heatwave_days"])
+            for c in m["result"] for rs, rm in zip(s["result"][c], m["result"][c]))
+        pdiff = max(abs(rs["p"] - rm["p"]) for c in m["result"] for rs, rm in zip(s["result"][c], m["result"][c]))
+        ok = ok and counts and pdiff <= a.bin + 0.01
+        print(f"{n:5d}  {s['wall_s']:10.2f} {s['rss_mb']:8.1f}   {m['wall_s']:11.2f} {m['rss_mb']:8.1f}   "
+              f"{str(counts):>12}  {pdiff:.3f} °C")
+    print(f"peak RSS includes ~{s['base_mb']:.0f} MB of interpreter + numpy/xarray after imports")
+    sample = s["result"]["IN"][-1]
+    print(f"IN {sample['year']}: {sample}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.heat_extremes")
+    p.add_argument("--root", default="/tmp/nex-heat")
+    p.add_argument("--years", type=int, nargs="+", default=[1, 2, 4, 8], help="year-range lengths to time")
+    p.add_argument("--res", type=float, default=0.25)
+    p.add_argument("--threshold", type=float, default=32.0, help="°C; fixtures rarely exceed 40")
+    p.add_argument("--min-days", type=int, default=3)
+    p.add_argument("--percentile", type=float, default=95.0)
+    p.add_argument("--bin", type=float, default=0.1, help="HEAT_HIST_BIN_C the app uses")
+    p.add_argument("--fuzz", type=int, default=400, help="random series for the brute-force check")
+    p.add_argument("--child", choices=["stream", "naive"], help=argparse.SUPPRESS)
+    a = p.parse_args()
+    sys.exit(child(a) if a.child else run(a))
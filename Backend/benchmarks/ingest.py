@@ -0,0 +1,102 @@
+# benchmarks/ingest.py
+# Throughput of POST /ingest (NDJSON in/out) on a generated file, with the
+# app under uvicorn and the OpenAI stub behind it. Rows are mostly structured
+# AnalyzeInput rows plus free-text logs (most resolved by the rule parser, the
+# rest sent to the stub). Reports rows/s and the app's peak RSS, which should
+# not grow with the file size.
+#   python -m benchmarks.ingest [--lines 1000000] [--text-share 0.05]
+#
+# Upload and download run concurrently (aiohttp): /ingest applies backpressure,
+# so a client that sends the whole body before reading would stall.
+import os, sys, json, time, random, asyncio, argparse
+
+import aiohttp
+
+from benchmarks.servers import stub_and_app
+
+RULE_TEXTS = ["took the bus 12 km and had 2 veg meals", "drove 8 km, 1 chicken biryani",
+              "cycled 5 km and ate dal for lunch", "used 6 kwh electricity and 0.5 kg waste"]
+LLM_TEXTS = ["went to Pune for a wedding, long day", "busy day at college"]
+
+def write_file(path, lines, text_share, llm_share, seed=3):
+    rnd = random.Random(seed)
+    modes = ["petrol_car", "bus", "walk_cycle", "electric_car", None]
+    with open(path, "w") as f:
+        for i in range(lines):
+            r = rnd.random()
+            if r < text_share * llm_share:
+                row = {"text": rnd.choice(LLM_TEXTS)}
+            elif r < text_share:
+                row = {"text": rnd.choice(RULE_TEXTS)}
+            else:
+                row = {"mode": rnd.choice(modes), "distance_km": round(rnd.uniform(0, 40), 1),
+                       "veg_meals": rnd.randint(0, 3), "meat_meals": rnd.randint(0, 2),
+                       "electricity_kwh": round(rnd.uniform(0, 8), 1)}
+            f.write(json.dumps(row) + "\n")
+    return os.path.getsize(path)
+
+def app_pid(port):
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmd = f.read().split(b"\0")
+        except OSError:
+            continue
+        if b"app:app" in cmd and str(port).encode() in cmd:
+            return int(pid)
+    return None
+
+def peak_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(("VmHWM", "VmRSS")):
+                yield line.split(":")[0], int(line.split()[1]) / 1024
+
+async def post_file(url, path):
+    async def body():
+        with open(path, "rb") as f:
+            while chunk := f.read(256 * 1024):
+                yield chunk
+
+    rows = errors = 0
+    summary = None
+    t0 = time.perf_counter()
+    first = None
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as s:
+        async with s.post(url, data=body(), headers={"Content-Type": "application/x-ndjson"}) as r:
+            async for line in r.content:
+                if first is None:
+                    first = time.perf_counter() - t0
+                if line.startswith(b'{"summary"'):
+                    summary = json.loads(line)["summary"]
+                else:
+                    rows += 1
+                    errors += b'"error"' in line
+    return rows, errors, summary, first, time.perf_counter() - t0
+
+def run(lines, text_share, llm_share, stub_latency, path):
+    size = write_file(path, lines, text_share, llm_share)
+    with stub_and_app(stub_latency, {"ACTIVITY_DB": ""}) as (base, _):
+        pid = app_pid(8900)
+        idle = dict(peak_rss_mb(pid)) if pid else {}
+        rows, errors, summary, first, total = asyncio.run(post_file(base + "/ingest", path))
+        after = dict(peak_rss_mb(pid)) if pid else {}
+
+    print(f"file: {lines:,} lines, {size / 1e6:.0f} MB, text share {text_share:.0%} "
+          f"(of which {llm_share:.0%} need the LLM, stub latency {stub_latency}s)")
+    print(f"results: {rows:,} rows, {errors} errors, first result after {first * 1000:.0f}ms")
+    print(f"total: {total:.1f}s  -> {rows / total:,.0f} rows/s")
+    print(f"server summary: {summary}")
+    if idle:
+        print(f"app RSS: idle {idle['VmRSS']:.0f} MB, peak during ingest {after['VmHWM']:.0f} MB")
+    return rows == lines
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.ingest")
+    p.add_argument("--lines", type=int, default=1_000_000)
+    p.add_argument("--text-share", type=float, default=0.05)
+    p.add_argument("--llm-share", type=float, default=0.2, help="share of text rows the rules can't resolve")
+    p.add_argument("--stub-latency", type=float, default=0.2)
+    p.add_argument("--path", default="/tmp/ingest-bench.ndjson")
+    a = p.parse_args()
+    sys.exit(0 if run(a.lines, a.text_share, a.llm_share, a.stub_latency, a.path) else 1)
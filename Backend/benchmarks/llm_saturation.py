@@ -0,0 +1,62 @@
+# benchmarks/llm_saturation.py
+# Saturates the LLM routes against the local stub and checks that fast routes
+# (/missions, /analyze) keep their latency.
+#   python -m benchmarks.llm_saturation [--llm-clients 200] [--stub-latency 1.0]
+import sys, time, asyncio, argparse, statistics
+
+import httpx
+
+from benchmarks.servers import stub_and_app
+
+ANALYZE = {"mode": "bus", "distance_km": 12, "veg_meals": 2}
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))] * 1000 if xs else float("nan")
+
+async def probe(client, base, seconds):
+    lat = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        for method, path, body in (("GET", "/missions", None), ("POST", "/analyze", ANALYZE)):
+            t0 = time.perf_counter()
+            r = await client.request(method, base + path, json=body)
+            r.raise_for_status()
+            lat.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.01)
+    return lat
+
+async def llm_load(client, base, stop):
+    n = 0
+    while not stop.is_set():
+        await client.post(base + "/explain", json={"question": "What is global warming?"})
+        n += 1
+    return n
+
+async def main(llm_clients, seconds, stub_latency, concurrency):
+    with stub_and_app(stub_latency, {"LLM_MAX_CONCURRENCY": str(concurrency)}) as (base, _):
+        limits = httpx.Limits(max_connections=llm_clients + 10)
+        async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+            idle = await probe(client, base, 2)
+            stop = asyncio.Event()
+            load = [asyncio.create_task(llm_load(client, base, stop)) for _ in range(llm_clients)]
+            await asyncio.sleep(1)  # let the LLM routes saturate
+            busy = await probe(client, base, seconds)
+            stop.set()
+            done = sum(await asyncio.gather(*load))
+
+    print(f"LLM clients={llm_clients} stub latency={stub_latency}s LLM_MAX_CONCURRENCY={concurrency}")
+    print(f"/explain completed during run: {done}")
+    for name, xs in (("idle", idle), ("saturated", busy)):
+        print(f"fast routes {name:9s}: n={len(xs)} p50={pct(xs, 50):.1f}ms p95={pct(xs, 95):.1f}ms "
+              f"mean={statistics.mean(xs) * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.llm_saturation")
+    p.add_argument("--llm-clients", type=int, default=200)
+    p.add_argument("--seconds", type=float, default=5)
+    p.add_argument("--stub-latency", type=float, default=1.0)
+    p.add_argument("--concurrency", type=int, default=32)
+    a = p.parse_args()
+    asyncio.run(main(a.llm_clients, a.seconds, a.stub_latency, a.concurrency))
+    sys.exit(0)
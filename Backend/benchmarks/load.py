@@ -0,0 +1,233 @@
+# benchmarks/load.py
+# End-to-end load test of every route in app.py. The app runs under uvicorn
+# against the local OpenAI stub (benchmarks/stub_openai.py) and a generated
+# NetCDF fixture tree standing in for NEX-GDDP (NEX_LOCAL_ROOT), so no key
+# or network is needed. Each scenario is driven on its own at --concurrency
+# for --requests requests; per scenario the run reports p50/p95/p99 latency,
+# throughput and error rate, and saves everything as JSON for comparing commits.
+#   python -m benchmarks.load [--concurrency 16] [--requests 200] [--stub-latency 0.3]
+#   python -m benchmarks.load --only analyze,explain --out /tmp/run.json
+#   python -m benchmarks.load --compare benchmarks/results/<old>.json
+import os, sys, json, time, asyncio, argparse, platform, subprocess, tempfile, datetime as dt
+
+import httpx
+
+from benchmarks.fixtures import write_fixtures, write_boundaries
+from benchmarks.servers import BACKEND_DIR, stub_and_app
+
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+MODELS = ("MIROC6", "ACCESS-CM2")
+YEARS = (2014, 2016)
+
+ANALYZE = {"mode": "petrol_car", "distance_km": 12, "meat_meals": 1, "veg_meals": 1, "electricity_kwh": 3}
+RULE_LOG = "took the bus 12 km and had 2 veg meals"
+LLM_LOG = "went to Pune for a wedding, long day"
+INGEST_BODY = "\n".join(json.dumps(r) for r in [ANALYZE, {"text": RULE_LOG}, {"text": LLM_LOG}] * 10) + "\n"
+ENSEMBLE = {"models": ",".join(MODELS), "start_year": YEARS[0], "end_year": YEARS[1]}
+
+# name -> (method, path, request kwargs, share of --requests); SSE/NDJSON
+# responses are read to the end, so their latency is time to the last byte
+SCENARIOS = {
+    "missions": ("GET", "/missions", {}, 1.0),
+    "missions_generate": ("POST", "/missions/generate", {"json": {"n": 3}}, 1.0),
+    "missions_generate_fresh": ("POST", "/missions/generate", {"json": {"n": 3}, "params": {"fresh": "true"}}, 0.25),
+    "missions_recommend": ("POST", "/missions/recommend", {"json": {"routine": ANALYZE, "budget_points": 80}}, 1.0),
+    "missions_recommend_batch": ("POST", "/missions/recommend/batch", {"json": {"rows": [ANALYZE] * 500,
+                                                                                "budget_points": 80}}, 0.5),
+    "points_calc": ("POST", "/points/calc", {"json": {"completed_missions": ["m_walk", "m_veg", "m_bag"]}}, 1.0),
+    "points_complete": ("POST", "/points/complete", {"json": {"completed_missions": ["m_walk", "m_veg"], "school": "load-school"},
+                                                     "headers": {"X-User-Id": "load-user"}}, 1.0),
+    "leaderboard": ("GET", "/leaderboard", {"params": {"board": "school", "school": "load-school"}}, 1.0),
+    "user_rank": ("GET", "/users/load-user/rank", {}, 1.0),
+    "points_stats": ("GET", "/points/stats", {}, 1.0),
+    "analyze": ("POST", "/analyze", {"json": ANALYZE, "headers": {"X-User-Id": "load-user"}}, 1.0),
+    "analyze_batch": ("POST", "/analyze/batch", {"json": {"rows": [ANALYZE] * 500}}, 0.5),
+    "explain": ("POST", "/explain", {"json": {"question": "What is global warming?"}}, 1.0),
+    "explain_fresh": ("POST", "/explain", {"json": {"question": "What is global warming?"},
+                                           "params": {"fresh": "true"}}, 0.25),
+    "logs_analyze_rules": ("POST", "/logs/analyze", {"json": {"text": RULE_LOG}}, 0.5),
+    "logs_analyze_llm": ("POST", "/logs/analyze", {"json": {"text": LLM_LOG}}, 0.25),
+    "logs_analyze_single": ("POST", "/logs/analyze", {"json": {"text": LLM_LOG, "strategy": "single"}}, 0.25),
+    "logs_analyze_stream": ("POST", "/logs/analyze/stream", {"json": {"text": LLM_LOG}}, 0.25),
+    "ingest": ("POST", "/ingest", {"content": INGEST_BODY, "headers": {"Content-Type": "application/x-ndjson"}}, 0.25),
+    "user_activity": ("GET", "/users/load-user/activity", {"params": {"grain": "week", "days": 90}}, 1.0),
+    "activity_stats": ("GET", "/activity/stats", {}, 1.0),
+    "factors": ("GET", "/factors", {}, 1.0),
+    "llm_cache_stats": ("GET", "/llm/cache/stats", {}, 1.0),
+    "admission_stats": ("GET", "/admission/stats", {}, 1.0),
+    "metrics": ("GET", "/metrics", {}, 1.0),
+    "india_temp": ("GET", "/data/india/temp", {}, 1.0),
+    "india_temp_refresh": ("GET", "/data/india/temp", {"params": {"refresh": "true"}}, 0.1),
+    "india_temp_regions": ("GET", "/data/india/temp", {"params": {"region": "all"}}, 1.0),
+    "india_regions": ("GET", "/data/india/regions", {}, 1.0),
+    "india_heat": ("GET", "/data/india/heat", {"params": {"start_year": YEARS[0], "end_year": YEARS[1], "region": "all"}}, 1.0),
+    "india_heat_refresh": ("GET", "/data/india/heat", {"params": {"start_year": YEARS[0], "end_year": YEARS[1],
+                                                                  "threshold_c": 32, "refresh": "true"}}, 0.05),
+    "india_tiles": ("GET", "/data/india/tiles", {"params": {"year": YEARS[0], "width": 256, "height": 256}}, 1.0),
+    "india_tiles_month": ("GET", "/data/india/tiles", {"params": {"year": YEARS[0], "month": 5, "bbox": "72,15,80,23",
+                                                                  "format": "json"}}, 0.5),
+    "india_ensemble": ("GET", "/data/india/temp/ensemble", {"params": ENSEMBLE}, 1.0),
+    "india_ensemble_refresh": ("GET", "/data/india/temp/ensemble", {"params": {**ENSEMBLE, "refresh": "true"}}, 0.05),
+    "data_cache_stats": ("GET", "/data/cache/stats", {}, 1.0),
+    "agent": ("POST", "/agent", {"json": {"task": "How many points do I have?",
+                                          "completed_missions": ["m_walk"]}}, 0.25),
+    "agent_planned": ("POST", "/agent", {"json": {"task": "How can I earn more points this week?",
+                                                  "completed_missions": ["m_walk"]}}, 0.25),
+    "agent_stream": ("POST", "/agent/stream", {"json": {"task": "How many points do I have?",
+                                                       "completed_missions": ["m_walk"]}}, 0.25),
+}
+
+def pct(xs, p):
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(p / 100 * len(xs)))] * 1000, 2) if xs else None
+
+def uncovered_routes():
+    """Routes of app.app that no scenario exercises (new routes should get one)."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+    from fastapi.routing import APIRoute
+
+    covered = {(m, p) for m, p, _, _ in SCENARIOS.values()}
+    routes = {(m, r.path) for r in app.app.routes if isinstance(r, APIRoute) for m in r.methods}
+    # templated paths are covered by their concrete scenario
+    concrete = {(m, p.replace("load-user", "{user_id}")) for m, p in covered}
+    return sorted(f"{m} {p}" for m, p in routes - concrete if m != "HEAD")
+
+async def one(client, base, method, path, kwargs):
+    t0 = time.perf_counter()
+    try:
+        async with client.stream(method, base + path, **kwargs) as r:
+            async for _ in r.aiter_raw():
+                pass
+            ok = r.status_code < 400
+            status = r.status_code
+    except httpx.HTTPError as e:
+        ok, status = False, type(e).__name__
+    return time.perf_counter() - t0, ok, status
+
+async def drive(client, base, spec, n, concurrency):
+    method, path, kwargs, _ = spec
+    todo = iter(range(n))
+    lat, statuses = [], {}
+
+    async def worker():
+        for _ in todo:
+            t, ok, status = await one(client, base, method, path, kwargs)
+            if ok:
+                lat.append(t)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    errors = n - len(lat)
+    return {
+        "requests": n,
+        "errors": errors,
+        "error_rate": round(errors / n, 4),
+        "status": statuses,
+        "throughput_rps": round(n / wall, 1),
+        "p50_ms": pct(lat, 50),
+        "p95_ms": pct(lat, 95),
+        "p99_ms": pct(lat, 99),
+        "mean_ms": round(sum(lat) / len(lat) * 1000, 2) if lat else None,
+    }
+
+async def run_all(base, names, requests, concurrency):
+    out = {}
+    limits = httpx.Limits(max_connections=concurrency + 4)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        for name in names:
+            spec = SCENARIOS[name]
+            n = max(1, int(requests * spec[3]))
+            await one(client, base, *spec[:3])  # warm-up (first import, first cache fill)
+            out[name] = await drive(client, base, spec, n, min(concurrency, n))
+            r = out[name]
+            print(f"{name:24s} n={n:5d} err={r['error_rate']:6.1%} {r['throughput_rps']:8.1f} req/s  "
+                  f"p50={r['p50_ms']}ms p95={r['p95_ms']}ms p99={r['p99_ms']}ms", flush=True)
+    return out
+
+def git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(old_path, new):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f"\nvs {old_path} ({old['meta'].get('commit')}):")
+    for name, r in new["endpoints"].items():
+        o = old["endpoints"].get(name)
+        if not o or not o["p95_ms"] or not r["p95_ms"]:
+            continue
+        print(f"  {name:24s} p95 {o['p95_ms']:9.1f} -> {r['p95_ms']:9.1f}ms ({r['p95_ms'] / o['p95_ms'] - 1:+.0%})  "
+              f"rps {o['throughput_rps']:8.1f} -> {r['throughput_rps']:8.1f}  "
+              f"err {o['error_rate']:.1%} -> {r['error_rate']:.1%}")
+
+def main(a):
+    names = [n.strip() for n in a.only.split(",")] if a.only else list(SCENARIOS)
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        sys.exit(f"unknown scenarios: {unknown}; choose from {list(SCENARIOS)}")
+    missing = uncovered_routes()
+    if missing:
+        print(f"warning: routes without a scenario: {missing}")
+
+    work = tempfile.mkdtemp(prefix="eco-load-")
+    nex_root = os.path.join(work, "nex")
+    write_fixtures(nex_root, models=MODELS, years=YEARS)
+    boundaries = os.path.join(work, "india_states.geojson")
+    write_boundaries(boundaries)
+    env = {
+        "NEX_LOCAL_ROOT": nex_root,
+        "CLIMATE_CACHE_DIR": os.path.join(work, "climate-cache"),
+        "NEX_INDEX_DIR": os.path.join(work, "nex-index"),
+        "REGION_BOUNDARIES_FILE": boundaries,
+        "REGION_MASK_DIR": os.path.join(work, "region-masks"),
+        "CLIMATE_TILE_DIR": os.path.join(work, "climate-tiles"),
+        "ACTIVITY_DB": os.path.join(work, "activity.sqlite"),
+        "POINTS_DB": os.path.join(work, "points.sqlite"),
+        "LLM_MAX_CONCURRENCY": str(a.llm_concurrency),
+        "NEX_READER": a.reader,
+    }
+    with stub_and_app(a.stub_latency, env) as (base, _):
+        endpoints = asyncio.run(run_all(base, names, a.requests, a.concurrency))
+
+    result = {
+        "meta": {
+            "commit": git_rev(),
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "concurrency": a.concurrency,
+            "requests": a.requests,
+            "stub_latency_s": a.stub_latency,
+            "llm_concurrency": a.llm_concurrency,
+            "nex_reader": a.reader,
+        },
+        "endpoints": endpoints,
+    }
+    out = a.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"saved {out}")
+    if a.compare:
+        compare(a.compare, result)
+    return 0 if all(r["error_rate"] <= a.max_error_rate for r in endpoints.values()) else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--requests", type=int, default=200, help="per scenario, scaled by its share")
+    p.add_argument("--stub-latency", type=float, default=0.3)
+    p.add_argument("--llm-concurrency", type=int, default=32)
+    p.add_argument("--reader", choices=["full", "partial"], default="full", help="NEX_READER for the app")
+    p.add_argument("--only", help="comma-separated scenario names")
+    p.add_argument("--out", help=f"result JSON (default {RESULTS_DIR}/<time>-<commit>.json)")
+    p.add_argument("--compare", help="earlier result JSON to diff against")
+    p.add_argument("--max-error-rate", type=float, default=0.0, help="exit 1 above this for any scenario")
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,59 @@
+# benchmarks/log_parser.py
+# Accuracy and LLM-call avoidance of the rule-based /logs/analyze extractor on
+# a labeled corpus. Rows labeled "expect": null are ones the rules should NOT
+# claim (they need the LLM).
+#   python -m benchmarks.log_parser [benchmarks/data/log_corpus.jsonl]
+import os, sys, json, time
+
+import log_parser
+
+FIELDS = ("mode", "distance_km", "meat_meals", "veg_meals", "electricity_kwh", "lpg_kg", "waste_kg", "period")
+DEFAULTS = {"mode": None, "distance_km": 0, "meat_meals": 0, "veg_meals": 0, "electricity_kwh": 0,
+            "lpg_kg": 0, "waste_kg": 0, "period": "day"}
+
+def same(a, b):
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) < 1e-6
+    return a == b
+
+def run(path):
+    rows = [json.loads(l) for l in open(path, encoding="utf-8") if l.strip()]
+    fast, correct, wrong_claims, missed = 0, 0, [], []
+
+    t0 = time.perf_counter()
+    results = [log_parser.parse_activity(r["text"]) for r in rows]
+    elapsed = time.perf_counter() - t0
+
+    for row, res in zip(rows, results):
+        took_rules = res["confidence"] >= log_parser.MIN_CONFIDENCE
+        expect = row["expect"]
+        if took_rules:
+            fast += 1
+            if expect is None:
+                wrong_claims.append((row["text"], res["factors"]))
+                continue
+            got = {**DEFAULTS, **res["factors"]}
+            want = {**DEFAULTS, **expect}
+            if all(same(got[f], want[f]) for f in FIELDS):
+                correct += 1
+            else:
+                wrong_claims.append((row["text"], res["factors"]))
+        elif expect is not None:
+            missed.append((row["text"], res["confidence"]))
+
+    n = len(rows)
+    parseable = sum(1 for r in rows if r["expect"] is not None)
+    print(f"corpus rows            : {n} ({parseable} rule-parseable)")
+    print(f"LLM calls avoided      : {fast}/{n} = {fast / n:.0%}")
+    print(f"accuracy on rules path : {correct}/{fast} = {correct / fast:.0%}" if fast else "no rows took the rules path")
+    print(f"parseable rows missed  : {len(missed)}")
+    print(f"parser time            : {elapsed / n * 1e6:.0f} µs/row")
+    for text, got in wrong_claims:
+        print(f"  WRONG  {text!r} -> {got}")
+    for text, conf in missed:
+        print(f"  MISSED {text!r} (confidence {conf})")
+    return not wrong_claims
+
+if __name__ == "__main__":
+    default = os.path.join(os.path.dirname(__file__), "data", "log_corpus.jsonl")
+    sys.exit(0 if run(sys.argv[1] if len(sys.argv) > 1 else default) else 1)
@@ -0,0 +1,57 @@
+# benchmarks/logs_latency.py
+# Time-to-first-byte and total latency of /logs/analyze strategies against the
+# local OpenAI stub: two_call, single, and the SSE stream (time to the
+# `analysis` event and to the first feedback token are reported too).
+#   python -m benchmarks.logs_latency [--stub-latency 0.8] [--n 10]
+import sys, time, argparse, statistics
+
+import httpx
+
+from benchmarks.servers import stub_and_app
+
+# low rule confidence on purpose so every strategy needs the LLM for factors
+TEXT = "went to Pune for a wedding, long day"
+
+def timed_post(client, url, body):
+    t0 = time.perf_counter()
+    with client.stream("POST", url, json=body) as r:
+        ttfb, marks = None, {}
+        for line in r.iter_lines():
+            now = time.perf_counter() - t0
+            if ttfb is None:
+                ttfb = now
+            if line.startswith("event: "):
+                marks.setdefault(line[7:], now)
+        r.raise_for_status()
+    return ttfb, time.perf_counter() - t0, marks
+
+def summary(xs):
+    return f"p50={statistics.median(xs) * 1000:7.0f}ms  mean={statistics.mean(xs) * 1000:7.0f}ms"
+
+def run(stub_latency, n):
+    with stub_and_app(stub_latency) as (base, _):
+        with httpx.Client(timeout=60) as client:
+            rows = {}
+            for name, path, body in (
+                ("two_call", "/logs/analyze", {"text": TEXT, "strategy": "two_call"}),
+                ("single", "/logs/analyze", {"text": TEXT, "strategy": "single"}),
+                ("stream", "/logs/analyze/stream", {"text": TEXT}),
+            ):
+                res = [timed_post(client, base + path, body) for _ in range(n)]
+                rows[name] = res
+
+    print(f"stub latency per call = {stub_latency}s, n={n}")
+    for name, res in rows.items():
+        print(f"{name:9s} TTFB  {summary([r[0] for r in res])}")
+        print(f"{'':9s} total {summary([r[1] for r in res])}")
+        if name == "stream":
+            print(f"{'':9s} to `analysis` {summary([r[2]['analysis'] for r in res])}")
+            print(f"{'':9s} to 1st token  {summary([r[2]['delta'] for r in res])}")
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.logs_latency")
+    p.add_argument("--stub-latency", type=float, default=0.8)
+    p.add_argument("--n", type=int, default=5)
+    a = p.parse_args()
+    run(a.stub_latency, a.n)
+    sys.exit(0)
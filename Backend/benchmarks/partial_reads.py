@@ -0,0 +1,48 @@
+# benchmarks/partial_reads.py
+# Full xarray read vs byte-range partial read of the India bbox from a
+# global, chunked fixture. Reports wall time and bytes read vs file size.
+#   python -m benchmarks.partial_reads [--root /tmp/nex-global] [--res 0.25]
+import os, sys, time, argparse
+
+from benchmarks.fixtures import write_fixtures
+from climate import nex_key
+import climate, nc_partial
+
+def run(root, res, chunk_days):
+    write_fixtures(root, res=res, chunk_days=chunk_days, extent="global")
+    key = nex_key("tasmax", "historical", "MIROC6", 2014)
+    path = os.path.join(root, key)
+    size = os.path.getsize(path)
+
+    climate.NEX_LOCAL_ROOT = root
+    climate.NEX_READER = "full"
+    t0 = time.perf_counter()
+    full = climate.india_annual_series("tasmax", key)
+    t_full = time.perf_counter() - t0
+
+    climate.NEX_READER = "partial"
+    t0 = time.perf_counter()
+    cold = climate.india_annual_series("tasmax", key)  # builds + persists the index
+    t_cold = time.perf_counter() - t0
+    before = nc_partial.read_stats()["bytes_read"]
+    nc_partial.block_cache.clear()  # drop cached blocks, keep the persisted index
+    t0 = time.perf_counter()
+    warm = climate.india_annual_series("tasmax", key)
+    t_warm = time.perf_counter() - t0
+    stats = nc_partial.read_stats()
+
+    print(f"file size          : {size / 1e6:.1f} MB")
+    print(f"full read          : {t_full:.3f}s  {full}")
+    print(f"partial (new index): {t_cold:.3f}s  {cold}")
+    print(f"partial (indexed)  : {t_warm:.3f}s  bytes read {(stats['bytes_read'] - before) / 1e6:.1f} MB "
+          f"({(stats['bytes_read'] - before) / size:.0%} of file)")
+    print(f"stats              : {stats}")
+    return full == cold == warm
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.partial_reads")
+    p.add_argument("--root", default="/tmp/nex-global")
+    p.add_argument("--res", type=float, default=0.5)
+    p.add_argument("--chunk-days", type=int, default=30)
+    a = p.parse_args()
+    sys.exit(0 if run(a.root, a.res, a.chunk_days) else 1)
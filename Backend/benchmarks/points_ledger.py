@@ -0,0 +1,164 @@
+# benchmarks/points_ledger.py
+# The points ledger at scale: seed --users users (spread over --schools
+# schools and the last four weeks), then offer completions at --rate per
+# second for --seconds: one completion per call from one thread, from
+# --threads threads (as FastAPI's request threads would call it), and in
+# batches of --batch. Reported: sustained rate and per-call
+# latency, duplicate retries (must credit nothing), top-N / "my rank" latency
+# against sorting the totals, snapshot cost, and restart time from the
+# snapshot vs replaying every completion. Ranks and top-N are checked against
+# the naive sort.
+#   python -m benchmarks.points_ledger [--users 1000000] [--rate 10000] [--seconds 5]
+import os, sys, time, random, argparse, resource, tempfile, threading
+
+from points_ledger import PointsLedger, GLOBAL, school_board
+
+MISSIONS = {"m_walk": 40, "m_trans": 60, "m_veg": 20, "m_bag": 15, "m_idle": 25}
+DAY = 86400
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1e6
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def completion(rnd, users, schools, now):
+    u = rnd.randrange(users)
+    m = rnd.choice(list(MISSIONS))
+    return f"user-{u}", m, MISSIONS[m], None, now - rnd.uniform(0, 27) * DAY, f"school-{u % schools}"
+
+def paced(ledger, rnd, a, now, batch, threads):
+    """
+    Offer a.rate completions/s for a.seconds in calls of `batch`, from
+    `threads` threads; returns (completions/s, per-call latencies).
+    """
+    lat = []
+    total = int(a.rate * a.seconds)
+    calls = [[completion(rnd, a.users, a.schools, now) for _ in range(batch)] for _ in range(total // batch)]
+    nxt = iter(range(len(calls)))
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(nxt, None)
+            if i is None:
+                return
+            wait = t0 + i * batch / a.rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            t = time.perf_counter()
+            ledger.record_many(calls[i])
+            lat.append(time.perf_counter() - t)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return total / (time.perf_counter() - t0), lat
+
+def check(ledger, rnd, samples):
+    """Ranks and the top 100 of the global board against a full sort of the totals."""
+    board = ledger.boards[GLOBAL]
+    totals = sorted((s for _, s in board.ranked()), reverse=True)
+    ok = [s for _, s, _ in board.top(100)] == totals[:100]
+    members = list(board._score)
+    for m in rnd.sample(members, samples):
+        s = board.get(m)
+        # rank = 1 + members strictly above; totals is sorted descending
+        lo, hi = 0, len(totals)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if totals[mid] > s:
+                lo = mid + 1
+            else:
+                hi = mid
+        ok &= board.rank(m) == lo + 1
+    return ok
+
+def main(a):
+    rnd = random.Random(7)
+    work = tempfile.mkdtemp(prefix="eco-points-")
+    db, snap = os.path.join(work, "points.sqlite"), os.path.join(work, "points.snapshot")
+    ledger = PointsLedger(db, snap)
+    now = time.time()
+
+    t0 = time.perf_counter()
+    for lo in range(0, a.users, 10_000):
+        ledger.record_many([(f"user-{u}", "m_walk", 40, "seed", now - rnd.uniform(0, 27) * DAY, f"school-{u % a.schools}")
+                            for u in range(lo, min(a.users, lo + 10_000))])
+    t_seed = time.perf_counter() - t0
+    print(f"seed: {a.users:,} users in {t_seed:.1f}s ({a.users / t_seed:,.0f}/s in batches of 10,000), "
+          f"{a.schools:,} schools, peak RSS {rss_mb():.0f} MB")
+
+    for batch, threads in ((1, 1), (1, a.threads), (a.batch, 1)):
+        rate, lat = paced(ledger, rnd, a, now, batch, threads)
+        print(f"offered {a.rate:,}/s for {a.seconds}s, {batch:4d} per call, {threads:2d} threads: "
+              f"sustained {rate:7,.0f}/s  call p50 {pct(lat, 0.5):7.0f}µs p99 {pct(lat, 0.99):7.0f}µs")
+
+    # retried requests: the same completion ids again credit nothing
+    retry = [(f"user-{u}", "m_walk", 40, "seed", None, None) for u in rnd.sample(range(a.users), 10_000)]
+    before = ledger.boards[GLOBAL].top(10)
+    t0 = time.perf_counter()
+    new = ledger.record_many(retry)
+    t_retry = time.perf_counter() - t0
+    idempotent = not any(new) and ledger.boards[GLOBAL].top(10) == before
+    print(f"retries: {len(retry):,} duplicate completions in {t_retry * 1000:.0f}ms, credited {sum(new)}, "
+          f"boards unchanged: {idempotent}")
+
+    users = [f"user-{u}" for u in rnd.sample(range(a.users), 2000)]
+    queries = {
+        "top 10 global": lambda i: ledger.top(GLOBAL, 10),
+        "top 10 @ 50,000": lambda i: ledger.top(GLOBAL, 10, 50_000),
+        "top 10 school": lambda i: ledger.top(school_board(f"school-{i % a.schools}"), 10),
+        "my rank (3 boards)": lambda i: ledger.standing(users[i], [GLOBAL, school_board(f"school-{i % a.schools}")] +
+                                                         [b for b in ledger.boards if b.startswith("week:")][-1:]),
+    }
+    for name, q in queries.items():
+        lat = []
+        for i in range(len(users)):
+            t = time.perf_counter()
+            q(i)
+            lat.append(time.perf_counter() - t)
+        print(f"{name:20s} p50 {pct(lat, 0.5):7.1f}µs  p99 {pct(lat, 0.99):7.1f}µs")
+    t = time.perf_counter()
+    sorted(ledger.boards[GLOBAL]._score.values(), reverse=True)
+    t_sort = time.perf_counter() - t
+    print(f"{'naive: sort totals':20s} {t_sort * 1e6:9.0f}µs per query")
+    correct = check(ledger, rnd, 2000)
+    print(f"ranks and top 100 match the sorted totals: {correct}")
+
+    snap_stats = ledger.snapshot()
+    expected = ledger.top(GLOBAL, 100)
+    completions = ledger.stats()["completions"]
+    ledger.close()
+    print(f"snapshot: {snap_stats['bytes'] / 1e6:.1f} MB in {snap_stats['ms']:.0f}ms "
+          f"(writes blocked {snap_stats['lock_ms']:.0f}ms), {len(ledger.boards)} boards")
+
+    restarts = {}
+    for mode in ("snapshot", "replay"):
+        if mode == "replay":
+            os.remove(snap)
+        t0 = time.perf_counter()
+        again = PointsLedger(db, snap)
+        restarts[mode] = time.perf_counter() - t0
+        same = again.top(GLOBAL, 100) == expected
+        print(f"restart from {mode:8s}: {restarts[mode]:6.2f}s  ({again.restored['replayed']:,} of {completions:,} "
+              f"completions replayed)  same top 100: {same}")
+        correct &= same
+        again.close()
+    print(f"peak RSS {rss_mb():.0f} MB")
+    return 0 if correct and idempotent else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.points_ledger")
+    p.add_argument("--users", type=int, default=1_000_000)
+    p.add_argument("--schools", type=int, default=2_000)
+    p.add_argument("--rate", type=int, default=10_000, help="completions offered per second")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--threads", type=int, default=32, help="concurrent callers (FastAPI's threadpool is 40)")
+    p.add_argument("--batch", type=int, default=100, help="completions per call in the batched run")
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,134 @@
+# benchmarks/recommender.py
+# The mission recommender on synthetic catalogs (random category, 5-100
+# points, 0.01-3 kg saving) and routines (random analyze inputs):
+#   single    one routine, recommend() p50/p99 per catalog size
+#   batch     --users routines in one call vs one call per routine
+#   http      POST /missions/recommend and /missions/recommend/batch in process
+#             (built-in catalog, and with --http-candidates generated missions)
+#   quality   greedy vs the exact optimum (every set of up to k missions) on
+#             --exact-missions catalogs with random budgets
+# The same input must give the same picks on every run.
+#   python -m benchmarks.recommender [--sizes 5,1000,5000] [--users 10000] [--k 3]
+import os, sys, time, random, argparse, itertools
+
+import numpy as np
+
+import recommender
+
+CATEGORIES = ("transport", "food", "energy", "waste", "upcycling")
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] * 1000
+
+def catalog(rnd, n):
+    return recommender.Catalog([
+        {"id": f"g{i}", "title": f"Generated mission {i}", "category": rnd.choice(CATEGORIES),
+         "points": rnd.randint(5, 100), "co2_saving_kg": round(rnd.uniform(0.01, 3.0), 2)}
+        for i in range(n)
+    ])
+
+def routines(rnd, n):
+    """(users, categories) kg, shaped like category_kg() of analyze_payload breakdowns."""
+    breakdown = {k: [round(rnd.uniform(0, 6), 2) if rnd.random() < 0.8 else 0.0 for _ in range(n)]
+                 for k in ("transport_kg", "meals_kg", "electricity_kg", "lpg_kg", "waste_kg")}
+    total = [sum(v[i] for v in breakdown.values()) for i in range(n)]
+    return recommender.category_kg(breakdown, total)
+
+def value(cat, kg, chosen):
+    """Saving of a set of missions: per category, the missions' sum capped by the user's kg."""
+    per = {}
+    for i in chosen:
+        c = cat.category[i]
+        per[c] = per.get(c, 0.0) + cat.saving[i]
+    return sum(min(v, kg[c]) for c, v in per.items())
+
+def exact(cat, kg, budget, k):
+    best = 0.0
+    idx = range(len(cat))
+    for size in range(1, k + 1):
+        for chosen in itertools.combinations(idx, size):
+            if cat.points[list(chosen)].sum() <= budget:
+                best = max(best, value(cat, kg, chosen))
+    return best
+
+def quality(rnd, a):
+    cat = catalog(rnd, a.exact_missions)
+    kg = routines(rnd, a.exact_users)
+    budgets = np.array([rnd.randint(20, 200) for _ in range(len(kg))], dtype=np.float64)
+    picks, gains = recommender.recommend(cat, kg, budgets, a.k)
+    ratios = []
+    for u in range(len(kg)):
+        chosen = [i for i in picks[u] if i >= 0]
+        assert cat.points[chosen].sum() <= budgets[u] and len(chosen) <= a.k
+        got, opt = value(cat, kg[u], chosen), exact(cat, kg[u], budgets[u], a.k)
+        assert abs(got - gains[u].sum()) < 1e-9
+        ratios.append(1.0 if opt == 0 else got / opt)
+    ratios = np.array(ratios)
+    print(f"quality: {len(kg)} routines, {len(cat)} missions, k={a.k}, random budgets 20-200: "
+          f"greedy/optimum mean {ratios.mean():.4f}  min {ratios.min():.4f}  optimal in {np.mean(ratios > 1 - 1e-9):.1%}")
+    return ratios.min() >= 0.5
+
+def http(a):
+    os.environ.setdefault("ACTIVITY_DB", "")
+    from fastapi.testclient import TestClient
+    import app
+    rnd = random.Random(3)
+    client = TestClient(app.app)
+    routine = {"mode": "petrol_car", "distance_km": 8, "meat_meals": 1, "electricity_kwh": 3, "waste_kg": 0.2}
+    generated = [{"id": f"g{i}", "title": f"Generated mission {i}", "category": rnd.choice(CATEGORIES),
+                  "points": rnd.randint(5, 100), "co2_saving_kg": round(rnd.uniform(0.01, 3.0), 2)}
+                 for i in range(a.http_candidates)]
+    rows = [{"mode": rnd.choice(["petrol_car", "bus", "walk_cycle"]), "distance_km": rnd.uniform(0, 30),
+             "meat_meals": rnd.randint(0, 3), "electricity_kwh": rnd.uniform(0, 8)} for _ in range(1000)]
+    cases = {
+        "recommend, built-in": ("/missions/recommend", {"routine": routine, "budget_points": 80}),
+        f"recommend, +{a.http_candidates} cands": ("/missions/recommend",
+                                                   {"routine": routine, "budget_points": 80, "candidates": generated}),
+        "batch, 1000 routines": ("/missions/recommend/batch", {"rows": rows, "budget_points": 80}),
+    }
+    for name, (path, body) in cases.items():
+        client.post(path, json=body)
+        lat = []
+        for _ in range(a.http_repeat):
+            t = time.perf_counter()
+            r = client.post(path, json=body)
+            lat.append(time.perf_counter() - t)
+            assert r.status_code == 200, r.text
+        print(f"http {name:28s} p50 {pct(lat, 0.5):7.2f}ms  p99 {pct(lat, 0.99):7.2f}ms")
+
+def main(a):
+    rnd = random.Random(7)
+    ok = True
+    for n in (int(s) for s in a.sizes.split(",")):
+        cat = catalog(rnd, n)
+        kg = routines(rnd, a.users)
+        lat = []
+        for u in range(min(2000, a.users)):
+            t = time.perf_counter()
+            recommender.recommend(cat, kg[u:u + 1], 80, a.k)
+            lat.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        picks, gains = recommender.recommend(cat, kg, 80, a.k)
+        t_batch = time.perf_counter() - t
+        again = recommender.recommend(cat, kg, 80, a.k)
+        same = np.array_equal(picks, again[0]) and np.array_equal(gains, again[1])
+        ok &= same
+        per_user = np.median(lat) * a.users
+        print(f"{n:6,d} missions  single p50 {pct(lat, 0.5):6.3f}ms p99 {pct(lat, 0.99):6.3f}ms  "
+              f"batch of {a.users:,}: {t_batch * 1000:7.1f}ms ({a.users / t_batch:9,.0f} routines/s, "
+              f"{per_user / t_batch:5.1f}x one call per routine)  deterministic {same}")
+    ok &= quality(rnd, a)
+    http(a)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.recommender")
+    p.add_argument("--sizes", default="5,1000,5000", help="catalog sizes")
+    p.add_argument("--users", type=int, default=10_000, help="routines in the batch run")
+    p.add_argument("--k", type=int, default=3, help="missions per recommendation")
+    p.add_argument("--exact-missions", type=int, default=16)
+    p.add_argument("--exact-users", type=int, default=300)
+    p.add_argument("--http-candidates", type=int, default=1000)
+    p.add_argument("--http-repeat", type=int, default=50)
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,83 @@
+# benchmarks/region_series.py
+# State-level series from polygon masks, on a synthetic 36-state boundaries
+# file and an India-extent fixture.
+#   1) mask build: rasterizing every state (cold) vs loading the cached .npz
+#      vs the in-memory hit
+#   2) one weighted pass over the file for all regions vs one read per region
+#      (what per-state requests would cost without the shared pass); results
+#      must agree to float rounding
+#   3) India: cos(lat)-weighted mask mean vs the old unweighted bbox mean
+#   python -m benchmarks.region_series [--root /tmp/nex-regions] [--res 0.25] [--reader full]
+import os, sys, time, shutil, argparse
+
+import numpy as np
+
+from benchmarks.fixtures import write_fixtures, write_boundaries
+from climate import nex_key
+import climate, region_masks
+
+def timed(fn, *args, **kw):
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return time.perf_counter() - t0, out
+
+def bbox_unweighted(key):
+    """India mean as computed before masks: plain mean over every bbox cell."""
+    ds = climate.open_nex_dataset(key)
+    try:
+        da = climate.to_celsius(climate.subset_bbox(ds[climate.pick_variable(ds, "tasmax")]))
+        annual = da.groupby("time.year").mean(dim=("time", "lat", "lon"))
+        return {int(y): float(v) for y, v in zip(annual["year"].values, annual.values)}
+    finally:
+        ds.close()
+
+def run(root, res, reader):
+    boundaries = os.path.join(root, "india_states.geojson")
+    n_regions = write_boundaries(boundaries)
+    write_fixtures(root, res=res)
+    key = nex_key("tasmax", "historical", "MIROC6", 2014)
+    climate.NEX_LOCAL_ROOT = root
+    climate.NEX_READER = reader
+    region_masks.MASK_DIR = os.path.join(root, "masks")
+    shutil.rmtree(region_masks.MASK_DIR, ignore_errors=True)
+    b = region_masks.boundaries(boundaries)
+    region_masks.BOUNDARIES_FILE = boundaries
+
+    lat = np.arange(climate.INDIA_BBOX["lat_min"] + res / 2, climate.INDIA_BBOX["lat_max"], res)
+    lon = np.arange(climate.INDIA_BBOX["lon_min"] + res / 2, climate.INDIA_BBOX["lon_max"], res)
+    t_cold, _ = timed(region_masks.fractions, lat, lon, b)
+    region_masks._masks.clear()
+    t_disk, _ = timed(region_masks.fractions, lat, lon, b)
+    t_mem, _ = timed(region_masks.fractions, lat, lon, b)
+    print(f"masks, {n_regions} regions on a {len(lat)}x{len(lon)} grid ({region_masks.MASK_SAMPLES}x{region_masks.MASK_SAMPLES} samples/cell)")
+    print(f"  build  : {t_cold * 1000:8.1f} ms")
+    print(f"  .npz   : {t_disk * 1000:8.1f} ms")
+    print(f"  memory : {t_mem * 1000:8.3f} ms")
+
+    climate.region_year_means(key, "tasmax")  # warm the file cache / partial index
+    t_one, (codes, one) = timed(climate.region_year_means, key, "tasmax")
+    t0 = time.perf_counter()
+    each = {c: climate.region_year_means(key, "tasmax", codes=[c])[1][c] for c in codes}
+    t_each = time.perf_counter() - t0
+    diff = max(abs(one[c][y] - each[c][y]) for c in codes for y in one[c])
+    same = diff < 1e-9 and all(one[c].keys() == each[c].keys() for c in codes)
+    print(f"\nregion series ({reader} reader), {len(codes)} regions")
+    print(f"  one pass, all regions : {t_one:7.3f}s")
+    print(f"  one read per region   : {t_each:7.3f}s ({t_each / t_one:.1f}x)  max |diff| {diff:.1e}")
+
+    old = bbox_unweighted(key)
+    new = one[region_masks.INDIA]
+    print("\nIndia annual mean, °C")
+    for y in sorted(new):
+        print(f"  {y}: bbox unweighted {old[y]:.3f}  cos-lat over mask {new[y]:.3f}  ({new[y] - old[y]:+.3f})")
+    spread = [v for c, s in one.items() if c != region_masks.INDIA for v in s.values()]
+    print(f"  state means range {min(spread):.2f} .. {max(spread):.2f}")
+    return same
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.region_series")
+    p.add_argument("--root", default="/tmp/nex-regions")
+    p.add_argument("--res", type=float, default=0.25)
+    p.add_argument("--reader", choices=["full", "partial"], default="full")
+    a = p.parse_args()
+    sys.exit(0 if run(a.root, a.res, a.reader) else 1)
@@ -0,0 +1,91 @@
+# benchmarks/serialization.py
+# Response encoding per endpoint, on the NetCDF fixtures and the built-in tables:
+#   before    what FastAPI's default path costs per request: jsonable_encoder
+#             + JSONResponse (json.dumps) of the same body
+#   build     payloads.payload(): orjson + strong ETag, plus gzip when the body
+#             is over COMPRESS_MIN_BYTES (paid once for memoized payloads)
+#   per req   payloads.respond() of an already built payload (/missions,
+#             climate series from the memo) or the full build (dynamic bodies)
+#   bytes     identity vs gzip (and br when brotli is installed) on the wire
+#   http      GET p50 in process, full body vs a 304 revalidation
+# CPU time is process time per call, median of --repeat runs.
+#   python -m benchmarks.serialization [--root /tmp/nex-serialize] [--repeat 50] [--rows 1000]
+import os, sys, time, argparse, statistics
+
+def cpu_ms(fn, repeat):
+    out = []
+    for _ in range(repeat):
+        t = time.process_time()
+        fn()
+        out.append(time.process_time() - t)
+    return statistics.median(out) * 1000
+
+def wall_ms(fn, repeat):
+    out = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t)
+    return statistics.median(out) * 1000
+
+def main(a):
+    nex = os.path.join(a.root, "nex")
+    # climate reads these at import, which fixtures triggers
+    os.environ.update(NEX_LOCAL_ROOT=nex, CLIMATE_CACHE_DIR=os.path.join(a.root, "cache"),
+                      REGION_BOUNDARIES_FILE=os.path.join(a.root, "india_states.geojson"),
+                      REGION_MASK_DIR=os.path.join(a.root, "masks"), ACTIVITY_DB="")
+    from benchmarks.fixtures import write_fixtures, write_boundaries
+    write_fixtures(nex, models=("MIROC6", "ACCESS-CM2"), years=(2014, 2016))
+    write_boundaries(os.path.join(a.root, "india_states.geojson"))
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from fastapi.testclient import TestClient
+    from starlette.requests import Request
+    import app, payloads
+
+    client = TestClient(app.app)
+    rows = [{"mode": ("bus", "petrol_car", "walk_cycle")[i % 3], "distance_km": i % 30, "veg_meals": i % 3,
+             "electricity_kwh": (i % 7) * 0.5} for i in range(a.rows)]
+    cases = [
+        ("GET /missions", "GET", "/missions", {}, True),
+        ("GET /data/india/temp all", "GET", "/data/india/temp", {"params": {"region": "all"}}, True),
+        ("GET /data/india/heat all", "GET", "/data/india/heat", {"params": {"region": "all", "end_year": 2016}}, True),
+        ("GET /temp/ensemble", "GET", "/data/india/temp/ensemble",
+         {"params": {"models": "MIROC6,ACCESS-CM2", "end_year": 2016}}, True),
+        ("GET /data/india/regions", "GET", "/data/india/regions", {}, False),
+        (f"POST /analyze/batch {a.rows}", "POST", "/analyze/batch", {"json": {"rows": rows}}, False),
+        (f"POST /analyze/batch cols", "POST", "/analyze/batch", {"json": {"rows": rows, "format": "columns"}}, False),
+    ]
+    scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip, deflate, br")]}
+    codings = ("identity",) + payloads.CODINGS
+    print(f"{'endpoint':28s} {'before':>8} {'build':>8} {'per req':>8} {'speedup':>7}  "
+          + " ".join(f"{c:>9}" for c in codings) + f"  {'http p50':>8} {'304 p50':>8}")
+    for name, method, path, kw, memoized in cases:
+        r = client.request(method, path, **kw)
+        assert r.status_code == 200, r.text
+        obj = r.json()
+        before = cpu_ms(lambda: JSONResponse(jsonable_encoder(obj)).body, a.repeat)
+
+        def build():
+            p = payloads.payload(obj)
+            if len(p.body) >= payloads.COMPRESS_MIN_BYTES:
+                p.coded("gzip")
+            return p
+        built = cpu_ms(build, a.repeat)
+        p = build()
+        per_req = cpu_ms(lambda: payloads.respond(Request(scope), p), a.repeat) if memoized else built
+        sizes = " ".join(f"{len(p.coded(c)):9,d}" for c in codings)
+        http = wall_ms(lambda: client.request(method, path, **kw), a.repeat)
+        etag = r.headers["etag"]
+        revalidate = f"{wall_ms(lambda: client.request(method, path, headers={'If-None-Match': etag}, **kw), a.repeat):7.2f}ms" \
+            if method == "GET" else f"{'-':>9}"  # POST bodies are never 304
+        print(f"{name:28s} {before:7.3f}ms {built:7.3f}ms {per_req:7.3f}ms {before / max(per_req, 1e-6):6.1f}x  "
+              f"{sizes}  {http:7.2f}ms {revalidate}")
+    return 0
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.serialization")
+    p.add_argument("--root", default="/tmp/nex-serialize")
+    p.add_argument("--repeat", type=int, default=50)
+    p.add_argument("--rows", type=int, default=1000)
+    sys.exit(main(p.parse_args()))
@@ -0,0 +1,40 @@
+# benchmarks/servers.py
+# Start/stop uvicorn subprocesses (the app and the OpenAI stub) for load tests.
+import os, sys, time, subprocess, contextlib
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_ready(url, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not come up")
+
+@contextlib.contextmanager
+def uvicorn_server(target, port, env=None, ready_path="/docs", workers=1):
+    cmd = [sys.executable, "-m", "uvicorn", target, "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        cmd += ["--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env={**os.environ, **(env or {})})
+    try:
+        wait_ready(f"http://127.0.0.1:{port}{ready_path}")
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+@contextlib.contextmanager
+def stub_and_app(stub_latency=0.5, app_env=None, stub_port=8901, app_port=8900):
+    with uvicorn_server("benchmarks.stub_openai:app", stub_port, {"STUB_LATENCY_S": str(stub_latency)}) as stub:
+        env = {"OPENAI_API_KEY": "sk-stub", "OPENAI_BASE_URL": f"{stub}/v1", **(app_env or {})}
+        with uvicorn_server("app:app", app_port, env) as base:
+            yield base, stub
@@ -0,0 +1,126 @@
+# benchmarks/single_flight.py
+# Fan-in of identical concurrent requests ("a classroom opens the dashboard"),
+# with SINGLE_FLIGHT=0 and =1. Each burst fires --clients identical requests
+# at once and counts the work actually done underneath:
+#   india_temp_cold     /data/india/temp on an empty series cache
+#   india_temp_refresh  /data/india/temp?refresh=true (every call recomputes)
+#   heat_refresh        /data/india/heat?refresh=true
+#   explain_cold        /explain with a question nobody asked yet
+#   explain_error       /explain whose model call fails (stub failure marker):
+#                       every client must get the 502 (error propagation)
+# Reductions come from the app's /metrics (climate.masks stage count), model
+# calls from the OpenAI stub's /stats. Before the HTTP runs, an in-process
+# check makes one Group call fail under many waiters and cancels one waiter
+# mid-flight: every other waiter must get the same exception, from one call.
+#   python -m benchmarks.single_flight [--clients 60] [--stub-latency 0.3] [--res 0.25]
+import os, re, sys, time, asyncio, argparse, tempfile
+
+import httpx
+
+from benchmarks.fixtures import write_fixtures, write_boundaries
+from benchmarks.servers import stub_and_app
+
+BURSTS = {
+    "india_temp_cold": ("GET", "/data/india/temp", {"params": {"region": "all"}}),
+    "india_temp_refresh": ("GET", "/data/india/temp", {"params": {"refresh": "true"}}),
+    "heat_refresh": ("GET", "/data/india/heat", {"params": {"refresh": "true", "threshold_c": 32}}),
+    "explain_cold": ("POST", "/explain", {"json": {"question": "Why are Indian summers getting hotter?"}}),
+    "explain_error": ("POST", "/explain", {"json": {"question": "Is it going to rain? [stub-fail]"}}),
+}
+
+REDUCTIONS = re.compile(r'^eco_stage_seconds_count\{stage="climate\.masks"\} (\S+)$', re.M)
+
+async def counts(client, base, stub):
+    m = REDUCTIONS.search((await client.get(base + "/metrics")).text)
+    return (float(m.group(1)) if m else 0.0), (await client.get(stub + "/stats")).json()["n"]
+
+async def burst(client, base, stub, spec, n):
+    method, path, kwargs = spec
+    before = await counts(client, base, stub)
+
+    async def one():
+        t0 = time.perf_counter()
+        r = await client.request(method, base + path, **kwargs)
+        return time.perf_counter() - t0, r.status_code, r.headers.get("x-coalesced") == "true"
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(n)))
+    wall = time.perf_counter() - t0
+    after = await counts(client, base, stub)
+    lat = sorted(r[0] for r in results)
+    statuses = {}
+    for _, code, _ in results:
+        statuses[code] = statuses.get(code, 0) + 1
+    return {"wall": wall, "p50": lat[n // 2] * 1000, "max": lat[-1] * 1000, "status": statuses,
+            "coalesced": sum(r[2] for r in results),
+            "reductions": int(after[0] - before[0]), "llm_calls": after[1] - before[1]}
+
+async def in_process(clients):
+    import single_flight
+    group = single_flight.Group("bench", key=lambda question: question.lower())
+    calls = {"n": 0}
+
+    async def failing(question):
+        calls["n"] += 1
+        await asyncio.sleep(0.1)
+        raise RuntimeError(f"model down for {question!r}")
+
+    waiters = [asyncio.ensure_future(group.do(failing, "Q" if i % 2 else "q")) for i in range(clients)]
+    await asyncio.sleep(0.01)
+    waiters[0].cancel()  # one client disconnects; the others still get the call's outcome
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    errors = [r for r in results[1:] if isinstance(r, RuntimeError)]
+    same = len({id(e) for e in errors}) == 1
+    ok = calls["n"] == 1 and len(errors) == clients - 1 and same and isinstance(results[0], asyncio.CancelledError)
+    print(f"in-process: {clients} waiters, {calls['n']} call, {len(errors)} got its RuntimeError "
+          f"(same exception: {same}), cancelled waiter: {type(results[0]).__name__}, stats {group.stats()}")
+    return ok
+
+async def run_mode(base, stub, clients):
+    out = {}
+    for name, spec in BURSTS.items():
+        # new connections per burst: idle keep-alive sockets from a long burst may be closed by the server
+        async with httpx.AsyncClient(timeout=300, limits=httpx.Limits(max_connections=clients + 4)) as client:
+            out[name] = await burst(client, base, stub, spec, clients)
+    return out
+
+def main(a):
+    work = tempfile.mkdtemp(prefix="eco-single-flight-")
+    nex_root = os.path.join(work, "nex")
+    write_fixtures(nex_root, res=a.res)
+    boundaries = os.path.join(work, "india_states.geojson")
+    write_boundaries(boundaries)
+
+    shared_errors = asyncio.run(in_process(a.clients))
+    runs = {}
+    for mode in ("0", "1"):
+        env = {
+            "NEX_LOCAL_ROOT": nex_root,
+            "CLIMATE_CACHE_DIR": os.path.join(work, f"climate-cache-{mode}"),
+            "REGION_BOUNDARIES_FILE": boundaries,
+            "REGION_MASK_DIR": os.path.join(work, "region-masks"),
+            "ACTIVITY_DB": "",
+            "SINGLE_FLIGHT": mode,
+        }
+        with stub_and_app(a.stub_latency, env) as (base, stub):
+            runs[mode] = results = asyncio.run(run_mode(base, stub, a.clients))
+        print(f"\nSINGLE_FLIGHT={mode}, {a.clients} identical concurrent requests per burst")
+        for name, r in results.items():
+            print(f"  {name:20s} wall {r['wall']:6.2f}s  p50 {r['p50']:8.1f}ms  max {r['max']:8.1f}ms  "
+                  f"reductions {r['reductions']:3d}  model calls {r['llm_calls']:3d}  "
+                  f"coalesced {r['coalesced']:3d}  status {r['status']}")
+
+    work = {m: {k: r["reductions"] + r["llm_calls"] for k, r in runs[m].items()} for m in runs}
+    print("\nunderlying work per burst (reductions + model calls), off -> on:")
+    for k in BURSTS:
+        print(f"  {k:20s} {work['0'][k]:3d} -> {work['1'][k]:3d}")
+    errors_shared = all(runs[m]["explain_error"]["status"] == {502: a.clients} for m in runs)
+    print(f"every client got the 502 for the failing model call: {errors_shared}")
+    return 0 if shared_errors and errors_shared and all(work["1"][k] <= work["0"][k] for k in BURSTS) else 1
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.single_flight")
+    p.add_argument("--clients", type=int, default=60)
+    p.add_argument("--stub-latency", type=float, default=0.3)
+    p.add_argument("--res", type=float, default=0.25, help="fixture grid; finer = slower reductions")
+    sys.exit(main(p.parse_args()))
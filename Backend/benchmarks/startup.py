@@ -0,0 +1,71 @@
+# benchmarks/startup.py
+# Import-to-first-response time of app.py in a fresh interpreter, lazy
+# (default) vs APP_PRELOAD=1 (the climate stack and OpenAI client loaded at
+# startup, like the old eager imports). Each run is a new process: import app,
+# start the lifespan, serve GET /missions, then hit one climate route.
+#   python -m benchmarks.startup [--n 5]
+#   python -m benchmarks.startup --profile   # per-module import times (-X importtime)
+import os, sys, json, argparse, statistics, subprocess, tempfile
+from collections import defaultdict
+
+from benchmarks.servers import BACKEND_DIR
+
+CHILD = r"""
+import time, json, sys
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter() - t0
+from fastapi.testclient import TestClient
+with TestClient(app.app) as c:
+    assert c.get("/missions").status_code == 200
+    t_first = time.perf_counter() - t0
+    t1 = time.perf_counter()
+    c.get("/data/cache/stats")
+    t_climate = time.perf_counter() - t1
+print(json.dumps({"import": t_import, "first_response": t_first, "first_climate": t_climate}))
+"""
+
+def child_env(extra):
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "APP_PRELOAD")}
+    env.update({"OPENAI_API_KEY": "sk-stub", "CLIMATE_CACHE_DIR": tempfile.mkdtemp(), **extra})
+    return env
+
+def measure(extra, n):
+    runs = []
+    for _ in range(n):
+        out = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=child_env(extra),
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+
+def profile(top):
+    """Cumulative import time per top-level package for `import app`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=BACKEND_DIR,
+                         env=child_env({}), capture_output=True, text=True, check=True)
+    per_pkg = defaultdict(int)
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        per_pkg[name.strip().split(".")[0]] += int(self_us)
+    total = sum(per_pkg.values())
+    print(f"import app: {total / 1000:.0f} ms total")
+    for pkg, us in sorted(per_pkg.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {pkg:24s} {us / 1000:8.1f} ms")
+
+def run(n):
+    rows = {"eager (APP_PRELOAD=1)": measure({"APP_PRELOAD": "1"}, n), "lazy": measure({}, n)}
+    print(f"median of {n} fresh processes")
+    print(f"{'':24s} {'import':>9s} {'1st resp':>9s} {'1st climate':>12s}")
+    for name, r in rows.items():
+        print(f"{name:24s} {r['import'] * 1000:7.0f}ms {r['first_response'] * 1000:7.0f}ms "
+              f"{r['first_climate'] * 1000:10.0f}ms")
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    p.add_argument("--n", type=int, default=5)
+    p.add_argument("--profile", action="store_true", help="per-package import times instead")
+    p.add_argument("--top", type=int, default=15)
+    a = p.parse_args()
+    profile(a.top) if a.profile else run(a.n)
+    sys.exit(0)
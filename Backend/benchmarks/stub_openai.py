@@ -0,0 +1,110 @@
+# benchmarks/stub_openai.py
+# Minimal OpenAI-compatible Chat Completions server for load tests.
+#   STUB_LATENCY_S=1.0 uvicorn benchmarks.stub_openai:app --port 8901
+# then run the app with OPENAI_BASE_URL=http://127.0.0.1:8901/v1
+import os, json, time, asyncio, itertools
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_LATENCY_S = float(os.getenv("STUB_LATENCY_S", "0.5"))
+# streaming: first token after STUB_LATENCY_S * STUB_FIRST_TOKEN_SHARE, rest spread evenly
+STUB_FIRST_TOKEN_SHARE = float(os.getenv("STUB_FIRST_TOKEN_SHARE", "0.3"))
+STREAM_TEXT = "Great choice taking the bus today.\n- Walk for trips under 2 km\n- Try a veg thali tomorrow\n"
+# when tools are offered and none have run yet, answer with these tool calls
+# (comma-separated names; empty disables)
+STUB_TOOL_CALLS = [t for t in os.getenv("STUB_TOOL_CALLS", "points_calc,analyze_co2e").split(",") if t]
+TOOL_ARGS = {
+    "missions_catalog": {},
+    "points_calc": {"completed_missions": ["m1", "m2"]},
+    "analyze_co2e": {"mode": "bus", "distance_km": 12, "veg_meals": 2},
+}
+USAGE = {"prompt_tokens": 20, "completion_tokens": 10, "total_tokens": 30}
+# a request whose last message contains this fails with a 500 after the usual latency
+STUB_FAIL_MARKER = os.getenv("STUB_FAIL_MARKER", "[stub-fail]")
+
+app = FastAPI(title="stub-openai")
+_ids = itertools.count()
+calls = {"n": 0}
+
+def _content(body):
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return json.dumps({
+            "missions": [{"id": "stub", "title": "Stub mission", "category": "energy",
+                          "points": 10, "co2_saving_kg": 0.1}],
+            "feedback": "Nice work choosing the bus.",
+            "tips": ["Walk for trips under 2 km"],
+            "mode": "bus", "distance_km": 12, "veg_meals": 2,
+        })
+    return "Stub answer."
+
+def _tool_calls(body):
+    offered = {t["function"]["name"] for t in body.get("tools") or []}
+    if not offered or any(m.get("role") == "tool" for m in body.get("messages", [])):
+        return []
+    return [{"id": f"call_{i}", "type": "function",
+             "function": {"name": name, "arguments": json.dumps(TOOL_ARGS.get(name, {}))}}
+            for i, name in enumerate(STUB_TOOL_CALLS) if name in offered]
+
+@app.post("/v1/chat/completions")
+async def completions(request: Request):
+    body = await request.json()
+    calls["n"] += 1
+    latency = float(request.headers.get("x-stub-latency", STUB_LATENCY_S))
+    if body.get("stream"):
+        return StreamingResponse(_stream(body, latency), media_type="text/event-stream")
+    await asyncio.sleep(latency)
+    last = (body.get("messages") or [{}])[-1].get("content") or ""
+    if STUB_FAIL_MARKER and STUB_FAIL_MARKER in str(last):
+        return JSONResponse({"error": {"message": "stub failure", "type": "server_error"}}, status_code=500)
+    tool_calls = _tool_calls(body)
+    message = {"role": "assistant", "content": None, "tool_calls": tool_calls} if tool_calls \
+        else {"role": "assistant", "content": _content(body)}
+    return {
+        "id": f"chatcmpl-stub-{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+            "message": message,
+        }],
+        "usage": USAGE,
+    }
+
+async def _stream(body, latency):
+    cid = f"chatcmpl-stub-{next(_ids)}"
+    words = [w + " " for w in STREAM_TEXT.split(" ")]
+    base = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "stub")}
+    with_usage = (body.get("stream_options") or {}).get("include_usage")
+    tool_calls = _tool_calls(body)
+    if tool_calls:
+        await asyncio.sleep(latency)
+        for i, call in enumerate(tool_calls):
+            delta = {"tool_calls": [{"index": i, **call}]}
+            yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]})}\n\n"
+        yield f"data: {json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'tool_calls'}]})}\n\n"
+        if with_usage:
+            yield f"data: {json.dumps({**base, 'choices': [], 'usage': USAGE})}\n\n"
+        yield "data: [DONE]\n\n"
+        return
+    await asyncio.sleep(latency * STUB_FIRST_TOKEN_SHARE)
+    step = latency * (1 - STUB_FIRST_TOKEN_SHARE) / max(1, len(words))
+    for i, w in enumerate(words):
+        if i:
+            await asyncio.sleep(step)
+        chunk = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": body.get("model", "stub"),
+                 "choices": [{"index": 0, "delta": {"content": w}, "finish_reason": None}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+    done = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": body.get("model", "stub"), "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    yield f"data: {json.dumps(done)}\n\n"
+    if with_usage:
+        yield f"data: {json.dumps({**base, 'choices': [], 'usage': USAGE})}\n\n"
+    yield "data: [DONE]\n\n"
+
+@app.get("/stats")
+def stats():
+    return calls
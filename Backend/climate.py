@@ -0,0 +1,360 @@
+# climate.py
+# NEX-GDDP-CMIP6 reading + reduction for the India temperature endpoints.
+#
+# Data comes from the public S3 bucket by default. Set NEX_LOCAL_ROOT to a
+# directory that mirrors the bucket layout to read the same keys offline.
+#
+# Warm the series cache ahead of a demo/class:
+#   python -m climate warm --variable tasmax --scenario historical --model MIROC6
+
+import os, sys, argparse, functools
+from typing import Optional, List, Dict, Any, Tuple
+
+from fastapi import HTTPException
+
+import metrics
+from climate_cache import SeriesCache
+from lazy_imports import lazy_import
+from metrics import stage
+
+# imported on first use: s3fs (aiobotocore) is only needed for bucket reads,
+# xarray/nc_partial only when a series has to be computed
+xr = lazy_import("xarray")
+s3fs = lazy_import("s3fs")
+fsspec = lazy_import("fsspec")
+nc_partial = lazy_import("nc_partial")
+np = lazy_import("numpy")
+region_masks = lazy_import("region_masks")
+
+# India bounding box (rough): lon 68–98E, lat 6–37N
+INDIA_BBOX = dict(lon_min=68, lon_max=98, lat_min=6, lat_max=37)
+
+# One concrete file from NEX-GDDP-CMIP6 (daily tasmax “historical” for a single model)
+# Tip: open the S3 index in a browser to pick a model/scenario file you like:
+# https://nex-gddp-cmip6.s3.us-west-2.amazonaws.com/index.html
+NEX_BUCKET_PREFIX = "s3://nex-gddp-cmip6/CMIP6/ScenarioMIP"
+# Example path pattern (adjust after browsing the index):
+# s3://nex-gddp-cmip6/CMIP6/CMIP/<INSTITUTION>/<MODEL>/historical/r1i1p1f1/tasmax/..."
+# or
+# s3://nex-gddp-cmip6/CMIP6/ScenarioMIP/<INSTITUTION>/<MODEL>/ssp245/r1i1p1f1/tasmax/...
+
+# --- START: EDIT ME with a real key you select from the S3 index ---
+DEFAULT_NEX_KEY = "nex-gddp-cmip6/CMIP6/CMIP/NCC/MIROC6/historical/r1i1p1f1/tasmax/gn/v20201201/tasmax_day_MIROC6_historical_r1i1p1f1_gn_2014.nc"
+# --- END: EDIT ME ---
+
+# Layout used to resolve many files (see climate_pipeline.py); override with
+# NEX_KEY_TEMPLATE if your mirror/bucket differs. Must match DEFAULT_NEX_KEY's layout.
+NEX_KEY_TEMPLATE = os.getenv(
+    "NEX_KEY_TEMPLATE",
+    "nex-gddp-cmip6/CMIP6/{activity}/{institution}/{model}/{scenario}/r1i1p1f1/{variable}/gn/v20201201/"
+    "{variable}_day_{model}_{scenario}_r1i1p1f1_gn_{year}.nc",
+)
+NEX_INSTITUTION = os.getenv("NEX_INSTITUTION", "NCC")
+
+def nex_key(variable: str, scenario: str, model: str, year: int) -> str:
+    activity = "CMIP" if scenario == "historical" else "ScenarioMIP"
+    return NEX_KEY_TEMPLATE.format(activity=activity, institution=NEX_INSTITUTION,
+                                   model=model, scenario=scenario, variable=variable, year=year)
+
+KEY_HELP = (
+    "Open https://nex-gddp-cmip6.s3.us-west-2.amazonaws.com/index.html , "
+    "navigate to your desired model/scenario/variable, copy ONE .nc file key, "
+    "and paste it into climate.py as `DEFAULT_NEX_KEY`."
+)
+
+# Optional local mirror of the bucket (same relative keys), e.g. for offline tests
+NEX_LOCAL_ROOT = os.getenv("NEX_LOCAL_ROOT")
+
+# "full" opens the whole NetCDF through xarray; "partial" fetches only the
+# chunks intersecting the bbox via byte ranges (see nc_partial.py)
+NEX_READER = os.getenv("NEX_READER", "full")
+
+# Days read per block when reducing a file to region means (bounds memory)
+REGION_CHUNK_DAYS = int(os.getenv("CLIMATE_REGION_CHUNK_DAYS", "31"))
+
+@functools.lru_cache(maxsize=None)
+def get_s3():
+    """Anonymous S3FileSystem, created on the first bucket read."""
+    return s3fs.S3FileSystem(anon=True)
+
+# Two-tier cache (memory LRU + on-disk JSON) of reduced annual series
+series_cache = SeriesCache(
+    directory=os.getenv("CLIMATE_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".cache", "climate")),
+    max_items=int(os.getenv("CLIMATE_CACHE_MAX_ITEMS", "128")),
+    max_disk_items=int(os.getenv("CLIMATE_CACHE_MAX_DISK_ITEMS", "2048")),
+    ttl_s=float(os.getenv("CLIMATE_CACHE_TTL_S", str(7 * 24 * 3600))),
+)
+
+# Sizes of objects opened for a full (non byte-range) read; partial reads
+# report the bytes they actually fetch via nc_partial.read_stats()
+S3_OPENED_BYTES = metrics.counter("eco_s3_opened_bytes_total", "Size of NEX objects opened for full reads", ("source",))
+
+def bbox_key(bbox: Dict[str, float] = INDIA_BBOX) -> Tuple[float, ...]:
+    return (bbox["lon_min"], bbox["lon_max"], bbox["lat_min"], bbox["lat_max"])
+
+def open_nex_dataset(key: str, root: Optional[str] = None) -> "xr.Dataset":
+    """Open one NEX NetCDF file from S3, or from a local root (default NEX_LOCAL_ROOT)."""
+    if not key:
+        raise HTTPException(500, f"No NEX key set. {KEY_HELP}")
+
+    root = root or NEX_LOCAL_ROOT
+    if root:
+        path = os.path.join(root, key.removeprefix("s3://"))
+        if not os.path.exists(path):
+            raise HTTPException(404, f"Local key not found: {path}")
+        with stage("climate.open"):
+            ds = xr.open_dataset(path)
+        S3_OPENED_BYTES.inc(os.path.getsize(path), source="local")
+        return ds
+
+    s3 = get_s3()
+    with stage("climate.exists"):
+        found = s3.exists(key)
+    if not found:
+        raise HTTPException(404, f"S3 key not found: {key}")
+    url = f"s3://{key}" if not key.startswith("s3://") else key
+    with stage("climate.open"):
+        f = s3.open(url)
+        ds = xr.open_dataset(f, engine="netcdf4")
+    S3_OPENED_BYTES.inc(f.size, source="s3")
+    return ds
+
+def nex_fs_path(key: str, root: Optional[str] = None):
+    """(filesystem, path) for a key, honouring a local root like open_nex_dataset()."""
+    root = root or NEX_LOCAL_ROOT
+    if root:
+        path = os.path.join(root, key.removeprefix("s3://"))
+        if not os.path.exists(path):
+            raise HTTPException(404, f"Local key not found: {path}")
+        return fsspec.filesystem("file"), path
+    s3 = get_s3()
+    with stage("climate.exists"):
+        found = s3.exists(key)
+    if not found:
+        raise HTTPException(404, f"S3 key not found: {key}")
+    return s3, key.removeprefix("s3://")
+
+def open_partial_reader(key: str, variable: str, root: Optional[str] = None) -> Optional["nc_partial.PartialReader"]:
+    """PartialReader for key, or None if the file layout isn't supported (use a full read)."""
+    fs, path = nex_fs_path(key, root)
+    try:
+        index = nc_partial.load_index(fs, path)
+        return nc_partial.PartialReader(fs, path, pick_variable(index["variables"], variable), index=index)
+    except nc_partial.UnsupportedLayout as e:
+        print(f"[climate] partial read unsupported for {key}: {e}; falling back to full read")
+        return None
+
+def pick_variable(ds, variable: str) -> str:
+    # NEX variables are typically Kelvin for temperature; check variable name
+    if variable in ds:
+        return variable
+    # Try common alternatives
+    for cand in ("tas", "tasmax"):
+        if cand in ds:
+            return cand
+    found = list(ds.data_vars) if isinstance(ds, xr.Dataset) else list(ds)
+    raise HTTPException(500, f"Variable '{variable}' not found in dataset vars: {found}")
+
+def subset_bbox(da: "xr.DataArray", bbox: Dict[str, float] = INDIA_BBOX) -> "xr.DataArray":
+    # lat may be descending in some datasets
+    lat = da["lat"]
+    lat_slice = slice(bbox["lat_min"], bbox["lat_max"]) if float(lat[0]) < float(lat[-1]) \
+                else slice(bbox["lat_max"], bbox["lat_min"])
+    lon_slice = slice(bbox["lon_min"], bbox["lon_max"])
+    return da.sel(lat=lat_slice, lon=lon_slice)
+
+def to_celsius(da: "xr.DataArray") -> "xr.DataArray":
+    if da.attrs.get("units", "").lower().startswith("k"):
+        return da - 273.15
+    return da
+
+class BboxBlocks:
+    """
+    Time blocks of one file inside INDIA_BBOX, `chunk_days` at a time, with
+    whichever reader NEX_READER selects. Use as a context manager:
+
+        with BboxBlocks(key, "tasmax") as src:
+            for block, years in src:   # (days, lat * lon) float64, (days,) years
+                ...
+
+    `lat`/`lon` are the subset's coordinates, `years`/`months` the calendar
+    of every day; `kelvin` tells whether values still need converting to °C. Memory stays ~chunk_days * lat * lon floats.
+    """
+
+    def __init__(self, key: str, variable: str, root: Optional[str] = None, chunk_days: int = REGION_CHUNK_DAYS):
+        self.chunk_days = chunk_days
+        self._ds = None
+        self._reader = open_partial_reader(key, variable, root) if NEX_READER == "partial" else None
+        if self._reader is not None:
+            # byte-range path: only chunks inside the bbox and time block are fetched
+            r = self._reader
+            self._lat_s, self._lon_s = r.bbox_slices(INDIA_BBOX)
+            self.lat, self.lon = r.lat[self._lat_s], r.lon[self._lon_s]
+            self.kelvin = r.attrs.get("units", "").lower().startswith("k")
+            self.years = r.time.astype("datetime64[Y]").astype(int) + 1970
+            self.months = r.time.astype("datetime64[M]").astype(int) % 12 + 1
+            return
+        self._ds = ds = open_nex_dataset(key, root=root)
+        try:
+            da = ds[pick_variable(ds, variable)]
+            if "lat" not in da.dims:
+                da = da.rename({"latitude": "lat", "longitude": "lon"})
+            with stage("climate.subset"):
+                da = subset_bbox(da)
+        except Exception:
+            ds.close()
+            raise
+        self._da = da
+        self.lat, self.lon = da["lat"].values, da["lon"].values
+        self.kelvin = da.attrs.get("units", "").lower().startswith("k")
+        self.years = da["time"].dt.year.values
+        self.months = da["time"].dt.month.values
+
+    def __enter__(self) -> "BboxBlocks":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._ds is not None:
+            self._ds.close()
+            self._ds = None
+
+    def __iter__(self):
+        partial = self._reader is not None
+        for i in range(0, len(self.years), self.chunk_days):
+            t = slice(i, i + self.chunk_days)
+            with stage("climate.partial_read" if partial else "climate.read"):
+                raw = self._reader.read(t, self._lat_s, self._lon_s) if partial else self._da.isel(time=t).values
+                block = np.asarray(raw, dtype=np.float64)
+            yield block.reshape(block.shape[0], -1), self.years[t]
+
+def region_year_means(
+    key: str,
+    variable: str,
+    root: Optional[str] = None,
+    chunk_days: int = REGION_CHUNK_DAYS,
+    codes: Optional[List[str]] = None,
+) -> Tuple[List[str], Dict[str, Dict[int, float]]]:
+    """
+    (codes, {code: {year: mean °C}}) for one file: area-weighted means over
+    every region mask (default all regions) in a single pass, reading
+    `chunk_days` at a time inside INDIA_BBOX. NaNs are ignored.
+    """
+    with BboxBlocks(key, variable, root, chunk_days) as src:
+        with stage("climate.masks"):
+            codes, w = region_masks.weights(src.lat, src.lon, codes)
+        wt = w.T  # (cells, regions)
+        sums: Dict[int, Any] = {}
+        wsums: Dict[int, Any] = {}
+        for block, block_years in src:
+            with stage("climate.reduce"):
+                valid = ~np.isnan(block)
+                s = np.where(valid, block, 0.0) @ wt   # (days, regions) weighted sums
+                n = valid.astype(np.float64) @ wt      # weights of the valid cells
+                for y in np.unique(block_years):
+                    day = block_years == y
+                    sums[int(y)] = sums.get(int(y), 0.0) + s[day].sum(axis=0)
+                    wsums[int(y)] = wsums.get(int(y), 0.0) + n[day].sum(axis=0)
+        kelvin = src.kelvin
+
+    offset = 273.15 if kelvin else 0.0
+    out: Dict[str, Dict[int, float]] = {c: {} for c in codes}
+    for y in sorted(sums):
+        for j, c in enumerate(codes):
+            if wsums[y][j] > 0:
+                out[c][y] = float(sums[y][j] / wsums[y][j]) - offset
+    return codes, out
+
+def region_annual_series(variable: str, key: str = DEFAULT_NEX_KEY) -> Dict[str, List[Dict[str, Any]]]:
+    """{region code: annual mean temperature series (°C)} for every region, from one read of the file."""
+    codes, means = region_year_means(key, variable)
+    return {c: [{"year": y, "t_mean_c": round(v, 2)} for y, v in means[c].items()] for c in codes}
+
+def india_annual_series(variable: str, key: str = DEFAULT_NEX_KEY) -> List[Dict[str, Any]]:
+    """
+    Annual mean temperature series (°C) over India for one NEX file
+    (cos-latitude weighted, inside the India mask / INDIA_BBOX).
+    """
+    _, means = region_year_means(key, variable, codes=[region_masks.INDIA])
+    return [{"year": y, "t_mean_c": round(v, 2)} for y, v in means[region_masks.INDIA].items()]
+
+def mask_key() -> Tuple[str, int]:
+    """Identifies the region masks a cached series was computed with."""
+    return (region_masks.boundaries().digest, region_masks.MASK_SAMPLES)
+
+def cached_region_series(
+    variable: str,
+    scenario: str,
+    model: str,
+    key: str = DEFAULT_NEX_KEY,
+    refresh: bool = False,
+) -> Tuple[Dict[str, List[Dict[str, Any]]], str]:
+    """
+    region_annual_series() behind series_cache: every region is cached under
+    one entry, so any subset of regions is served without re-reading the
+    file. Returns (series by region, cache_status) where cache_status is
+    "memory", "disk", "miss" or "refresh".
+    """
+    cache_key = ("regions", variable, scenario, model, key, bbox_key(), mask_key())
+    if not refresh:
+        series, status = series_cache.get(cache_key)
+        if series is not None:
+            return series, status
+    series = region_annual_series(variable, key)
+    series_cache.put(cache_key, series)
+    return series, "refresh" if refresh else "miss"
+
+def cached_india_series(
+    variable: str,
+    scenario: str,
+    model: str,
+    key: str = DEFAULT_NEX_KEY,
+    refresh: bool = False,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """The India series out of cached_region_series()."""
+    series, status = cached_region_series(variable, scenario, model, key, refresh=refresh)
+    return series[region_masks.INDIA], status
+
+# ---------- Warm-up CLI ----------
+def warm(combos: List[Tuple[str, str, str, str]], refresh: bool = False) -> List[Dict[str, Any]]:
+    report = []
+    for variable, scenario, model, key in combos:
+        try:
+            series, status = cached_region_series(variable, scenario, model, key, refresh=refresh)
+            report.append({"variable": variable, "scenario": scenario, "model": model,
+                           "status": status, "regions": len(series),
+                           "points": len(series[region_masks.INDIA])})
+        except HTTPException as e:
+            report.append({"variable": variable, "scenario": scenario, "model": model,
+                           "status": "error", "detail": e.detail})
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m climate")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("warm", help="precompute series into the cache")
+    w.add_argument("--variable", action="append", help="repeatable; default tasmax")
+    w.add_argument("--scenario", default="historical")
+    w.add_argument("--model", action="append", help="repeatable; default MIROC6")
+    w.add_argument("--key", default=DEFAULT_NEX_KEY)
+    w.add_argument("--refresh", action="store_true", help="recompute even if cached")
+    sub.add_parser("stats", help="print cache counters")
+    sub.add_parser("clear", help="drop memory and disk cache")
+    args = p.parse_args(argv)
+
+    if args.cmd == "warm":
+        combos = [(v, args.scenario, m, args.key)
+                  for v in (args.variable or ["tasmax"])
+                  for m in (args.model or ["MIROC6"])]
+        for row in warm(combos, refresh=args.refresh):
+            print(row)
+    elif args.cmd == "stats":
+        print(series_cache.stats())
+    elif args.cmd == "clear":
+        series_cache.clear()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# climate_cache.py
+# Two-tier cache for small, reduced climate series:
+#   1) bounded in-memory LRU (per worker)
+#   2) persistent on-disk JSON store shared by all workers on the host
+# Both tiers honour the same TTL. Disk is trimmed to max_disk_items (oldest first).
+
+import os, json, time, hashlib, threading
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple, Hashable
+
+class SeriesCache:
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_items: int = 128,
+        max_disk_items: int = 2048,
+        ttl_s: float = 7 * 24 * 3600,
+    ):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self.ttl_s = ttl_s
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                          "expired": 0, "evictions": 0, "disk_evictions": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _digest(key: Hashable) -> str:
+        raw = json.dumps(key, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _fresh(self, created: float) -> bool:
+        return self.ttl_s <= 0 or (time.time() - created) < self.ttl_s
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: Hashable) -> Tuple[Optional[Any], str]:
+        """Return (value, "memory"|"disk") on a hit, (None, "miss") otherwise."""
+        digest = self._digest(key)
+        with self._lock:
+            hit = self._mem.get(digest)
+            if hit is not None:
+                created, value = hit
+                if self._fresh(created):
+                    self._mem.move_to_end(digest)
+                    self._counters["memory_hits"] += 1
+                    return value, "memory"
+                del self._mem[digest]
+                self._counters["expired"] += 1
+
+        if self.directory:
+            path = self._path(digest)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    doc = json.load(f)
+            except (FileNotFoundError, ValueError):
+                doc = None
+            if doc is not None:
+                if self._fresh(doc.get("created", 0)):
+                    self._remember(digest, doc["created"], doc["value"])
+                    self._count("disk_hits")
+                    return doc["value"], "disk"
+                self._count("expired")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        self._count("misses")
+        return None, "miss"
+
+    def put(self, key: Hashable, value: Any) -> None:
+        digest = self._digest(key)
+        created = time.time()
+        self._remember(digest, created, value)
+        if not self.directory:
+            return
+        path = self._path(digest)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "created": created, "value": value}, f, default=str)
+        os.replace(tmp, path)  # atomic, so concurrent readers never see half a file
+        self._trim_disk()
+
+    def _remember(self, digest: str, created: float, value: Any) -> None:
+        with self._lock:
+            self._mem[digest] = (created, value)
+            self._mem.move_to_end(digest)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _trim_disk(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                p = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.path.getmtime(p), p))
+                except OSError:
+                    pass
+        excess = len(entries) - self.max_disk_items
+        if excess <= 0:
+            return
+        entries.sort()
+        for _, p in entries[:excess]:
+            try:
+                os.remove(p)
+                self._count("disk_evictions")
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters)
+            out["memory_items"] = len(self._mem)
+        lookups = out["memory_hits"] + out["disk_hits"] + out["misses"]
+        out["hit_rate"] = round((out["memory_hits"] + out["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return out
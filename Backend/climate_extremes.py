@@ -0,0 +1,239 @@
+# climate_extremes.py
+# Heat-extreme indicators per year and region from daily tasmax:
+#
+#   hot_days       days above threshold_c, averaged over the region's area
+#   heatwave_days  days inside runs of >= min_days consecutive hot days
+#                  (per grid cell, then area-averaged)
+#   p<q>_c         q-th percentile of daily tasmax over the region's cells
+#                  (area-weighted)
+#
+# Files are streamed one year after another in time blocks of chunk_days
+# (climate.BboxBlocks). Counts are running sums, heatwave runs carry over
+# block and year boundaries as a per-cell run length, and percentiles come
+# from a fixed-width weighted histogram per (region, year), which is a
+# mergeable quantile sketch accurate to HEAT_HIST_BIN_C. A year's histogram
+# is folded into percentiles as soon as the next year starts, so peak memory
+# is one block plus one open year, whatever the year range.
+
+import os
+from typing import Optional, Any, Dict, List, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+import climate
+from climate import region_masks
+from metrics import stage
+
+HEAT_THRESHOLD_C = float(os.getenv("HEAT_THRESHOLD_C", "40"))
+HEATWAVE_MIN_DAYS = int(os.getenv("HEATWAVE_MIN_DAYS", "3"))
+# Histogram sketch: bins of HEAT_HIST_BIN_C over [HIST_LO_C, HIST_HI_C);
+# values outside land in the end bins
+HEAT_HIST_BIN_C = float(os.getenv("HEAT_HIST_BIN_C", "0.1"))
+HIST_LO_C, HIST_HI_C = -60.0, 70.0
+
+def parse_percentiles(param: str) -> List[float]:
+    try:
+        qs = sorted({float(q) for q in param.split(",") if q.strip()})
+    except ValueError:
+        raise HTTPException(400, f"percentiles must be numbers, got '{param}'")
+    if not qs or any(not 0 < q < 100 for q in qs):
+        raise HTTPException(400, "percentiles must be between 0 and 100 (exclusive)")
+    return qs
+
+def percentile_key(q: float) -> str:
+    return f"p{q:g}_c".replace(".", "_")
+
+def hist_quantile(h: np.ndarray, q: float, lo: float = HIST_LO_C, width: float = HEAT_HIST_BIN_C) -> Optional[float]:
+    """q-th percentile (0-100) from one weighted histogram, interpolated inside the bin."""
+    cum = np.cumsum(h)
+    if cum[-1] <= 0:
+        return None
+    target = q / 100 * cum[-1]
+    i = int(np.searchsorted(cum, target))
+    before = cum[i - 1] if i else 0.0
+    frac = (target - before) / h[i] if h[i] > 0 else 0.0
+    return lo + (i + frac) * width
+
+class HeatAccumulator:
+    """Streaming heat indicators for fixed regions on one grid; feed it °C blocks in time order."""
+
+    def __init__(self, codes: List[str], w: np.ndarray, threshold_c: float = HEAT_THRESHOLD_C,
+                 min_days: int = HEATWAVE_MIN_DAYS, percentiles: Tuple[float, ...] = (95.0,),
+                 bin_c: float = HEAT_HIST_BIN_C):
+        self.codes, self.threshold_c, self.min_days = codes, threshold_c, max(1, min_days)
+        self.percentiles, self.bin_c = tuple(percentiles), bin_c
+        self.n_bins = int(np.ceil((HIST_HI_C - HIST_LO_C) / bin_c))
+        self.wt = w.T  # (cells, regions)
+        # cells each region covers, flattened so one bincount fills every region's histogram
+        rows, cells = np.nonzero(w)
+        self._cells = cells
+        self._hist_offset = rows * self.n_bins
+        self._cell_w = w[rows, cells]
+
+        self.run = np.zeros(w.shape[1], dtype=np.int32)   # current hot-day run per cell
+        self.prev_years: List[int] = []                   # years of the last min_days - 1 days
+        self.hot: Dict[int, np.ndarray] = {}              # year -> weighted hot-day sum per region
+        self.wave: Dict[int, np.ndarray] = {}
+        self.valid: Dict[int, np.ndarray] = {}            # year -> weighted valid cell-days
+        self.days: Dict[int, int] = {}
+        self.hist: Dict[int, np.ndarray] = {}             # open years only
+        self.quantiles: Dict[int, Dict[float, List[Optional[float]]]] = {}
+
+    def reset_runs(self) -> None:
+        """Break every run (e.g. a missing year between files)."""
+        self.run[:] = 0
+        self.prev_years = []
+
+    def _add(self, acc: Dict[int, np.ndarray], year: int, v: np.ndarray) -> None:
+        acc[year] = acc[year] + v if year in acc else v.copy()
+
+    def add(self, block: np.ndarray, years: np.ndarray) -> None:
+        """block: (days, cells) °C, NaN = missing; years: (days,)."""
+        for y in list(self.hist):
+            if y < years[0]:
+                self._close_year(y)
+
+        valid = ~np.isnan(block)
+        hot = valid & (block > self.threshold_c)  # NaN breaks a run
+
+        runs = np.empty(block.shape, dtype=np.int32)
+        r = self.run
+        for i in range(block.shape[0]):
+            r = (r + 1) * hot[i]
+            runs[i] = r
+        self.run = r
+        k = self.min_days
+        in_wave = (runs >= k).astype(np.float64) @ self.wt
+        # the day a run reaches k also makes its k - 1 previous days heatwave days
+        qualified = (runs == k).astype(np.float64) @ self.wt if k > 1 else None
+        hot_w = hot.astype(np.float64) @ self.wt
+        valid_w = valid.astype(np.float64) @ self.wt
+
+        for y in np.unique(years):
+            day = years == y
+            y = int(y)
+            self._add(self.hot, y, hot_w[day].sum(axis=0))
+            self._add(self.wave, y, in_wave[day].sum(axis=0))
+            self._add(self.valid, y, valid_w[day].sum(axis=0))
+            self.days[y] = self.days.get(y, 0) + int(day.sum())
+        if qualified is not None:
+            ext = np.concatenate([np.asarray(self.prev_years, dtype=years.dtype), years])
+            pad = len(self.prev_years)
+            for j in range(1, k):
+                idx = pad - j + np.arange(len(years))   # day j days earlier, in ext
+                ok = idx >= 0                           # before the stream / a reset: no run there
+                back, q = ext[idx[ok]], qualified[ok]
+                for y in np.unique(back):
+                    self._add(self.wave, int(y), q[back == y].sum(axis=0))
+            self.prev_years = [int(y) for y in ext[-(k - 1):]]
+
+        self._add_hist(block, valid, years)
+
+    def _add_hist(self, block: np.ndarray, valid: np.ndarray, years: np.ndarray) -> None:
+        ok = valid[:, self._cells]
+        vals = np.where(ok, block[:, self._cells], HIST_LO_C)
+        bins = np.clip(((vals - HIST_LO_C) / self.bin_c).astype(np.int64, copy=False), 0, self.n_bins - 1)
+        flat = bins + self._hist_offset[None, :]
+        weights = np.broadcast_to(self._cell_w, flat.shape)
+        size = len(self.codes) * self.n_bins
+        for y in np.unique(years):
+            sel = ok & (years == y)[:, None]
+            h = np.bincount(flat[sel], weights=weights[sel], minlength=size)
+            self._add(self.hist, int(y), h)
+
+    def _close_year(self, year: int) -> None:
+        h = self.hist.pop(year).reshape(len(self.codes), self.n_bins)
+        self.quantiles[year] = {q: [hist_quantile(h[j], q, width=self.bin_c) for j in range(len(self.codes))]
+                                for q in self.percentiles}
+
+    def result(self) -> Dict[str, List[Dict[str, Any]]]:
+        """{code: [{"year", "hot_days", "heatwave_days", "p<q>_c"...}]}; closes every open year."""
+        for y in list(self.hist):
+            self._close_year(y)
+        out: Dict[str, List[Dict[str, Any]]] = {c: [] for c in self.codes}
+        for y in sorted(self.days):
+            for j, c in enumerate(self.codes):
+                if self.valid[y][j] <= 0:
+                    continue
+                # weighted cell-days / mean valid weight per day = days per cell
+                area = self.valid[y][j] / self.days[y]
+                row = {"year": y, "hot_days": round(float(self.hot[y][j] / area), 2),
+                       "heatwave_days": round(float(self.wave[y][j] / area), 2)}
+                for q in self.percentiles:
+                    v = self.quantiles[y][q][j]
+                    row[percentile_key(q)] = None if v is None else round(v, 2)
+                out[c].append(row)
+        return out
+
+def heat_extremes(
+    scenario: str,
+    model: str,
+    start_year: int,
+    end_year: int,
+    threshold_c: float = HEAT_THRESHOLD_C,
+    min_days: int = HEATWAVE_MIN_DAYS,
+    percentiles: Tuple[float, ...] = (95.0,),
+    variable: str = "tasmax",
+    root: Optional[str] = None,
+    chunk_days: int = climate.REGION_CHUNK_DAYS,
+) -> Dict[str, Any]:
+    """
+    Heat indicators for every region, streaming one file per year in order
+    (runs continue from 31 Dec into 1 Jan). Missing years are reported and
+    break the runs.
+    """
+    if end_year < start_year:
+        raise HTTPException(400, "end_year must be >= start_year")
+    acc: Optional[HeatAccumulator] = None
+    grid = None
+    missing = []
+    for year in range(start_year, end_year + 1):
+        key = climate.nex_key(variable, scenario, model, year)
+        try:
+            with climate.BboxBlocks(key, variable, root, chunk_days) as src:
+                if acc is None or grid != (len(src.lat), len(src.lon)):
+                    with stage("climate.masks"):
+                        codes, w = region_masks.weights(src.lat, src.lon)
+                    if acc is not None:
+                        raise HTTPException(500, f"grid changed in {key}")
+                    acc = HeatAccumulator(codes, w, threshold_c, min_days, percentiles)
+                    grid = (len(src.lat), len(src.lon))
+                offset = 273.15 if src.kelvin else 0.0
+                for block, years in src:
+                    with stage("climate.heat"):
+                        acc.add(block - offset if offset else block, years)
+        except HTTPException as e:
+            if e.status_code != 404:
+                raise
+            missing.append({"year": year, "error": str(e.detail)})
+            if acc is not None:
+                acc.reset_runs()
+
+    if acc is None:
+        raise HTTPException(404, f"No files could be read for {variable}/{scenario}/{model} {start_year}-{end_year}")
+    return {"variable": variable, "scenario": scenario, "model": model,
+            "threshold_c": threshold_c, "min_days": min_days,
+            "percentiles": list(percentiles), "histogram_bin_c": HEAT_HIST_BIN_C,
+            "regions": acc.result(), "missing": missing}
+
+def cached_heat_extremes(
+    scenario: str,
+    model: str,
+    start_year: int,
+    end_year: int,
+    threshold_c: float = HEAT_THRESHOLD_C,
+    min_days: int = HEATWAVE_MIN_DAYS,
+    percentiles: Tuple[float, ...] = (95.0,),
+    refresh: bool = False,
+) -> Tuple[Dict[str, Any], str]:
+    """heat_extremes() behind climate.series_cache (all regions in one entry)."""
+    cache_key = ("heat", scenario, model, start_year, end_year, threshold_c, min_days, list(percentiles),
+                 HEAT_HIST_BIN_C, climate.bbox_key(), climate.mask_key())
+    if not refresh:
+        data, status = climate.series_cache.get(cache_key)
+        if data is not None:
+            return data, status
+    data = heat_extremes(scenario, model, start_year, end_year, threshold_c, min_days, percentiles)
+    climate.series_cache.put(cache_key, data)
+    return data, "refresh" if refresh else "miss"
@@ -0,0 +1,172 @@
+# climate_pipeline.py
+# Multi-year, multi-model India annual-mean series.
+#
+# Resolves one NEX file per (model, year) via climate.nex_key(), reduces each
+# file to per-year India means in a process pool, then merges into one series
+# with per-model columns and an ensemble mean. Each worker reads the bbox in
+# time blocks of `chunk_days`, so its memory is ~chunk_days * lat * lon floats
+# no matter how long the file is. Means are area-weighted over the India mask
+# (see region_masks.py).
+#
+# The pool is created on first use and kept for the life of the process
+# (shutdown() at app exit). Its workers are spawned, not forked: forking a
+# multithreaded uvicorn worker can copy a lock some other thread holds.
+
+import os, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+import climate
+from metrics import stage
+
+PIPELINE_WORKERS = int(os.getenv("CLIMATE_PIPELINE_WORKERS", str(min(8, os.cpu_count() or 1))))
+PIPELINE_CHUNK_DAYS = int(os.getenv("CLIMATE_PIPELINE_CHUNK_DAYS", "31"))
+
+_pools: Dict[int, ProcessPoolExecutor] = {}  # max_workers -> pool
+_pools_lock = threading.Lock()
+
+def pool(workers: int = PIPELINE_WORKERS) -> ProcessPoolExecutor:
+    """The shared process pool with `workers` processes (created on first use)."""
+    with _pools_lock:
+        p = _pools.get(workers)
+        if p is None:
+            p = _pools[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                      mp_context=multiprocessing.get_context("spawn"))
+        return p
+
+def _discard(p: ProcessPoolExecutor) -> None:
+    with _pools_lock:
+        for k in [k for k, v in _pools.items() if v is p]:
+            del _pools[k]
+    p.shutdown(wait=False, cancel_futures=True)
+
+def shutdown() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for p in pools:
+        p.shutdown(cancel_futures=True)
+
+def resolve_files(
+    variable: str,
+    scenario: str,
+    models: List[str],
+    start_year: int,
+    end_year: int,
+) -> List[Tuple[str, int, str]]:
+    """(model, year, key) for every file the series needs."""
+    if end_year < start_year:
+        raise HTTPException(400, "end_year must be >= start_year")
+    return [(m, y, climate.nex_key(variable, scenario, m, y))
+            for m in models for y in range(start_year, end_year + 1)]
+
+def reduce_file(
+    key: str,
+    variable: str,
+    root: Optional[str] = None,
+    chunk_days: int = PIPELINE_CHUNK_DAYS,
+) -> Dict[int, float]:
+    """
+    {year: mean °C over India} for one file, reading `chunk_days` at a time.
+    Same result as climate.india_annual_series() (cos-latitude weighted, NaNs ignored).
+    """
+    india = climate.region_masks.INDIA
+    _, means = climate.region_year_means(key, variable, root, chunk_days, codes=[india])
+    return means[india]
+
+def _reduce_task(task: Tuple[str, int, str, str, Optional[str], int]) -> Tuple[str, int, Optional[Dict[int, float]], Optional[str]]:
+    # the reason goes into the response, so it names no path or key; the full error is logged here
+    model, year, key, variable, root, chunk_days = task
+    try:
+        return model, year, reduce_file(key, variable, root, chunk_days), None
+    except HTTPException as e:
+        print(f"[pipeline] {model} {year} failed: {e.detail}")
+        return model, year, None, "file not found" if e.status_code == 404 else "unreadable file"
+    except Exception as e:
+        print(f"[pipeline] {model} {year} failed: {type(e).__name__}: {e}")
+        return model, year, None, f"read failed ({type(e).__name__})"
+
+def merge_series(models: List[str], per_model: Dict[str, Dict[int, float]]) -> List[Dict[str, Any]]:
+    years = sorted({y for vals in per_model.values() for y in vals})
+    out = []
+    for y in years:
+        row = {m: round(per_model[m][y], 2) for m in models if y in per_model.get(m, {})}
+        out.append({
+            "year": y,
+            "t_mean_c": round(float(np.mean([per_model[m][y] for m in row])), 2),  # ensemble mean
+            "models": row,
+        })
+    return out
+
+def india_multi_model_series(
+    variable: str,
+    scenario: str,
+    models: List[str],
+    start_year: int,
+    end_year: int,
+    root: Optional[str] = None,
+    workers: int = PIPELINE_WORKERS,
+    chunk_days: int = PIPELINE_CHUNK_DAYS,
+) -> Dict[str, Any]:
+    """
+    Annual India series across models and years. workers <= 1 runs serially
+    in-process (useful for debugging and as the benchmark baseline).
+    """
+    files = resolve_files(variable, scenario, models, start_year, end_year)
+    tasks = [(m, y, key, variable, root, chunk_days) for m, y, key in files]
+
+    # per-file stages inside pool workers stay in those processes; time the whole fan-out here
+    with stage("climate.pipeline"):
+        if workers <= 1 or len(tasks) <= 1:
+            results = [_reduce_task(t) for t in tasks]
+        else:
+            p = pool(workers)
+            try:
+                results = list(p.map(_reduce_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+            except BrokenProcessPool:
+                _discard(p)  # a worker died; the next request starts a fresh pool
+                raise
+
+    per_model: Dict[str, Dict[int, float]] = {m: {} for m in models}
+    missing = []
+    for model, year, vals, err in results:
+        if vals is None:
+            missing.append({"model": model, "year": year, "error": err})
+            continue
+        per_model[model].update(vals)
+
+    if not any(per_model.values()):
+        raise HTTPException(404, f"No files could be read for {variable}/{scenario} {','.join(models)} {start_year}-{end_year}")
+
+    return {
+        "variable": variable,
+        "scenario": scenario,
+        "models": models,
+        "series": merge_series(models, per_model),
+        "missing": missing,
+    }
+
+def cached_multi_model_series(
+    variable: str,
+    scenario: str,
+    models: List[str],
+    start_year: int,
+    end_year: int,
+    refresh: bool = False,
+) -> Tuple[Dict[str, Any], str]:
+    """india_multi_model_series() behind climate.series_cache (complete results only)."""
+    # the body lists models in the order asked for, so the key keeps that order too
+    cache_key = ("multi", variable, scenario, list(models), start_year, end_year,
+                 climate.bbox_key(), climate.mask_key())
+    if not refresh:
+        data, status = climate.series_cache.get(cache_key)
+        if data is not None:
+            return data, status
+    data = india_multi_model_series(variable, scenario, models, start_year, end_year)
+    if not data["missing"]:  # a read error may be transient: retry it next time instead of caching the gap
+        climate.series_cache.put(cache_key, data)
+    return data, "refresh" if refresh else "miss"
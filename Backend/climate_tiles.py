@@ -0,0 +1,322 @@
+# climate_tiles.py
+# Gridded annual / monthly mean fields over INDIA_BBOX for heat maps, served
+# from a precomputed multi-resolution pyramid.
+#
+# A pyramid is built once per (variable, scenario, model, year) file by
+# streaming it in time blocks (climate.BboxBlocks) into per-cell monthly
+# sums. Layer 0 is the annual mean (every valid day counts once) and layers
+# 1-12 are the months. Level 0 is the native grid (0.25° for NEX); level L
+# averages 2^L x 2^L native cells, ignoring missing ones (block mean). Levels
+# stop once the grid is down to TILE_MIN_CELLS cells on its longer side.
+# Values are stored as int16 hundredths of a °C (NODATA for missing
+# cells), one .npy file per level, and memory-mapped when served:
+#
+#   <CLIMATE_TILE_DIR>/<digest>/meta.json
+#   <CLIMATE_TILE_DIR>/<digest>/level<L>.npy     (13, ny, nx) int16, rows south -> north
+#
+# A request names a viewport (bbox) and an output size in pixels. It gets the
+# coarsest level whose cells are still no larger than one pixel, cropped to
+# the viewport. The binary format is
+#
+#   b"ECT1" | uint32 LE header length | JSON header | cells, row-major, little-endian
+#
+# where the header gives level, shape, lat0/lon0 (centre of the first cell),
+# step (°), dtype ("int16" or "float16"), scale and nodata (int16 only:
+# °C = value * scale). format=json returns the same window as nested lists.
+#
+# Build ahead of a class:
+#   python -m climate_tiles build --year 2014 [--variable tasmax] [--scenario historical] [--model MIROC6]
+
+import os, sys, json, time, struct, shutil, hashlib, argparse, functools, tempfile, threading
+from collections import OrderedDict
+from typing import Optional, Any, Dict, List, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+import climate
+import payloads
+from metrics import stage
+
+TILE_DIR = os.getenv("CLIMATE_TILE_DIR", os.path.join(os.path.dirname(__file__), ".cache", "climate-tiles"))
+TILE_MIN_CELLS = int(os.getenv("TILE_MIN_CELLS", "8"))
+# open pyramids kept per worker (their metadata; the levels are memory-mapped)
+PYRAMID_CACHE_ITEMS = int(os.getenv("PYRAMID_CACHE_ITEMS", "64"))
+# encoded windows kept per worker (the pyramids themselves are memory-mapped)
+TILE_RESPONSE_CACHE_ITEMS = int(os.getenv("TILE_RESPONSE_CACHE_ITEMS", "512"))
+
+# bump when the stored layout or the reduction changes
+TILE_FORMAT = "tiles-v1"
+MAGIC = b"ECT1"
+SCALE = 0.01
+NODATA = -32768
+LAYERS = 13  # annual + 12 months
+
+def quantize(field: np.ndarray) -> np.ndarray:
+    """°C float array -> int16 hundredths, NODATA where missing."""
+    q = np.round(field / SCALE)
+    q = np.where(np.isnan(q), NODATA, np.clip(q, NODATA + 1, 32767))
+    return q.astype(np.int16)
+
+def dequantize(q: np.ndarray) -> np.ndarray:
+    out = q.astype(np.float32) * np.float32(SCALE)
+    out[q == NODATA] = np.nan
+    return out
+
+def block_mean(sums: np.ndarray, counts: np.ndarray, f: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (layers, ny, nx) sums and valid-day counts coarsened by f x f blocks
+    (edges padded). Returns (per-cell means averaged over the block's valid
+    cells, block valid-cell counts).
+    """
+    layers, ny, nx = sums.shape
+    py, px = -ny % f, -nx % f
+    mean = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+    valid = (counts > 0).astype(np.float64)
+    if py or px:
+        mean = np.pad(mean, ((0, 0), (0, py), (0, px)))
+        valid = np.pad(valid, ((0, 0), (0, py), (0, px)))
+    shape = (layers, (ny + py) // f, f, (nx + px) // f, f)
+    s = mean.reshape(shape).sum(axis=(2, 4))
+    n = valid.reshape(shape).sum(axis=(2, 4))
+    return np.where(n > 0, s / np.maximum(n, 1), np.nan), n
+
+def regular_step(coord: np.ndarray) -> float:
+    d = np.diff(coord)
+    if len(d) == 0 or not np.allclose(d, d[0], rtol=1e-4):
+        raise HTTPException(500, "map tiles need a regular lat/lon grid")
+    return float(d[0])
+
+def monthly_sums(key: str, variable: str, root: Optional[str] = None) -> Dict[str, Any]:
+    """Per-cell monthly sums and valid-day counts of one file inside INDIA_BBOX (°C)."""
+    with climate.BboxBlocks(key, variable, root) as src:
+        lat, lon = np.asarray(src.lat, dtype=np.float64), np.asarray(src.lon, dtype=np.float64)
+        cells = len(lat) * len(lon)
+        sums = np.zeros((12, cells))
+        counts = np.zeros((12, cells))
+        offset = 273.15 if src.kelvin else 0.0
+        start = 0
+        for block, _ in src:
+            months = src.months[start:start + len(block)]
+            start += len(block)
+            with stage("climate.tiles.reduce"):
+                valid = ~np.isnan(block)
+                vals = np.where(valid, block - offset, 0.0)
+                for m in np.unique(months):
+                    day = months == m
+                    sums[m - 1] += vals[day].sum(axis=0)
+                    counts[m - 1] += valid[day].sum(axis=0)
+    sums, counts = sums.reshape(12, len(lat), len(lon)), counts.reshape(12, len(lat), len(lon))
+    if len(lat) > 1 and lat[0] > lat[-1]:
+        lat, sums, counts = lat[::-1], sums[:, ::-1], counts[:, ::-1]
+    return {"lat": lat, "lon": lon, "sums": sums, "counts": counts}
+
+def pyramid_dir(variable: str, scenario: str, model: str, year: int) -> str:
+    key = climate.nex_key(variable, scenario, model, year)
+    raw = json.dumps([TILE_FORMAT, key, variable, climate.bbox_key(), TILE_MIN_CELLS])
+    return os.path.join(TILE_DIR, hashlib.sha1(raw.encode()).hexdigest()[:20])
+
+def build(variable: str, scenario: str, model: str, year: int, root: Optional[str] = None) -> str:
+    """Reduce one file into a pyramid on disk; returns its directory."""
+    t0 = time.perf_counter()
+    key = climate.nex_key(variable, scenario, model, year)
+    m = monthly_sums(key, variable, root)
+    lat, lon = m["lat"], m["lon"]
+    step_lat, step_lon = regular_step(lat), regular_step(lon)
+    # layer 0: annual mean over every valid day, then the 12 months
+    sums = np.concatenate([m["sums"].sum(axis=0, keepdims=True), m["sums"]])
+    counts = np.concatenate([m["counts"].sum(axis=0, keepdims=True), m["counts"]])
+
+    final = pyramid_dir(variable, scenario, model, year)
+    os.makedirs(TILE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".build-", dir=TILE_DIR)
+    levels = []
+    with stage("climate.tiles.pyramid"):
+        f, level = 1, 0
+        while True:
+            mean, _ = block_mean(sums, counts, f)
+            np.save(os.path.join(tmp, f"level{level}.npy"), quantize(mean))
+            levels.append({
+                "level": level, "ny": mean.shape[1], "nx": mean.shape[2],
+                # centre of the first block = its south-west cell's edge + half a block
+                "lat0": float(lat[0] - step_lat / 2 + f * step_lat / 2),
+                "lon0": float(lon[0] - step_lon / 2 + f * step_lon / 2),
+                "step_lat": step_lat * f, "step_lon": step_lon * f,
+            })
+            if max(mean.shape[1:]) <= TILE_MIN_CELLS:
+                break
+            f, level = f * 2, level + 1
+    meta = {"format": TILE_FORMAT, "key": key, "variable": variable, "scenario": scenario, "model": model,
+            "year": year, "units": "degC", "scale": SCALE, "nodata": NODATA, "levels": levels,
+            "days": int(m["counts"].max(axis=(1, 2)).sum()), "build_ms": round((time.perf_counter() - t0) * 1000, 1)}
+    with open(os.path.join(tmp, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+    try:
+        if os.path.isdir(final):
+            shutil.rmtree(final)
+        os.rename(tmp, final)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another worker finished the same pyramid first
+    _forget()
+    encoded.cache_clear()
+    return final
+
+class Pyramid:
+    """A built pyramid, levels memory-mapped."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json")) as fh:
+            self.meta = json.load(fh)
+        self.directory = directory
+        self.levels = self.meta["levels"]
+        self.arrays = [np.load(os.path.join(directory, f"level{l['level']}.npy"), mmap_mode="r") for l in self.levels]
+
+    def pick_level(self, bbox: Dict[str, float], width: int, height: int) -> int:
+        """Coarsest level whose cells are still no larger than one output pixel."""
+        px_lon = (bbox["lon_max"] - bbox["lon_min"]) / width
+        px_lat = (bbox["lat_max"] - bbox["lat_min"]) / height
+        level = 0
+        for l in self.levels:
+            if l["step_lon"] <= px_lon + 1e-9 and l["step_lat"] <= px_lat + 1e-9:
+                level = l["level"]
+        return level
+
+    def window(self, level: int, bbox: Dict[str, float]) -> Tuple[int, int, int, int]:
+        """(i0, i1, j0, j1) of the level's cells that overlap bbox."""
+        l = self.levels[level]
+        south, west = l["lat0"] - l["step_lat"] / 2, l["lon0"] - l["step_lon"] / 2
+        i0 = int(np.clip(np.floor((bbox["lat_min"] - south) / l["step_lat"]), 0, l["ny"]))
+        i1 = int(np.clip(np.ceil((bbox["lat_max"] - south) / l["step_lat"]), i0, l["ny"]))
+        j0 = int(np.clip(np.floor((bbox["lon_min"] - west) / l["step_lon"]), 0, l["nx"]))
+        j1 = int(np.clip(np.ceil((bbox["lon_max"] - west) / l["step_lon"]), j0, l["nx"]))
+        return i0, i1, j0, j1
+
+_opened: "OrderedDict[str, Pyramid]" = OrderedDict()  # open pyramids, least recently used first
+_opened_lock = threading.Lock()
+
+def _cached(directory: str) -> Optional[Pyramid]:
+    with _opened_lock:
+        p = _opened.get(directory)
+        if p is not None:
+            _opened.move_to_end(directory)
+        return p
+
+def _open(directory: str) -> Pyramid:
+    p = _cached(directory)
+    if p is None:
+        p = Pyramid(directory)
+        with _opened_lock:
+            _opened[directory] = p
+            while len(_opened) > PYRAMID_CACHE_ITEMS:
+                _opened.popitem(last=False)
+    return p
+
+def _forget() -> None:
+    with _opened_lock:
+        _opened.clear()
+
+def pyramid(variable: str, scenario: str, model: str, year: int) -> Tuple[Pyramid, str]:
+    """(pyramid, "memory" | "disk" | "built"); builds it on first use."""
+    directory = pyramid_dir(variable, scenario, model, year)
+    p = _cached(directory)
+    if p is not None:
+        return p, "memory"
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        return _open(directory), "disk"
+    with stage("climate.tiles.build"):
+        build(variable, scenario, model, year)
+    return _open(directory), "built"
+
+def parse_bbox(param: Optional[str]) -> Dict[str, float]:
+    """'lon_min,lat_min,lon_max,lat_max' (default INDIA_BBOX), clipped to INDIA_BBOX."""
+    full = climate.INDIA_BBOX
+    if not param:
+        return dict(full)
+    try:
+        lon_min, lat_min, lon_max, lat_max = (float(v) for v in param.split(","))
+    except ValueError:
+        raise HTTPException(400, "bbox must be 'lon_min,lat_min,lon_max,lat_max'")
+    bbox = {"lon_min": max(lon_min, full["lon_min"]), "lon_max": min(lon_max, full["lon_max"]),
+            "lat_min": max(lat_min, full["lat_min"]), "lat_max": min(lat_max, full["lat_max"])}
+    if bbox["lon_min"] >= bbox["lon_max"] or bbox["lat_min"] >= bbox["lat_max"]:
+        raise HTTPException(400, f"bbox must overlap India ({climate.bbox_key()})")
+    return bbox
+
+@functools.lru_cache(maxsize=TILE_RESPONSE_CACHE_ITEMS)
+def encoded(directory: str, level: int, layer: int, window: Tuple[int, int, int, int], fmt: str,
+            dtype: str) -> Tuple[payloads.Payload, Dict[str, Any]]:
+    """
+    (payload, header) of one window of one layer; repeated viewports are
+    served from here, along with their compressed variants.
+    """
+    p = _open(directory)
+    l = p.levels[level]
+    i0, i1, j0, j1 = window
+    q = np.ascontiguousarray(p.arrays[level][layer, i0:i1, j0:j1])
+    header = {
+        "variable": p.meta["variable"], "scenario": p.meta["scenario"], "model": p.meta["model"],
+        "year": p.meta["year"], "period": "annual" if layer == 0 else f"{p.meta['year']}-{layer:02d}",
+        "units": p.meta["units"], "level": level, "shape": [i1 - i0, j1 - j0],
+        "lat0": l["lat0"] + i0 * l["step_lat"], "lon0": l["lon0"] + j0 * l["step_lon"],
+        "step_lat": l["step_lat"], "step_lon": l["step_lon"],
+    }
+    if fmt == "json":
+        values = np.round(dequantize(q).astype(np.float64), 2)
+        rows = [[None if v != v else v for v in row] for row in values.tolist()]
+        body = json.dumps({**header, "values": rows}, separators=(",", ":")).encode()
+    else:
+        if dtype == "float16":
+            data = dequantize(q).astype("<f2")
+            header.update(dtype="float16")
+        else:
+            data = q.astype("<i2")
+            header.update(dtype="int16", scale=SCALE, nodata=NODATA)
+        head = json.dumps(header, separators=(",", ":")).encode()
+        body = MAGIC + struct.pack("<I", len(head)) + head + data.tobytes()
+    return payloads.Payload(body), header
+
+def decode(body: bytes) -> Tuple[Dict[str, Any], np.ndarray]:
+    """(header, °C float32 cells) of a binary payload (after any content coding is undone)."""
+    if body[:4] != MAGIC:
+        raise ValueError("not an ECT1 payload")
+    (n,) = struct.unpack("<I", body[4:8])
+    header = json.loads(body[8:8 + n])
+    data = np.frombuffer(body[8 + n:], dtype="<f2" if header["dtype"] == "float16" else "<i2")
+    data = data.reshape(header["shape"])
+    return header, dequantize(data) if header["dtype"] == "int16" else data.astype(np.float32)
+
+def payload(
+    p: Pyramid, month: Optional[int], bbox: Dict[str, float], width: int, height: int,
+    level: Optional[int] = None, fmt: str = "bin", dtype: str = "int16",
+) -> Tuple[payloads.Payload, Dict[str, Any]]:
+    """(payload, header) for one viewport of a pyramid (level picked from bbox and size unless given)."""
+    if level is None:
+        level = p.pick_level(bbox, width, height)
+    elif not 0 <= level < len(p.levels):
+        raise HTTPException(400, f"level must be 0-{len(p.levels) - 1}")
+    with stage("climate.tiles.encode"):
+        return encoded(p.directory, level, month or 0, p.window(level, bbox), fmt, dtype)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m climate_tiles")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="build map tile pyramids (rebuilds existing ones)")
+    b.add_argument("--variable", default="tasmax")
+    b.add_argument("--scenario", default="historical")
+    b.add_argument("--model", action="append", help="repeatable; default MIROC6")
+    b.add_argument("--year", type=int, action="append", required=True, help="repeatable")
+    a = ap.parse_args(argv)
+    for model in a.model or ["MIROC6"]:
+        for year in a.year:
+            try:
+                directory = build(a.variable, a.scenario, model, year)
+            except HTTPException as e:
+                print({"model": model, "year": year, "status": "error", "detail": e.detail})
+                continue
+            meta = _open(directory).meta
+            print({"model": model, "year": year, "status": "built", "ms": meta["build_ms"],
+                   "levels": [(l["ny"], l["nx"]) for l in meta["levels"]]})
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
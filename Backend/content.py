@@ -0,0 +1,226 @@
+# content.py
+# Localized static text (analysis tips, mission titles, fallback feedback and
+# the "busy" answers), translated offline into content_bundle.json and loaded
+# once at import into one immutable Table per language, so no request pays
+# for a translation.
+#
+#   content_source.json   the English strings by id and the languages to build:
+#     {"languages": {"hi": {"name": "Hindi", "native": "हिन्दी", "aliases": ["hin", "hindi"]}, ...},
+#      "strings": {"tip.walk_cycle": "Prefer walking/cycling for short trips", ...}}
+#   content_bundle.json   built from it; every translation carries the hash of
+#     the English text it was made from:
+#     {"version": ..., "languages": {"hi": {"name": ..., "strings":
+#       {"tip.walk_cycle": {"text": ..., "source": "<hash>", "by": "manual" | "llm" | "source"}}}}}
+#
+#   python -m content build [--lang hi,ta] [--dry-run]
+#
+# The build is incremental: a translation is kept while its source hash still
+# matches the English text, so editing one string re-translates that string
+# only (one model call per language that has anything to do). Translations
+# edited by hand in the bundle are kept the same way; ids no longer in the
+# source are dropped. A model translation that loses a {placeholder} is not
+# written. At runtime a string a language lacks is served in English.
+#
+# Lookups are O(1): negotiate() / ALIASES map a language tag to a code and
+# table(code) is a dict lookup.
+
+import os, sys, json, string, hashlib, argparse, functools
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional, Any, Callable, Dict, List, Mapping, Tuple
+
+SOURCE_FILE = os.getenv("CONTENT_SOURCE_FILE", os.path.join(os.path.dirname(__file__), "content_source.json"))
+BUNDLE_FILE = os.getenv("CONTENT_BUNDLE_FILE", os.path.join(os.path.dirname(__file__), "content_bundle.json"))
+BUILD_MODEL = os.getenv("CONTENT_BUILD_MODEL", "gpt-4o-mini")
+
+SOURCE_LANG = "en"
+
+@dataclass(frozen=True)
+class Table:
+    code: str
+    name: str          # English name, for model prompts ("Write in Tamil")
+    native: str
+    strings: Mapping[str, str]
+    tips: Tuple[str, ...]
+    missing: int       # strings served in English
+
+    def text(self, key: str, **fields: Any) -> str:
+        s = self.strings[key]
+        return s.format(**fields) if fields else s
+
+def source_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+def placeholders(text: str) -> frozenset:
+    return frozenset(name for _, name, _, _ in string.Formatter().parse(text) if name)
+
+def read_source(path: str = SOURCE_FILE) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        source = json.load(f)
+    if SOURCE_LANG not in source["languages"]:
+        raise ValueError(f"{path}: the source language '{SOURCE_LANG}' must be listed")
+    return source
+
+def _tables(bundle: Dict[str, Any], english: Dict[str, str]) -> Dict[str, Table]:
+    tables = {}
+    for code, lang in bundle["languages"].items():
+        have = {k: e["text"] for k, e in lang.get("strings", {}).items() if k in english}
+        strings = {k: have.get(k, v) for k, v in english.items()}
+        tables[code] = Table(
+            code=code,
+            name=lang["name"],
+            native=lang.get("native", lang["name"]),
+            strings=MappingProxyType(strings),
+            tips=tuple(v for k, v in strings.items() if k.startswith("tip.")),
+            missing=len(english) - len(have),
+        )
+    return tables
+
+def load(path: str = BUNDLE_FILE) -> Tuple[Dict[str, Table], Dict[str, Any]]:
+    """Tables by language code and the bundle's languages; English-only tables from the source if the bundle is unusable."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            bundle = json.load(f)
+        english = {k: e["text"] for k, e in bundle["languages"][SOURCE_LANG]["strings"].items()}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"[content] loading {path} failed, serving English only: {e}")
+        source = read_source()
+        bundle = {"version": "source", "languages": {c: {**l, "strings": {}} for c, l in source["languages"].items()}}
+        english = source["strings"]
+    return _tables(bundle, english), bundle
+
+TABLES, _bundle = load()
+VERSION: str = _bundle.get("version", "")
+SUPPORTED = frozenset(TABLES)
+
+# language tag (lowercased primary subtag, ISO 639-2 code or English name) -> code
+ALIASES: Dict[str, str] = {}
+for _code, _lang in _bundle["languages"].items():
+    ALIASES.update({a.lower(): _code for a in _lang.get("aliases", [])})
+    ALIASES[_code] = _code
+del _bundle
+
+def table(lang: str) -> Table:
+    return TABLES.get(lang) or TABLES[SOURCE_LANG]
+
+@functools.lru_cache(maxsize=4096)
+def negotiate(accept_language: str) -> Optional[str]:
+    """Best supported language of an Accept-Language header (q-values honoured), None if it names none."""
+    best, best_q = None, 0.0
+    for part in accept_language.split(","):
+        tag, _, params = part.partition(";")
+        code = ALIASES.get(tag.strip().lower().split("-")[0])
+        if code is None:
+            continue
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > best_q:
+            best, best_q = code, q
+    return best
+
+def stats() -> Dict[str, Any]:
+    return {
+        "version": VERSION,
+        "languages": {c: {"name": t.name, "native": t.native, "strings": len(t.strings), "missing": t.missing}
+                      for c, t in TABLES.items()},
+    }
+
+# ---------- Build ----------
+def translate_llm(lang: Dict[str, Any], strings: Dict[str, str]) -> Dict[str, str]:
+    """One model call per language: {id: English} -> {id: translation}."""
+    from openai import OpenAI
+    system = (
+        f"You translate UI strings of EcoLearn+ India, a climate app for Indian students, from English "
+        f"to {lang['name']} ({lang.get('native', lang['name'])} script). Respond ONLY in JSON: the same "
+        f"keys with translated values. Keep every {{placeholder}} exactly as written, keep numbers, "
+        f"units and 'AC'/'CO2e' as they are, and keep each string short and friendly."
+    )
+    resp = OpenAI().chat.completions.create(
+        model=BUILD_MODEL,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": json.dumps(strings, ensure_ascii=False)},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.2,
+    )
+    return json.loads(resp.choices[0].message.content or "{}")
+
+def build(
+    source_path: str = SOURCE_FILE,
+    bundle_path: str = BUNDLE_FILE,
+    langs: Optional[List[str]] = None,
+    translate: Callable[[Dict[str, Any], Dict[str, str]], Dict[str, str]] = translate_llm,
+    dry_run: bool = False,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Bring the bundle up to date with the source; returns per-language counts
+    of strings kept, translated, rejected (placeholders changed or left out
+    by the model) and dropped. Only `langs` are translated (default: all).
+    """
+    source = read_source(source_path)
+    english: Dict[str, str] = source["strings"]
+    try:
+        with open(bundle_path, encoding="utf-8") as f:
+            old = json.load(f)["languages"]
+    except FileNotFoundError:
+        old = {}
+    hashes = {k: source_hash(v) for k, v in english.items()}
+
+    languages, report = {}, {}
+    for code, meta in source["languages"].items():
+        prev = old.get(code, {}).get("strings", {})
+        if code == SOURCE_LANG:
+            strings = {k: {"text": v, "source": hashes[k], "by": "source"} for k, v in english.items()}
+            languages[code] = {**meta, "strings": strings}
+            continue
+        strings = {k: e for k, e in prev.items() if k in english and e.get("source") == hashes[k]}
+        todo = {k: v for k, v in english.items() if k not in strings}
+        counts = {"kept": len(strings), "translated": 0, "rejected": 0, "dropped": len(set(prev) - set(english))}
+        if todo and (langs is None or code in langs) and not dry_run:
+            try:
+                got = translate(meta, todo)
+            except Exception as e:
+                print(f"[content] translating {len(todo)} strings to {code} failed: {e}")
+                got = {}
+            for k, v in todo.items():
+                t = got.get(k)
+                if isinstance(t, str) and t.strip() and placeholders(t) == placeholders(v):
+                    strings[k] = {"text": t.strip(), "source": hashes[k], "by": "llm"}
+                    counts["translated"] += 1
+                else:
+                    counts["rejected"] += 1
+        counts["missing"] = len(english) - len(strings)
+        languages[code] = {**meta, "strings": {k: strings[k] for k in english if k in strings}}
+        report[code] = counts
+
+    body = json.dumps(languages, ensure_ascii=False, sort_keys=True)
+    bundle = {"version": hashlib.sha1(body.encode("utf-8")).hexdigest()[:12], "languages": languages}
+    if not dry_run:
+        tmp = bundle_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(bundle, f, ensure_ascii=False, indent=1)
+            f.write("\n")
+        os.replace(tmp, bundle_path)
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m content")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="translate new and changed strings into the bundle")
+    b.add_argument("--lang", help="comma-separated codes to translate (default: all)")
+    b.add_argument("--dry-run", action="store_true", help="report what would be translated, write nothing")
+    a = p.parse_args(argv)
+    report = build(langs=a.lang.split(",") if a.lang else None, dry_run=a.dry_run)
+    for code, c in report.items():
+        print(f"{code}: kept {c['kept']}  translated {c['translated']}  rejected {c['rejected']}  "
+              f"dropped {c['dropped']}  missing {c['missing']}")
+    return 0 if all(c["missing"] == 0 for c in report.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# emission_factors.py
+# Versioned, region-aware emission factor tables, reloaded from a JSON file
+# without a restart.
+#
+#   {"version": "2024.1", "default_region": "IN",
+#    "periods": {
+#      "2023-04-01": {"IN":    {"transport": {"petrol_car": 0.24, ...}, "meat_meal": 2.5, ...},
+#                     "IN-MH": {"electricity_kwh": 0.79}}}}
+#
+# Each period (keyed by the date it takes effect) must give every category
+# for the default region; other regions only list what differs and inherit
+# the rest from the default region of the same period. A transport mode the
+# default region of a period doesn't list takes its factor from the nearest
+# earlier period (or the first later one), so a new mode only has to be added
+# to the latest period. A table is resolved
+# once into one tuple of floats per (period, region), so analyze_payload
+# does a couple of dict/list lookups instead of an if-chain.
+#
+# Tables are immutable. reload() builds a new one and replaces the module
+# reference in a single assignment; readers call current() once and use
+# that snapshot for the whole computation, so the hot path takes no lock
+# and never sees half of an update. watch() polls the file (each worker
+# polls its own copy of the table) and advances "today's" period.
+
+import os, json, time, asyncio, hashlib, threading, datetime as dt
+from bisect import bisect_right
+from typing import Optional, Any, Dict, List, Tuple
+
+from local_days import local_day
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+FACTORS_FILE = os.getenv("EMISSION_FACTORS_FILE", os.path.join(os.path.dirname(__file__), "emission_factors.json"))
+RELOAD_INTERVAL_S = float(os.getenv("EF_RELOAD_INTERVAL_S", "5"))
+
+# Non-transport categories, in row order; transport mode factors follow them
+CATEGORIES = ("meat_meal", "veg_meal", "electricity_kwh", "lpg_kg", "waste_kg")
+MODE_OFFSET = len(CATEGORIES)
+
+# Used when the file is missing or invalid at startup (same values as the shipped file)
+BUILTIN: Dict[str, Any] = {
+    "version": "builtin",
+    "default_region": "IN",
+    "periods": {
+        "1970-01-01": {
+            "IN": {
+                # kg CO2e per km
+                "transport": {"petrol_car": 0.24, "bus": 0.05, "walk_cycle": 0.0, "electric_car": 0.05},
+                # kg CO2e per serving / kWh / kg
+                "meat_meal": 2.5,
+                "veg_meal": 0.5,
+                "electricity_kwh": 0.82,
+                "lpg_kg": 2.98,
+                "waste_kg": 1.90,
+            },
+        },
+    },
+}
+
+# Deployment overrides for the default region (all periods), kept from when
+# these were the only knobs; a table with overrides reports version "<v>+env"
+ENV_OVERRIDES = {c: float(os.environ[f"EF_{c.upper()}"])
+                 for c in ("electricity_kwh", "lpg_kg", "waste_kg") if os.getenv(f"EF_{c.upper()}")}
+
+_EPOCH = dt.date(1970, 1, 1)
+
+class FactorTable:
+    """One resolved, read-only factor table."""
+
+    def __init__(self, data: Dict[str, Any], source: str = "builtin", digest: str = ""):
+        if not isinstance(data.get("periods"), dict) or not data["periods"]:
+            raise ValueError("'periods' must be a non-empty object")
+        default = str(data.get("default_region") or "IN").upper()
+        periods = sorted(((dt.date.fromisoformat(k) - _EPOCH).days, k, {r.upper(): v or {} for r, v in t.items()})
+                         for k, t in data["periods"].items())
+
+        regions: List[str] = [default]
+        modes: List[str] = []
+        for _, name, table in periods:
+            if default not in table:
+                raise ValueError(f"period {name}: missing default region {default}")
+            modes += [m for m in (table[default].get("transport") or {}) if m not in modes]
+            for region, values in table.items():
+                if region not in regions:
+                    regions.append(region)
+        for _, name, table in periods:
+            for region, values in table.items():
+                extra = set(values.get("transport") or {}) - set(modes)
+                if extra:
+                    raise ValueError(f"period {name}: {region} has modes {sorted(extra)} missing from {default}")
+
+        self.version = str(data.get("version") or digest[:12] or "unversioned") + ("+env" if ENV_OVERRIDES else "")
+        self.source = source
+        self.digest = digest
+        self.loaded_at = time.time()
+        self.default_region = default
+        self.regions: Tuple[str, ...] = tuple(regions)
+        self.region_index = {r: i for i, r in enumerate(regions)}
+        # mode None ("not given") is the last column and always 0
+        self.modes: Tuple[str, ...] = tuple(modes)
+        self.mode_column: Dict[Optional[str], int] = {m: MODE_OFFSET + i for i, m in enumerate(modes)}
+        self.mode_column[None] = MODE_OFFSET + len(modes)
+        self.period_starts = [start for start, _, _ in periods]
+        self.period_names = [name for _, name, _ in periods]
+        # rows[period][region] -> (category factors..., mode factors..., 0.0)
+        self.rows: List[List[Tuple[float, ...]]] = []
+        carried: Dict[str, float] = {}
+        for m in modes:  # for modes introduced after the first period
+            carried[m] = next(t[default]["transport"][m] for _, _, t in periods if m in (t[default].get("transport") or {}))
+        for _, name, table in periods:
+            carried.update((table[default] or {}).get("transport") or {})
+            self.rows.append(self._resolve(name, table, dict(carried)))
+        self._matrices: Dict[int, Any] = {}
+        # index of the period in effect today; re-evaluated by refresh_today()
+        # (each watch() tick) so the hot path doesn't read the clock
+        self.today = 0
+        self.refresh_today()
+
+    def _resolve(self, period: str, table: Dict[str, Any], base_modes: Dict[str, float]) -> List[Tuple[float, ...]]:
+        # the default region's values after EF_* overrides; other regions inherit these
+        base = {**table[self.default_region], **ENV_OVERRIDES}
+        out = []
+        for region in self.regions:
+            own = base if region == self.default_region else table.get(region, {})
+            row = []
+            for c in CATEGORIES:
+                value = own.get(c, base.get(c))
+                if value is None:
+                    raise ValueError(f"period {period}: {self.default_region} has no '{c}' factor")
+                row.append(float(value))
+            own_modes = own.get("transport") or {}
+            for m in self.modes:
+                row.append(float(own_modes.get(m, base_modes[m])))
+            row.append(0.0)
+            if any(v < 0 for v in row):
+                raise ValueError(f"period {period}: negative factor for {region}")
+            out.append(tuple(row))
+        return out
+
+    def period_at(self, day: Optional[int] = None) -> int:
+        """Index of the period in effect on local `day` (default today); the first one before it starts."""
+        if day is None:
+            return self.today
+        return max(0, bisect_right(self.period_starts, day) - 1)
+
+    def refresh_today(self) -> None:
+        self.today = max(0, bisect_right(self.period_starts, local_day(time.time())) - 1)
+
+    def row(self, region: Optional[str] = None, day: Optional[int] = None) -> Tuple[float, ...]:
+        """Factor row for a region (default region if None or unknown) on `day`."""
+        return self.rows[self.today if day is None else self.period_at(day)][self.region_index.get(region, 0) if region else 0]
+
+    def matrix(self, period: int) -> "np.ndarray":
+        """rows[period] as a (regions, columns) float64 array, for analyze_batch."""
+        m = self._matrices.get(period)
+        if m is None:
+            m = self._matrices[period] = np.array(self.rows[period], dtype=np.float64)
+        return m
+
+    def normalize_region(self, region: Optional[str]) -> Optional[str]:
+        """Region code as stored ("mh" -> "IN-MH"); raises ValueError for unknown regions."""
+        if region is None:
+            return None
+        r = region.strip().upper()
+        if r in self.region_index:
+            return r
+        prefixed = f"{self.default_region}-{r}"
+        if prefixed in self.region_index:
+            return prefixed
+        raise ValueError(f"unknown region '{region}'; table {self.version} has {list(self.regions)}")
+
+    def check_mode(self, mode: Optional[str]) -> Optional[str]:
+        if mode is not None and mode not in self.mode_column:
+            raise ValueError(f"unknown mode '{mode}'; table {self.version} has {list(self.modes)}")
+        return mode
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "digest": self.digest,
+            "loaded_at": round(self.loaded_at, 3),
+            "default_region": self.default_region,
+            "regions": list(self.regions),
+            "modes": list(self.modes),
+            "categories": list(CATEGORIES),
+            "periods": self.period_names,
+            "current_period": self.period_names[self.period_at()],
+            "env_overrides": ENV_OVERRIDES,
+        }
+
+def load(path: str) -> FactorTable:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return FactorTable(json.loads(raw), source=path, digest=hashlib.sha256(raw).hexdigest())
+
+_current = FactorTable(BUILTIN)
+_reload_lock = threading.Lock()  # serializes reloads only; readers never take it
+_last_stat: Optional[Tuple[int, int]] = None
+_status: Dict[str, Any] = {"reloads": 0, "errors": 0, "last_error": None}
+
+def current() -> FactorTable:
+    return _current
+
+def reload(path: Optional[str] = None, force: bool = False) -> bool:
+    """
+    Load `path` (default FACTORS_FILE) if it changed since the last attempt
+    and swap it in. A missing or invalid file keeps the current table.
+    Returns True when a new table was installed.
+    """
+    global _current, _last_stat
+    path = path or FACTORS_FILE
+    with _reload_lock:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if stat_key == _last_stat and not force:
+            return False
+        _last_stat = stat_key  # a broken file is retried once it changes again
+        try:
+            table = load(path)
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            _status["errors"] += 1
+            _status["last_error"] = f"{path}: {e}"
+            print(f"[factors] reload of {path} failed, keeping {_current.version}: {e}")
+            return False
+        if table.digest == _current.digest and not force:
+            return False
+        _current = table
+        _status["reloads"] += 1
+        print(f"[factors] loaded {table.version} from {path} "
+              f"({len(table.regions)} regions, {len(table.period_names)} periods)")
+        return True
+
+def status() -> Dict[str, Any]:
+    return {**_current.describe(), **_status}
+
+async def watch(interval: float = RELOAD_INTERVAL_S, path: Optional[str] = None) -> None:
+    """
+    Poll the factor file every `interval` seconds (run as a background task)
+    and move the current table to a new period once its start day arrives.
+    interval <= 0 turns file polling off; the period is then checked hourly.
+    """
+    poll = interval > 0
+    while True:
+        await asyncio.sleep(interval if poll else 3600)
+        _current.refresh_today()
+        if not poll:
+            continue
+        try:
+            await asyncio.to_thread(reload, path)
+        except Exception as e:
+            print(f"[factors] watch failed: {e}")
+
+# load the file at import, so the app, CLIs and benchmarks all start from it
+reload()
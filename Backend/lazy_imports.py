@@ -0,0 +1,67 @@
+# lazy_imports.py
+# Deferred imports for heavy dependencies (numpy, xarray, s3fs, the climate
+# modules). `np = lazy_import("numpy")` returns a stand-in module; the real
+# import happens on the first attribute access, so workers boot without the
+# climate stack and only routes that need it pay for it.
+#
+# STARTUP_PROFILE=1 prints every deferred import with its duration as it
+# happens; load_times() returns the same numbers.
+
+import os, sys, time, types, importlib, threading
+from typing import Dict, Any
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+
+_LOAD_TIMES: Dict[str, float] = {}
+_lock = threading.Lock()
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports `name` on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    name = self.__name__
+                    already = name in sys.modules
+                    t0 = time.perf_counter()
+                    module = importlib.import_module(name)
+                    if not already:
+                        ms = round((time.perf_counter() - t0) * 1000, 1)
+                        _LOAD_TIMES[name] = ms
+                        if STARTUP_PROFILE:
+                            print(f"[startup] deferred import {name}: {ms} ms")
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name: str) -> types.ModuleType:
+    """The module itself if already imported, otherwise a LazyModule for it."""
+    return sys.modules.get(name) or LazyModule(name)
+
+def is_loaded(module: types.ModuleType) -> bool:
+    return not isinstance(module, LazyModule) or module.__dict__["_module"] is not None
+
+def preload(*modules: types.ModuleType) -> None:
+    """Force the real import of lazy modules (e.g. before forking workers)."""
+    for m in modules:
+        if isinstance(m, LazyModule):
+            m._load()
+
+def load_times() -> Dict[str, float]:
+    """{module: ms} for every deferred import performed so far."""
+    return dict(_LOAD_TIMES)
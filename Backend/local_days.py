@@ -0,0 +1,50 @@
+# local_days.py
+# Local calendar days, shared by the activity and points ledgers and the
+# emission factor periods. A day is a day number since 1970-01-01 in
+# LEDGER_TZ_OFFSET_MIN local time (default IST); a bucket groups days by
+# day / week (starting Monday) / month.
+
+import os, datetime as dt
+from typing import Any
+
+TZ_OFFSET_S = int(os.getenv("LEDGER_TZ_OFFSET_MIN", "330")) * 60
+_EPOCH = dt.date(1970, 1, 1)
+
+def local_day(ts: float) -> int:
+    """Days since 1970-01-01 in the ledger's local time."""
+    return int((ts + TZ_OFFSET_S) // 86400)
+
+def parse_ts(value: Any) -> float:
+    """Unix seconds from a number or an ISO 8601 date/datetime (naive = ledger-local time)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    t = dt.datetime.fromisoformat(str(value))
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=dt.timezone(dt.timedelta(seconds=TZ_OFFSET_S)))
+    return t.timestamp()
+
+def bucket_of(day: int, grain: str) -> int:
+    """Bucket id for a local day: the day itself, the Monday of its week, or year*12+month0."""
+    if grain == "day":
+        return day
+    if grain == "week":
+        return day - (day + 3) % 7  # 1970-01-01 was a Thursday
+    d = _EPOCH + dt.timedelta(days=day)
+    return d.year * 12 + d.month - 1
+
+def bucket_start(bucket: int, grain: str) -> dt.date:
+    if grain == "month":
+        return dt.date(bucket // 12, bucket % 12 + 1, 1)
+    return _EPOCH + dt.timedelta(days=bucket)
+
+def first_day(bucket: int, grain: str) -> int:
+    """Local day number of a bucket's first day."""
+    return (bucket_start(bucket, grain) - _EPOCH).days
+
+def bucket_days(bucket: int, grain: str) -> int:
+    """Calendar days in a bucket."""
+    if grain == "day":
+        return 1
+    if grain == "week":
+        return 7
+    return first_day(bucket + 1, grain) - first_day(bucket, grain)
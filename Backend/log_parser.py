@@ -0,0 +1,180 @@
+# log_parser.py
+# Rule-based extractor for short daily logs (English + Hindi).
+#
+# parse_activity() splits a log into clauses and pulls AnalyzeInput fields
+# (transport mode + km, veg/meat meals, kWh, LPG kg, waste kg, period) out of
+# each one with regexes. confidence is the share of meaningful clauses that
+# produced a field, reduced when the log is ambiguous (several transport modes,
+# a mode without distance, ...). /logs/analyze uses these factors directly when
+# confidence is high enough and only asks the LLM otherwise.
+
+import os, re, unicodedata
+from typing import Dict, Any, List, Optional, Tuple
+
+NUM = r"(\d+(?:\.\d+)?)"
+
+_DEVANAGARI_DIGITS = str.maketrans("०१२३४५६७८९", "0123456789")
+_NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5", "six": "6",
+    "seven": "7", "eight": "8", "nine": "9", "ten": "10", "twelve": "12", "twenty": "20",
+    "एक": "1", "दो": "2", "तीन": "3", "चार": "4", "पांच": "5", "पाँच": "5",
+    "छह": "6", "छः": "6", "सात": "7", "आठ": "8", "नौ": "9", "दस": "10", "बीस": "20",
+}
+_NUMBER_WORD_RE = re.compile(r"(?<![^\W\d_])(?<![\u0900-\u0963])(" + "|".join(sorted(_NUMBER_WORDS, key=len, reverse=True)) + r")(?=\s|$|[,.;।])")
+
+# "." only splits when it isn't a decimal point
+_CLAUSE_SPLIT = re.compile(r"[,;।\n]+|\.(?!\d)|\s+(?:and|then|also|plus)\s+|\s+(?:और|फिर|तथा|व)\s+")
+
+# transport keyword -> AnalyzeInput.mode (checked in order: electric before car)
+MODE_KEYWORDS: List[Tuple[str, List[str]]] = [
+    ("electric_car", [r"\bev\b", r"\belectric (?:car|vehicle)\b", "इलेक्ट्रिक कार"]),
+    ("bus", [r"\bbus(?:es)?\b", r"\bmetro\b", r"\btrain\b", r"\bpublic transport\b",
+             "बस", "मेट्रो", "ट्रेन", "लोकल"]),
+    ("walk_cycle", [r"\bwalk(?:ed|ing|s)?\b", r"\bcycl(?:e|ed|ing)\b", r"\bbicycle\b", r"\bon foot\b",
+                    "पैदल", "साइकिल", "साइकल", "टहल"]),
+    ("petrol_car", [r"\bcar\b", r"\bdr(?:ove|ive|iving|iven)\b", r"\btaxi\b", r"\bcab\b", r"\buber\b",
+                    r"\bola\b", r"\bpetrol\b", "कार", "गाड़ी", "गाडी", "टैक्सी"]),
+]
+_MODE_RES = [(mode, [re.compile(p) for p in pats]) for mode, pats in MODE_KEYWORDS]
+
+_KM_RE = re.compile(NUM + r"\s*(?:km|kms|kilomet(?:er|re)s?|किमी|किलोमीटर|कि\.मी\.?)")
+_KWH_RE = re.compile(NUM + r"\s*(?:kwh|kw h|units?|यूनिट|किलोवाट)")
+_KG_RE = re.compile(NUM + r"\s*(?:kg|kgs|kilos?|kilograms?|किलो|किग्रा)")
+# a count right before a meal keyword, allowing up to two words in between ("2 plates of")
+_COUNT_BEFORE_RE = re.compile(NUM + r"\s*(?:[^\d\s]+\s+){0,2}$")
+
+LPG_WORDS = re.compile(r"\blpg\b|\bgas\b|\bcylinder\b|\bcooking gas\b|एलपीजी|गैस|सिलेंडर")
+WASTE_WORDS = re.compile(r"\bwaste\b|\bgarbage\b|\btrash\b|\brubbish\b|कचरा|कूड़ा|कूडा")
+ELEC_WORDS = re.compile(r"\belectricity\b|\bpower\b|\bac\b|बिजली")
+VEG_WORDS = re.compile(r"\bveg(?:gie|etarian)?\b|\bvegan\b|\bdal\b|\bsabzi\b|शाकाहारी|वेज|दाल|सब्ज़ी|सब्जी")
+MEAT_WORDS = re.compile(r"\bnon[- ]?veg\b|\bmeat\b|\bchicken\b|\bmutton\b|\bfish\b|\bbeef\b|\bpork\b|\bbiryani\b|"
+                        r"मांसाहारी|नॉन[- ]?वेज|मांस|चिकन|मटन|मछली")
+MEAL_WORDS = re.compile(r"\bmeals?\b|\blunch\b|\bdinner\b|\bbreakfast\b|\bthali\b|खाना|भोजन|थाली|लंच|डिनर|नाश्ता")
+WEEK_WORDS = re.compile(r"\bthis week\b|\bweekly\b|\bper week\b|इस हफ्ते|इस सप्ताह|हफ्ते भर")
+MONTH_WORDS = re.compile(r"\bthis month\b|\bmonthly\b|इस महीने")
+
+# clauses made only of these words carry no activity information
+FILLER = {
+    "today", "i", "me", "my", "was", "it", "the", "a", "an", "day", "good", "nice", "normal", "usual",
+    "as", "yesterday", "morning", "evening", "night", "also", "then", "so", "very", "just", "ok",
+    "आज", "मैंने", "मैं", "था", "थी", "दिन", "अच्छा", "सामान्य", "कल", "सुबह", "शाम", "रात", "भी", "है",
+}
+# a word: letters plus Devanagari vowel signs and virama, which \w doesn't match
+# (without them "था" or "मैंने" would split into fragments)
+WORD_RE = re.compile(r"(?:[^\W\d_]|[\u0900-\u0963])+")
+
+# Minimum confidence for /logs/analyze to skip the LLM
+MIN_CONFIDENCE = float(os.getenv("LOG_PARSER_MIN_CONFIDENCE", "0.9"))
+
+def normalize(text: str) -> str:
+    t = unicodedata.normalize("NFKC", text).lower().translate(_DEVANAGARI_DIGITS)
+    return _NUMBER_WORD_RE.sub(lambda m: _NUMBER_WORDS[m.group(1)], t)
+
+def _meal_count(clause: str, words: "re.Pattern[str]") -> Optional[int]:
+    m = words.search(clause)
+    if not m:
+        return None
+    # nearest number before the keyword, e.g. "ate 2 veg meals" / "2 बार शाकाहारी खाना"
+    before = _COUNT_BEFORE_RE.search(clause[:m.start()])
+    if before:
+        return int(float(before.group(1)))
+    after = re.match(r"\s*(?:meals?\s*)?[x×]?\s*" + NUM, clause[m.end():])
+    if after:
+        return int(float(after.group(1)))
+    return 1
+
+def _modes(clause: str) -> List[str]:
+    modes = [mode for mode, res in _MODE_RES if any(r.search(clause) for r in res)]
+    if "electric_car" in modes and "petrol_car" in modes:
+        modes.remove("petrol_car")  # "drove my EV"
+    return modes
+
+def parse_activity(text: str) -> Dict[str, Any]:
+    """
+    Returns {"factors": {...AnalyzeInput fields found...}, "confidence": 0..1,
+             "matched": [field, ...], "unmatched": [clause, ...]}.
+    """
+    t = normalize(text)
+    factors: Dict[str, Any] = {}
+    matched: List[str] = []
+    unmatched: List[str] = []
+    modes_seen: List[str] = []
+    elec_mentioned = False
+    covered = 0
+    penalty = 1.0
+
+    def add(field: str, value: Any) -> None:
+        factors[field] = factors.get(field, 0) + value if field != "mode" else value
+        if field not in matched:
+            matched.append(field)
+
+    for clause in (c.strip() for c in _CLAUSE_SPLIT.split(t)):
+        if not clause:
+            continue
+        hit = False
+
+        modes = _modes(clause)
+        km = [float(x) for x in _KM_RE.findall(clause)]
+        if modes:
+            modes_seen.extend(m for m in modes if m not in modes_seen)
+            add("mode", modes[0])
+            hit = True
+        if km:
+            add("distance_km", sum(km))
+            hit = True
+        if modes and not km or km and not modes:
+            penalty = min(penalty, 0.5)  # mode without distance (or the reverse)
+
+        kwh = _KWH_RE.findall(clause)
+        if kwh:
+            add("electricity_kwh", sum(float(x) for x in kwh))
+            hit = True
+        elif ELEC_WORDS.search(clause):
+            elec_mentioned = True  # fine if the kWh figure is in another clause
+            hit = True
+
+        kg = [float(x) for x in _KG_RE.findall(clause)]
+        if LPG_WORDS.search(clause):
+            if kg:
+                add("lpg_kg", sum(kg))
+            else:
+                penalty = min(penalty, 0.5)
+            hit = True
+        elif WASTE_WORDS.search(clause):
+            if kg:
+                add("waste_kg", sum(kg))
+            else:
+                penalty = min(penalty, 0.5)
+            hit = True
+
+        meat = _meal_count(clause, MEAT_WORDS)
+        if meat is not None:
+            add("meat_meals", meat)
+            hit = True
+        else:
+            veg = _meal_count(clause, VEG_WORDS)
+            if veg is not None:
+                add("veg_meals", veg)
+                hit = True
+            elif MEAL_WORDS.search(clause):
+                penalty = min(penalty, 0.5)  # a meal, but veg or not is unknown
+
+        if WEEK_WORDS.search(clause):
+            factors["period"] = "week"
+            hit = True
+        elif MONTH_WORDS.search(clause):
+            factors["period"] = "month"
+            hit = True
+
+        if hit:
+            covered += 1
+        elif any(w not in FILLER for w in WORD_RE.findall(clause)):
+            unmatched.append(clause)
+
+    if elec_mentioned and "electricity_kwh" not in factors:
+        penalty = min(penalty, 0.5)
+    if len(modes_seen) > 1:
+        penalty = min(penalty, 0.5)  # AnalyzeInput holds one mode
+    total = covered + len(unmatched)
+    confidence = round(penalty * covered / total, 3) if total else 0.0
+    return {"factors": factors, "confidence": confidence, "matched": matched, "unmatched": unmatched}
@@ -0,0 +1,192 @@
+# metrics.py
+# Minimal Prometheus text-format metrics (no client library) plus per-request
+# stage timings.
+#
+#   counter("eco_llm_calls_total", "...", ("site",)).inc(site="chat")
+#   with stage("climate.open"): ...     # histogram + request breakdown
+#
+# Values are per process; with several uvicorn workers scrape each one (or run
+# one worker per container). MetricsMiddleware times every request by route
+# template and, when asked (`X-Timing: 1` request header or
+# METRICS_TIMING_HEADER=1), returns the request's stage breakdown in a
+# standard `Server-Timing` header.
+
+import os, time, threading, contextlib, contextvars
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterator
+
+TIMING_HEADER_ALWAYS = os.getenv("METRICS_TIMING_HEADER", "0") == "1"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in items]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label values -> [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            acc = self._values.get(key)
+            if acc is None:
+                acc = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    acc[i] += 1
+                    break
+            else:
+                acc[len(self.buckets)] += 1
+            acc[-1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for key, acc in items:
+            cumulative = 0
+            for le, n in zip((*self.buckets, "+Inf"), acc[:-1]):
+                cumulative += n
+                le_label = 'le="%s"' % le
+                out.append(f"{self.name}_bucket{_labels(self.labels, key, le_label)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {acc[-1]}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return out
+
+# name -> metric, in registration order
+_registry: Dict[str, Any] = {}
+# callbacks returning [(name, kind, help, [(labels dict, value), ...]), ...] at scrape time
+_collectors: List[Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+
+def counter(name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+    return _registry.setdefault(name, Counter(name, help, labels))
+
+def histogram(name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _registry.setdefault(name, Histogram(name, help, labels, buckets))
+
+def collector(fn: Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]) -> Callable:
+    """Register a function that reports externally kept values (cache stats, ...) at scrape time."""
+    _collectors.append(fn)
+    return fn
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for m in list(_registry.values()):
+        lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}", *m.samples()]
+    for fn in _collectors:
+        try:
+            families = fn()
+        except Exception as e:
+            print(f"[metrics] collector {fn.__name__} failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_labels(names, tuple(labels[n] for n in names))} {value}")
+    return "\n".join(lines) + "\n"
+
+# ---------- Request stage timings ----------
+STAGE_SECONDS = histogram("eco_stage_seconds", "Time spent in named stages of request handling", ("stage",))
+
+# stage name -> seconds for the request being handled (None outside a request)
+_breakdown: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("breakdown", default=None)
+
+def record(name: str, seconds: float) -> None:
+    """Add a finished stage to the histogram and the current request's breakdown."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    bd = _breakdown.get()
+    if bd is not None:
+        bd[name] = bd.get(name, 0.0) + seconds
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+def server_timing(bd: Dict[str, float], total: float) -> str:
+    parts = [f"{name.replace(':', '.')};dur={s * 1000:.1f}" for name, s in bd.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+REQUEST_SECONDS = histogram("eco_http_request_seconds", "Request latency by route template (time to last byte)",
+                            ("method", "route", "status"))
+REQUESTS_IN_FLIGHT: Dict[str, int] = {"n": 0}
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (keeps streaming responses streaming). Observes
+    REQUEST_SECONDS when the last body chunk is sent, labelled by the
+    matched route template (e.g. /users/{user_id}/activity).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        t0 = time.perf_counter()
+        bd: Dict[str, float] = {}
+        token = _breakdown.set(bd)
+        want_header = TIMING_HEADER_ALWAYS or any(k == b"x-timing" and v not in (b"", b"0")
+                                                  for k, v in scope.get("headers", []))
+        status = {"code": 500}
+        REQUESTS_IN_FLIGHT["n"] += 1
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if want_header:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(bd, time.perf_counter() - t0).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(time.perf_counter() - t0, method=scope["method"],
+                                        route=getattr(route, "path", "unmatched"), status=str(status["code"]))
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT["n"] -= 1
+            _breakdown.reset(token)
+
+@collector
+def _in_flight():
+    return [("eco_http_requests_in_flight", "gauge", "Requests currently being handled", [({}, REQUESTS_IN_FLIGHT["n"])])]
@@ -0,0 +1,307 @@
+# nc_partial.py
+# Byte-range reads of NetCDF4/HDF5 files (kerchunk-style).
+#
+# build_index() walks the HDF5 metadata once and records, for every 3D data
+# variable, the byte offset/size of each stored chunk plus the filters and the
+# (small) lat/lon/time coordinates. The index is persisted as JSON next to the
+# other climate caches. PartialReader then fetches only the chunks that
+# intersect the requested (time, lat, lon) window, through a shared block
+# cache, and decodes them with numpy/zlib. Anything the decoder doesn't
+# understand raises UnsupportedLayout so callers can fall back to a full read.
+
+import os, json, zlib, hashlib, threading
+from collections import OrderedDict
+from itertools import product
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+import xarray as xr
+
+NEX_INDEX_DIR = os.getenv("NEX_INDEX_DIR", os.path.join(os.path.dirname(__file__), ".cache", "nex-index"))
+BLOCK_SIZE = int(os.getenv("NEX_BLOCK_SIZE", str(256 * 1024)))
+BLOCK_CACHE_MAX_BYTES = int(os.getenv("NEX_BLOCK_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+INDEX_VERSION = 1
+# HDF5 filter ids we can decode
+H5Z_DEFLATE, H5Z_SHUFFLE, H5Z_FLETCHER32 = 1, 2, 3
+
+class UnsupportedLayout(Exception):
+    """File uses a storage layout/filter the partial reader can't decode."""
+
+# ---------- Metrics ----------
+_stats_lock = threading.Lock()
+READ_STATS = {"files": 0, "chunks": 0, "bytes_read": 0, "file_bytes": 0, "index_builds": 0, "index_hits": 0}
+
+def _bump(**kw: int) -> None:
+    with _stats_lock:
+        for k, v in kw.items():
+            READ_STATS[k] += v
+
+def read_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out: Dict[str, Any] = dict(READ_STATS)
+    out["read_ratio"] = round(out["bytes_read"] / out["file_bytes"], 4) if out["file_bytes"] else 0.0
+    out["block_cache"] = block_cache.stats()
+    return out
+
+# ---------- Block cache ----------
+class BlockCache:
+    """
+    LRU of fixed-size, aligned byte blocks keyed by (path, block number).
+    Missing runs of blocks are fetched with one ranged read each.
+    """
+    def __init__(self, block_size: int = BLOCK_SIZE, max_bytes: int = BLOCK_CACHE_MAX_BYTES):
+        self.block_size = block_size
+        self.max_blocks = max(1, max_bytes // block_size)
+        self._blocks: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, fs, path: str, start: int, end: int) -> Tuple[bytes, int]:
+        """Bytes [start, end) of path and how many bytes were fetched from storage."""
+        bs = self.block_size
+        first, last = start // bs, (end - 1) // bs
+        blocks: Dict[int, bytes] = {}
+        missing: List[int] = []
+        with self._lock:
+            for b in range(first, last + 1):
+                data = self._blocks.get((path, b))
+                if data is None:
+                    missing.append(b)
+                else:
+                    self._blocks.move_to_end((path, b))
+                    blocks[b] = data
+            self.hits += len(blocks)
+            self.misses += len(missing)
+
+        fetched = 0
+        for run in _runs(missing):
+            data = fs.cat_file(path, start=run[0] * bs, end=(run[-1] + 1) * bs)
+            fetched += len(data)
+            for i, b in enumerate(run):
+                blocks[b] = data[i * bs:(i + 1) * bs]
+
+        if missing:
+            with self._lock:
+                for b in missing:
+                    self._blocks[(path, b)] = blocks[b]
+                while len(self._blocks) > self.max_blocks:
+                    self._blocks.popitem(last=False)
+
+        buf = b"".join(blocks[b] for b in range(first, last + 1))
+        off = start - first * bs
+        return buf[off:off + (end - start)], fetched
+
+    def clear(self) -> None:
+        with self._lock:
+            self._blocks.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"blocks": len(self._blocks), "hits": self.hits, "misses": self.misses,
+                    "block_size": self.block_size}
+
+def _runs(sorted_ids: List[int]) -> List[List[int]]:
+    runs: List[List[int]] = []
+    for b in sorted_ids:
+        if runs and b == runs[-1][-1] + 1:
+            runs[-1].append(b)
+        else:
+            runs.append([b])
+    return runs
+
+block_cache = BlockCache()
+
+# ---------- Index ----------
+def _attr(v: Any) -> Any:
+    if isinstance(v, bytes):
+        return v.decode("utf-8", "replace")
+    if isinstance(v, np.ndarray):
+        return _attr(v.item()) if v.size == 1 else None
+    if isinstance(v, np.generic):
+        return v.item()
+    return v if isinstance(v, (str, int, float)) else None
+
+def build_index(fs, path: str) -> Dict[str, Any]:
+    """Chunk/byte-offset reference index for every 3D variable in a NetCDF4 file."""
+    import h5py
+
+    with fs.open(path, "rb") as fh, h5py.File(fh, "r") as f:
+        variables: Dict[str, Any] = {}
+        coords: Dict[str, Any] = {}
+        for name, dset in f.items():
+            if not isinstance(dset, h5py.Dataset):
+                continue
+            if dset.ndim == 1 and name in ("time", "lat", "lon", "latitude", "longitude"):
+                coords[name] = {
+                    "values": dset[()].astype("float64").tolist(),
+                    "attrs": {k: _attr(dset.attrs[k]) for k in ("units", "calendar") if k in dset.attrs},
+                }
+                continue
+            if dset.ndim != 3 or dset.chunks is None:
+                continue
+
+            dims = [dset.dims[i][0].name.lstrip("/") if len(dset.dims[i]) else f"dim{i}" for i in range(3)]
+            plist = dset.id.get_create_plist()
+            filters = [plist.get_filter(i)[0] for i in range(plist.get_nfilters())]
+            chunks = []
+            add = lambda info: chunks.append([*info.chunk_offset, info.byte_offset, info.size, info.filter_mask])
+            if hasattr(dset.id, "chunk_iter"):  # one B-tree walk (HDF5 >= 1.12.3)
+                dset.id.chunk_iter(add)
+            else:
+                for i in range(dset.id.get_num_chunks()):
+                    add(dset.id.get_chunk_info(i))
+
+            attrs = {k: _attr(dset.attrs[k]) for k in ("units", "scale_factor", "add_offset", "_FillValue", "missing_value")
+                     if k in dset.attrs}
+            variables[name] = {
+                "dims": dims,
+                "shape": list(dset.shape),
+                "chunk_shape": list(dset.chunks),
+                "dtype": dset.dtype.str,
+                "filters": filters,
+                "fillvalue": _attr(dset.fillvalue),
+                "attrs": attrs,
+                "chunks": chunks,
+            }
+
+    return {"version": INDEX_VERSION, "path": path, "variables": variables, "coords": coords}
+
+def _index_path(fs, path: str, index_dir: str) -> str:
+    info = fs.info(path)
+    stamp = info.get("ETag") or info.get("mtime") or info.get("LastModified") or ""
+    digest = hashlib.sha1(f"{path}|{info.get('size')}|{stamp}".encode()).hexdigest()
+    return os.path.join(index_dir, f"{digest}.json")
+
+def load_index(fs, path: str, index_dir: str = NEX_INDEX_DIR) -> Dict[str, Any]:
+    """Persisted index for path; built (and saved) on first use or when the file changes."""
+    ipath = _index_path(fs, path, index_dir)
+    try:
+        with open(ipath, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION:
+            _bump(index_hits=1)
+            return index
+    except (FileNotFoundError, ValueError):
+        pass
+
+    index = build_index(fs, path)
+    os.makedirs(index_dir, exist_ok=True)
+    tmp = f"{ipath}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp, ipath)
+    _bump(index_builds=1)
+    return index
+
+# ---------- Reader ----------
+def _decode_chunk(raw: bytes, filters: List[int], filter_mask: int, dtype: np.dtype, shape: List[int]) -> np.ndarray:
+    # undo filters in reverse pipeline order; a set mask bit means that filter was skipped
+    for pos in reversed(range(len(filters))):
+        if filter_mask & (1 << pos):
+            continue
+        fid = filters[pos]
+        if fid == H5Z_FLETCHER32:
+            raw = raw[:-4]
+        elif fid == H5Z_DEFLATE:
+            raw = zlib.decompress(raw)
+        elif fid == H5Z_SHUFFLE:
+            itemsize = dtype.itemsize
+            raw = np.frombuffer(raw, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+        else:
+            raise UnsupportedLayout(f"HDF5 filter {fid}")
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+class PartialReader:
+    """Reads windows of one 3D variable by fetching only the chunks that intersect them."""
+
+    def __init__(self, fs, path: str, variable: str, index: Optional[Dict[str, Any]] = None,
+                 cache: BlockCache = block_cache):
+        self.fs, self.path, self.cache = fs, path, cache
+        self.index = index or load_index(fs, path)
+        var = self.index["variables"].get(variable)
+        if var is None:
+            raise UnsupportedLayout(f"variable {variable!r} not chunk-indexed in {path}")
+        if var["dims"][1:] not in (["lat", "lon"], ["latitude", "longitude"]):
+            raise UnsupportedLayout(f"unexpected dims {var['dims']}")
+        self.var = var
+        self.variable = variable
+        self.dtype = np.dtype(var["dtype"])
+        self.chunk_shape = var["chunk_shape"]
+        self.chunks = {tuple(c[:3]): c[3:] for c in var["chunks"]}
+        self.attrs = var["attrs"]
+
+        coords = self.index["coords"]
+        tdim, ydim, xdim = var["dims"]
+        self.lat = np.asarray(coords[ydim]["values"])
+        self.lon = np.asarray(coords[xdim]["values"])
+        t = coords[tdim]
+        self.time = xr.decode_cf(xr.Dataset(coords={"time": ("time", np.asarray(t["values"]), t["attrs"])}))["time"].values
+
+        self.file_size = int(fs.size(path))
+        self.bytes_read = 0
+        self.chunks_read = 0
+        _bump(files=1, file_bytes=self.file_size)
+
+    def bbox_slices(self, bbox: Dict[str, float]) -> Tuple[slice, slice]:
+        ys = np.nonzero((self.lat >= bbox["lat_min"]) & (self.lat <= bbox["lat_max"]))[0]
+        xs = np.nonzero((self.lon >= bbox["lon_min"]) & (self.lon <= bbox["lon_max"]))[0]
+        if not len(ys) or not len(xs):
+            return slice(0, 0), slice(0, 0)
+        return slice(int(ys[0]), int(ys[-1]) + 1), slice(int(xs[0]), int(xs[-1]) + 1)
+
+    def read(self, t: slice, y: slice, x: slice) -> np.ndarray:
+        """float64 array for [t, y, x] (step-1 slices) with fill -> NaN and scale/offset applied."""
+        shape = self.var["shape"]
+        bounds = [s.indices(n)[:2] for s, n in zip((t, y, x), shape)]
+        out = np.full([max(0, b - a) for a, b in bounds], np.nan, dtype=np.float64)
+        if not out.size:
+            return out
+
+        fetched_total, n_chunks = 0, 0
+        ranges = [range(a // c * c, b, c) for (a, b), c in zip(bounds, self.chunk_shape)]
+        for origin in product(*ranges):
+            ref = self.chunks.get(origin)
+            if ref is None:  # never written -> fill value
+                continue
+            offset, size, mask = ref
+            raw, fetched = self.cache.read(self.fs, self.path, offset, offset + size)
+            fetched_total += fetched
+            n_chunks += 1
+            block = _decode_chunk(raw, self.var["filters"], mask, self.dtype, self.chunk_shape)
+
+            src, dst = [], []
+            for (a, b), o, c in zip(bounds, origin, self.chunk_shape):
+                lo, hi = max(a, o), min(b, o + c)
+                src.append(slice(lo - o, hi - o))
+                dst.append(slice(lo - a, hi - a))
+            out[tuple(dst)] = block[tuple(src)]
+
+        self.bytes_read += fetched_total
+        self.chunks_read += n_chunks
+        _bump(bytes_read=fetched_total, chunks=n_chunks)
+        return self._unpack(out)
+
+    def _unpack(self, arr: np.ndarray) -> np.ndarray:
+        for k in ("_FillValue", "missing_value"):
+            fv = self.attrs.get(k, self.var["fillvalue"] if k == "_FillValue" else None)
+            if fv is not None and not (isinstance(fv, float) and np.isnan(fv)):
+                arr[arr == fv] = np.nan
+        if "scale_factor" in self.attrs:
+            arr *= self.attrs["scale_factor"]
+        if "add_offset" in self.attrs:
+            arr += self.attrs["add_offset"]
+        return arr
+
+    def dataarray(self, bbox: Dict[str, float], t: slice = slice(None)) -> xr.DataArray:
+        y, x = self.bbox_slices(bbox)
+        data = self.read(t, y, x)
+        units = self.attrs.get("units", "")
+        return xr.DataArray(
+            data,
+            coords={"time": self.time[t], "lat": self.lat[y], "lon": self.lon[x]},
+            dims=("time", "lat", "lon"),
+            # values are already unpacked; keep units so to_celsius() still works
+            attrs={"units": units} if units else {},
+        )
@@ -0,0 +1,162 @@
+# payloads.py
+# JSON response bodies for the larger / repeated responses:
+#   - encoded with orjson (numpy arrays and scalars included, NaN -> null)
+#   - a Payload is the encoded body plus its strong ETag; its gzip / brotli
+#     variants are compressed on first use and kept, so a payload built once
+#     (the /missions lists, a cached climate series) costs no encoding per request
+#     (map tiles are binary bodies served the same way)
+#   - Memo keeps payloads built from objects that are never mutated once made
+#     (series cache entries, ensemble results), keyed on the object itself
+#     plus the request parameters that shape the body
+#   - respond() answers If-None-Match with 304 on GET / HEAD and compresses
+#     bodies of at least COMPRESS_MIN_BYTES with the best coding the client
+#     accepts: br (when the brotli package is installed), then gzip
+#
+#   MISSIONS = payloads.payload(body)                 # once
+#   return payloads.respond(request, MISSIONS)       # per request
+
+import os, gzip, hashlib, threading
+from collections import OrderedDict
+from typing import Optional, Any, Callable, Dict, Hashable, Tuple
+
+import orjson
+from fastapi import Request, Response
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: br is offered only when it is installed
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+PAYLOAD_CACHE_ITEMS = int(os.getenv("PAYLOAD_CACHE_ITEMS", "256"))
+
+CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+RESPONSE_BYTES = metrics.counter("eco_response_bytes_total", "JSON response bytes before / after content coding",
+                                 ("coding", "kind"))
+NOT_MODIFIED = metrics.counter("eco_not_modified_total", "Conditional requests answered with 304")
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+class Payload:
+    """An encoded JSON body and its strong ETag; compressed variants are made on first use and kept."""
+
+    __slots__ = ("body", "etag", "_coded", "_lock")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self._coded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def coded(self, coding: str) -> bytes:
+        if coding == "identity":
+            return self.body
+        out = self._coded.get(coding)
+        if out is None:
+            with self._lock:
+                out = self._coded.get(coding)
+                if out is None:
+                    out = brotli.compress(self.body, quality=BROTLI_QUALITY) if coding == "br" \
+                        else gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+                    self._coded[coding] = out
+        return out
+
+def payload(obj: Any) -> Payload:
+    return Payload(dumps(obj))
+
+class Memo:
+    """
+    Payloads of objects that are never mutated once built. An entry holds
+    its source object, so the object's id can't be reused while it is cached.
+    """
+
+    def __init__(self, max_items: int = PAYLOAD_CACHE_ITEMS):
+        self.max_items = max_items
+        self._items: "OrderedDict[Tuple[int, Hashable], Tuple[Any, Payload]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, source: Any, key: Hashable, build: Callable[[], Any]) -> Payload:
+        k = (id(source), key)
+        with self._lock:
+            hit = self._items.get(k)
+            if hit is not None and hit[0] is source:
+                self._items.move_to_end(k)
+                self._counters["hits"] += 1
+                return hit[1]
+            self._counters["misses"] += 1
+        p = payload(build())
+        with self._lock:
+            self._items[k] = (source, p)
+            self._items.move_to_end(k)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self._counters["evictions"] += 1
+        return p
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"items": len(self._items), "max_items": self.max_items, **self._counters}
+
+def negotiate(accept_encoding: Optional[str]) -> str:
+    """Best of CODINGS the Accept-Encoding header allows (q > 0), else "identity"."""
+    if not accept_encoding:
+        return "identity"
+    allowed, star = {}, None
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding == "*":
+            star = q
+        else:
+            allowed[coding] = q
+    for coding in CODINGS:
+        q = allowed.get(coding, star)
+        if q is not None and q > 0:
+            return coding
+    return "identity"
+
+def not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match (weak comparison, as RFC 9110 asks for it) matches etag."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+def respond(request: Request, p: Payload, headers: Optional[Dict[str, str]] = None,
+            media_type: str = "application/json", vary: Tuple[str, ...] = ()) -> Response:
+    """
+    The payload as a response: 304 when the client has it, else coded for the
+    client. `vary` names the other request headers the body depends on.
+    """
+    h = {"ETag": p.etag, "Vary": ", ".join(("Accept-Encoding",) + vary), **(headers or {})}
+    if request.method in ("GET", "HEAD") and not_modified(request.headers.get("if-none-match"), p.etag):
+        NOT_MODIFIED.inc()
+        return Response(status_code=304, headers=h)
+    coding = negotiate(request.headers.get("accept-encoding")) if len(p.body) >= COMPRESS_MIN_BYTES else "identity"
+    body = p.coded(coding)
+    if coding != "identity":
+        h["Content-Encoding"] = coding
+    RESPONSE_BYTES.inc(len(p.body), coding=coding, kind="raw")
+    RESPONSE_BYTES.inc(len(body), coding=coding, kind="wire")
+    return Response(body, media_type=media_type, headers=h)
@@ -0,0 +1,420 @@
+# points_ledger.py
+# Mission completions and the leaderboards built from them.
+#
+#   completions  one SQLite row per credited (user, mission); its `key` is
+#                UNIQUE, so a retried request (same completion id, or the
+#                same mission on the same local day) is credited only once
+#   boards       per-user point totals for "global", "school:<name>" and
+#                "week:<monday>" (the last LEADERBOARD_WEEKS weeks), each a
+#                RankIndex held in memory
+#
+# A RankIndex is a Fenwick tree over integer scores (how many members hold
+# each score) plus the members at each score, so an update, "my rank" and
+# finding the k-th score are O(log max_score), and the top N costs that per
+# distinct score plus N. Ties share a rank and list earliest-first.
+#
+# The boards are snapshotted to disk (pickle of each board's members in rank
+# order, plus the last completion id it includes). On start the snapshot is
+# loaded and only completions after it are replayed from SQLite, so start-up
+# costs O(users + new completions) instead of O(all completions).
+#
+# Several workers (uvicorn --workers) may share POINTS_DB and the snapshot
+# path. Each keeps its own boards, so before every read, record and snapshot
+# a worker catches up on the completions committed since its last one
+# (`WHERE id > applied`, by id, whichever worker wrote them). Completion ids
+# are handed out in commit order, so the boards always hold exactly the
+# completions up to `applied`, and any worker's snapshot is a valid one.
+
+import os, time, pickle, sqlite3, asyncio, functools, threading, itertools
+from array import array
+from typing import Optional, Any, Dict, List, Set, Tuple, Iterable, Iterator
+
+from local_days import local_day, bucket_of, bucket_start
+
+LEADERBOARD_WEEKS = int(os.getenv("LEADERBOARD_WEEKS", "8"))
+SNAPSHOT_INTERVAL_S = float(os.getenv("POINTS_SNAPSHOT_INTERVAL_S", "60"))
+SNAPSHOT_VERSION = 1
+
+GLOBAL = "global"
+
+def school_board(school: str) -> str:
+    return f"school:{school}"
+
+@functools.lru_cache(maxsize=4096)
+def week_board(day: int) -> str:
+    return f"week:{bucket_start(bucket_of(day, 'week'), 'week').isoformat()}"
+
+class RankIndex:
+    """Order statistics over non-negative integer scores."""
+
+    def __init__(self, capacity: int = 1024):
+        self._cap = 1 << max(0, capacity - 1).bit_length()
+        self._tree = [0] * (self._cap + 1)          # Fenwick tree of member counts by score
+        self._at: Dict[int, Dict[int, None]] = {}    # score -> members, in arrival order
+        self._score: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._score)
+
+    def get(self, member: int) -> Optional[int]:
+        return self._score.get(member)
+
+    def _update(self, score: int, delta: int) -> None:
+        i, t, cap = score + 1, self._tree, self._cap
+        while i <= cap:
+            t[i] += delta
+            i += i & -i
+
+    def _at_most(self, score: int) -> int:
+        """Members with score <= `score`."""
+        i, t, n = min(score + 1, self._cap), self._tree, 0
+        while i > 0:
+            n += t[i]
+            i -= i & -i
+        return n
+
+    def _grow(self, score: int) -> None:
+        self._cap = 1 << (score + 1).bit_length()
+        self._build()
+
+    def _build(self) -> None:
+        t = [0] * (self._cap + 1)
+        for s, members in self._at.items():
+            t[s + 1] = len(members)
+        for i in range(1, self._cap + 1):  # O(capacity) Fenwick build
+            j = i + (i & -i)
+            if j <= self._cap:
+                t[j] += t[i]
+        self._tree = t
+
+    def set(self, member: int, score: int) -> None:
+        old = self._score.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._drop(member, old)
+        if score >= self._cap:
+            self._grow(score)
+        self._score[member] = score
+        self._at.setdefault(score, {})[member] = None
+        self._update(score, 1)
+
+    def add(self, member: int, delta: int) -> int:
+        score = self._score.get(member, 0) + delta
+        self.set(member, score)
+        return score
+
+    def _drop(self, member: int, score: int) -> None:
+        members = self._at[score]
+        del members[member]
+        if not members:
+            del self._at[score]
+        self._update(score, -1)
+
+    def remove(self, member: int) -> None:
+        score = self._score.pop(member, None)
+        if score is not None:
+            self._drop(member, score)
+
+    def rank(self, member: int) -> Optional[int]:
+        """1 + members with a higher score (None if not on the board)."""
+        score = self._score.get(member)
+        return None if score is None else len(self._score) - self._at_most(score) + 1
+
+    def kth(self, k: int) -> int:
+        """Score of the k-th best member (1-based)."""
+        want = len(self._score) - k + 1  # as the want-th lowest
+        pos, step, t = 0, self._cap, self._tree
+        while step:
+            if pos + step <= self._cap and t[pos + step] < want:
+                pos += step
+                want -= t[pos]
+            step >>= 1
+        return pos
+
+    def top(self, n: int, offset: int = 0) -> List[Tuple[int, int, int]]:
+        """(member, score, rank) of places offset+1 .. offset+n."""
+        out: List[Tuple[int, int, int]] = []
+        k = offset + 1
+        while len(out) < n and k <= len(self._score):
+            score = self.kth(k)
+            rank = len(self._score) - self._at_most(score) + 1
+            members = self._at[score]
+            for m in itertools.islice(members, k - rank, k - rank + n - len(out)):
+                out.append((m, score, rank))
+            k = rank + len(members)
+        return out
+
+    def ranked(self) -> Iterator[Tuple[int, int]]:
+        """(member, score) in rank order."""
+        for score in sorted(self._at, reverse=True):
+            for m in self._at[score]:
+                yield m, score
+
+    def dump(self) -> Tuple[array, array]:
+        members, scores = array("q"), array("q")
+        for score in sorted(self._at, reverse=True):
+            ms = self._at[score]
+            members.extend(ms)
+            scores.extend(itertools.repeat(score, len(ms)))
+        return members, scores
+
+    @classmethod
+    def load(cls, members: array, scores: array) -> "RankIndex":
+        """Inverse of dump(): O(members + max score)."""
+        index = cls(max(scores, default=0) + 1)
+        at, score_of = index._at, index._score
+        for m, s in zip(members, scores):
+            score_of[m] = s
+            at.setdefault(s, {})[m] = None
+        index._build()
+        return index
+
+class PointsLedger:
+    def __init__(self, db_path: str, snapshot_path: Optional[str] = None, weeks: int = LEADERBOARD_WEEKS):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.snapshot_path = snapshot_path
+        self.weeks = weeks
+        self._lock = threading.Lock()
+        self._users: Dict[str, Tuple[int, Optional[str]]] = {}  # name -> (id, school)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, school TEXT)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, user INTEGER NOT NULL,"
+            " mission TEXT NOT NULL, points INTEGER NOT NULL, day INTEGER NOT NULL)"
+        )
+        self.boards: Dict[str, RankIndex] = {}
+        self._weeks: Set[str] = set()  # week boards in self.boards
+        self._school: Dict[int, str] = {}  # user id -> school whose board holds their total
+        self._applied = 0  # last completion id reflected in the boards
+        self._dirty = False
+        self.last_snapshot: Dict[str, Any] = {}
+        self.restored: Dict[str, Any] = {}
+        self._restore()
+
+    def _user(self, name: str, school: Optional[str], create: bool) -> Optional[Tuple[int, Optional[str]]]:
+        # caller holds self._lock; a new school moves the user's total to that school's board
+        user = self._users.get(name)
+        if user is None:
+            row = self._db.execute("SELECT id, school FROM users WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                if not create:
+                    return None
+                row = (self._db.execute("INSERT INTO users (name, school) VALUES (?, ?)", (name, school)).lastrowid, school)
+            user = self._users[name] = (row[0], row[1])
+        if school and school != user[1]:
+            uid = user[0]
+            self._db.execute("UPDATE users SET school = ? WHERE id = ?", (school, uid))
+            self._move(uid, school)
+            user = self._users[name] = (uid, school)
+        return user
+
+    def _move(self, uid: int, school: Optional[str]) -> None:
+        # caller holds self._lock; puts the user's total on `school`'s board only
+        old = self._school.get(uid)
+        if not school or school == old:
+            return
+        total = self.boards.get(GLOBAL, RankIndex()).get(uid)
+        previous = self.boards.get(school_board(old)) if old else None
+        if previous is not None:
+            previous.remove(uid)
+            if not len(previous):
+                del self.boards[school_board(old)]
+        if total is not None:
+            self._board(school_board(school)).set(uid, total)
+        self._school[uid] = school
+
+    def _names(self, ids: List[int]) -> Dict[int, str]:
+        if not ids:
+            return {}
+        rows = self._db.execute(
+            f"SELECT id, name FROM users WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall()
+        return dict(rows)
+
+    def _board(self, name: str) -> RankIndex:
+        board = self.boards.get(name)
+        if board is None:
+            board = self.boards[name] = RankIndex()
+            if name.startswith("week:"):
+                self._weeks.add(name)
+        return board
+
+    def _oldest_week(self, today: int) -> str:
+        return week_board(today - 7 * (self.weeks - 1))
+
+    def _apply(self, uid: int, school: Optional[str], points: int, day: int, oldest_week: str) -> None:
+        self._move(uid, school)  # the school may have been changed by another worker
+        self._board(GLOBAL).add(uid, points)
+        if school:
+            self._board(school_board(school)).add(uid, points)
+        week = week_board(day)
+        if week >= oldest_week:  # ISO dates compare in order
+            self._board(week).add(uid, points)
+
+    def _expire_weeks(self, oldest_week: str) -> None:
+        for name in [b for b in self._weeks if b < oldest_week]:
+            del self.boards[name]
+            self._weeks.discard(name)
+
+    def _catch_up(self, oldest_week: Optional[str] = None) -> int:
+        """
+        Apply completions committed after self._applied, by this worker or any
+        other sharing the database; caller holds self._lock. Returns how many.
+        """
+        if oldest_week is None:
+            oldest_week = self._oldest_week(local_day(time.time()))
+        n = 0
+        rows = self._db.execute(
+            "SELECT c.id, c.user, u.school, c.points, c.day FROM completions c JOIN users u ON u.id = c.user"
+            " WHERE c.id > ? ORDER BY c.id", (self._applied,))
+        for cid, uid, school, points, day in rows:
+            self._apply(uid, school, points, day, oldest_week)
+            self._applied = cid
+            n += 1
+        self._expire_weeks(oldest_week)
+        self._dirty = self._dirty or n > 0
+        return n
+
+    def record_many(
+        self,
+        items: Iterable[Tuple[str, str, int, Optional[str], Optional[float], Optional[str]]],
+    ) -> List[bool]:
+        """
+        Credit many (user, mission, points, completion_id, ts, school) in one
+        transaction. The idempotency key is the completion id when given, else
+        the mission's local day. Returns, per item, whether it was new.
+        """
+        now = time.time()
+        oldest_week = self._oldest_week(local_day(now))
+        new: List[bool] = []
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for user, mission, points, completion_id, ts, school in items:
+                    uid, _ = self._user(user, school, create=True)
+                    day = local_day(now if ts is None else ts)
+                    key = f"{uid}/{completion_id}/{mission}" if completion_id else f"{uid}/d{day}/{mission}"
+                    row = self._db.execute(
+                        "INSERT INTO completions (key, user, mission, points, day) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (key) DO NOTHING RETURNING id", (key, uid, mission, points, day)).fetchone()
+                    new.append(row is not None)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                self._users.clear()  # may hold ids/schools from the rolled-back transaction
+                raise
+            self._catch_up(oldest_week)  # this batch, and anything other workers committed before it
+        return new
+
+    def record(self, user: str, missions: List[Tuple[str, int]], completion_id: Optional[str] = None,
+               ts: Optional[float] = None, school: Optional[str] = None) -> List[bool]:
+        """Credit `missions` ((id, points) pairs) completed by `user`; see record_many()."""
+        return self.record_many((user, m, p, completion_id, ts, school) for m, p in missions)
+
+    def top(self, board: str, limit: int = 10, offset: int = 0) -> Dict[str, Any]:
+        with self._lock:
+            self._catch_up()
+            index = self.boards.get(board)
+            rows = index.top(limit, offset) if index is not None else []
+            names = self._names([m for m, _, _ in rows])
+            size = len(index) if index is not None else 0
+        return {"board": board, "size": size,
+                "entries": [{"rank": r, "user_id": names.get(m), "points": s} for m, s, r in rows]}
+
+    def standing(self, user: str, boards: List[str]) -> Dict[str, Any]:
+        """{board: {"rank", "points", "of"}} for `user` (None where they aren't on it)."""
+        with self._lock:
+            self._catch_up()
+            found = self._user(user, None, create=False)
+            out: Dict[str, Any] = {}
+            for name in boards:
+                index = self.boards.get(name)
+                if found is None or index is None or index.get(found[0]) is None:
+                    out[name] = None
+                else:
+                    out[name] = {"rank": index.rank(found[0]), "points": index.get(found[0]), "of": len(index)}
+        return out
+
+    def school_of(self, user: str) -> Optional[str]:
+        with self._lock:
+            found = self._user(user, None, create=False)
+        return found[1] if found else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Write every board to snapshot_path (atomically); returns timings and size."""
+        if not self.snapshot_path:
+            return {}
+        t0 = time.perf_counter()
+        with self._lock:
+            self._catch_up()
+            data = {"version": SNAPSHOT_VERSION, "applied": self._applied, "weeks": self.weeks,
+                    "boards": {name: index.dump() for name, index in self.boards.items()}}
+            self._dirty = False
+        t_dump = time.perf_counter()
+        tmp = f"{self.snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        with open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.snapshot_path)
+        self.last_snapshot = {"at": time.time(), "completion_id": data["applied"],
+                              "lock_ms": round((t_dump - t0) * 1000, 1),
+                              "ms": round((time.perf_counter() - t0) * 1000, 1),
+                              "bytes": os.path.getsize(self.snapshot_path)}
+        return self.last_snapshot
+
+    def _restore(self) -> None:
+        t0 = time.perf_counter()
+        source = "empty"
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "rb") as f:
+                    data = pickle.load(f)
+                if data.get("version") == SNAPSHOT_VERSION and data.get("weeks") == self.weeks:
+                    self.boards = {name: RankIndex.load(*arrays) for name, arrays in data["boards"].items()}
+                    self._weeks = {b for b in self.boards if b.startswith("week:")}
+                    self._school = {uid: b[7:] for b, index in self.boards.items() if b.startswith("school:")
+                                    for uid in index._score}
+                    self._applied = data["applied"]
+                    source = "snapshot"
+            except Exception as e:
+                print(f"[points] snapshot load failed: {e}")
+                self.boards, self._weeks, self._school, self._applied = {}, set(), {}, 0
+        t_load = time.perf_counter()
+
+        with self._lock:
+            replayed = self._catch_up()
+        self.restored = {"source": source, "replayed": replayed,
+                         "load_ms": round((t_load - t0) * 1000, 1),
+                         "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    async def watch(self, interval: float = SNAPSHOT_INTERVAL_S) -> None:
+        """Snapshot every `interval` seconds when something changed (run as a background task)."""
+        if interval <= 0 or not self.snapshot_path:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            if not self._dirty:
+                continue
+            try:
+                await asyncio.to_thread(self.snapshot)
+            except Exception as e:
+                print(f"[points] snapshot failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._catch_up()
+            (users,) = self._db.execute("SELECT COUNT(*) FROM users").fetchone()
+            boards = {"global": len(self.boards.get(GLOBAL, ())),
+                      "schools": sum(1 for b in self.boards if b.startswith("school:")),
+                      "weeks": sorted(b[5:] for b in self._weeks)}
+        # completion ids are never reused or deleted, so the last one is the count
+        return {"users": users, "completions": self._applied, "boards": boards,
+                "restored": self.restored, "last_snapshot": self.last_snapshot}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
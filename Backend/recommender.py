@@ -0,0 +1,184 @@
+# recommender.py
+# Deterministic mission recommendations: the missions with the largest
+# estimated CO2e saving for a user's routine, under a points (effort) budget.
+#
+#   catalog = Catalog([{"id": "m_walk", "category": "transport", "points": 40, "co2_saving_kg": 0.15}, ...])
+#   kg = category_kg(breakdown, total_kg)          # (users, categories) from analyze_payload / analyze_batch
+#   picks, gains = recommend(catalog, kg, budget_points=100, k=3)
+#
+# A mission can't save more than the user emits in its category
+# (transport_kg for transport, meals_kg for food, electricity + LPG for
+# energy, waste_kg for waste, the total for anything else), and missions of
+# one category share that amount: two transport missions together save at
+# most the user's transport emissions. That is a knapsack with diminishing
+# returns, solved greedily: each step takes the mission with the best
+# marginal saving per point that still fits the remaining budget, then lowers
+# what is left in its category. The greedy set is finally compared with the
+# best single mission that fits (the usual fix that keeps greedy within a
+# factor 2 of the optimum). Ties go to catalog order, so the same input
+# always gets the same answer.
+#
+# Every step works on (users x missions) arrays, so a batch of users costs k
+# vectorized passes; users are processed in chunks of about
+# RECOMMEND_CHUNK_CELLS cells to bound memory.
+
+import os, bisect
+from typing import Optional, Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+CATEGORIES = ("transport", "food", "energy", "waste", "other")
+# analyze_payload breakdown keys per category; "other" is capped by the total
+BREAKDOWN = {
+    "transport": ("transport_kg",),
+    "food": ("meals_kg",),
+    "energy": ("electricity_kg", "lpg_kg"),
+    "waste": ("waste_kg",),
+}
+# category names used by generated missions
+ALIASES = {"travel": "transport", "mobility": "transport", "diet": "food", "meals": "food",
+           "electricity": "energy", "home": "energy", "recycling": "waste"}
+
+CHUNK_CELLS = int(os.getenv("RECOMMEND_CHUNK_CELLS", "1000000"))
+
+def category_index(category: Optional[str]) -> int:
+    c = (category or "").strip().lower()
+    c = ALIASES.get(c, c)
+    return CATEGORIES.index(c) if c in BREAKDOWN else len(CATEGORIES) - 1
+
+class Catalog:
+    """Candidate missions as parallel arrays; immutable once built."""
+
+    def __init__(self, missions: Sequence[Mapping[str, Any]]):
+        self.missions = tuple(missions)
+        n = len(self.missions)
+        self.category = np.fromiter((category_index(m.get("category")) for m in self.missions), dtype=np.intp, count=n)
+        # a mission is worth at least one point, so the per-point ratio is defined
+        self.points = np.fromiter((max(1, int(m.get("points") or 0)) for m in self.missions), dtype=np.float64, count=n)
+        self.saving = np.fromiter((max(0.0, float(m.get("co2_saving_kg") or 0.0)) for m in self.missions),
+                                  dtype=np.float64, count=n)
+        for a in (self.category, self.points, self.saving):
+            a.flags.writeable = False
+        self._kept: Dict[int, np.ndarray] = {}
+
+    def kept(self, k: int) -> np.ndarray:
+        """
+        Indices of the missions that can be part of a best set of k: a mission
+        with k others of its category that cost no more points and save at
+        least as much can always be swapped for one of them.
+        """
+        idx = self._kept.get(k)
+        if idx is None:
+            order = np.lexsort((np.arange(len(self)), -self.saving, self.points, self.category))
+            keep, seen, cat = [], [], -1
+            for i in order.tolist():
+                if self.category[i] != cat:
+                    seen, cat = [], self.category[i]
+                s = -self.saving[i]
+                if bisect.bisect_right(seen, s) < k:  # fewer than k earlier ones save at least as much
+                    keep.append(i)
+                bisect.insort(seen, s)
+            idx = np.sort(np.array(keep, dtype=np.intp))
+            idx.flags.writeable = False
+            self._kept[k] = idx
+        return idx
+
+    def __len__(self) -> int:
+        return len(self.missions)
+
+    def extend(self, missions: Sequence[Mapping[str, Any]]) -> "Catalog":
+        """This catalog followed by `missions` (ids already present are skipped)."""
+        have = {m.get("id") for m in self.missions}
+        extra = Catalog([m for m in missions if m.get("id") not in have])
+        out = Catalog.__new__(Catalog)
+        out.missions = self.missions + extra.missions
+        for name in ("category", "points", "saving"):
+            a = np.concatenate([getattr(self, name), getattr(extra, name)])
+            a.flags.writeable = False
+            setattr(out, name, a)
+        out._kept = {}
+        return out
+
+def category_kg(breakdown: Mapping[str, Any], total_kg: Any) -> np.ndarray:
+    """(users, len(CATEGORIES)) kg per category from analyze_payload / analyze_batch breakdown values."""
+    total = np.atleast_1d(np.asarray(total_kg, dtype=np.float64))
+    out = np.empty((len(total), len(CATEGORIES)), dtype=np.float64)
+    for j, c in enumerate(CATEGORIES[:-1]):
+        out[:, j] = sum(np.atleast_1d(np.asarray(breakdown[k], dtype=np.float64)) for k in BREAKDOWN[c])
+    out[:, -1] = total
+    return np.maximum(out, 0.0)
+
+def _greedy(category: np.ndarray, points: np.ndarray, saving: np.ndarray, kg: np.ndarray, budget: np.ndarray,
+            k: int, per_point: bool) -> Tuple[np.ndarray, np.ndarray]:
+    users = len(kg)
+    rows = np.arange(users)
+    residual = kg.copy()
+    left = budget.copy()
+    taken = np.zeros((users, len(points)), dtype=bool)
+    picks = np.full((users, k), -1, dtype=np.intp)
+    gains = np.zeros((users, k), dtype=np.float64)
+    for step in range(k):
+        gain = np.minimum(saving, residual[:, category])
+        ok = ~taken & (points <= left[:, None]) & (gain > 0)
+        score = np.where(ok, gain / points if per_point else gain, -1.0)
+        best = score.argmax(axis=1)
+        hit = score[rows, best] > 0
+        if not hit.any():
+            break
+        r, b = rows[hit], best[hit]
+        g = gain[r, b]
+        picks[r, step], gains[r, step] = b, g
+        taken[r, b] = True
+        left[r] -= points[b]
+        residual[r, category[b]] -= g
+    return picks, gains
+
+def _solve(catalog: Catalog, kg: np.ndarray, budget: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    idx = catalog.kept(k)
+    category, points, saving = catalog.category[idx], catalog.points[idx], catalog.saving[idx]
+    # greedy by saving per point, then by saving: keep the better set per user
+    picks, gains = _greedy(category, points, saving, kg, budget, k, per_point=True)
+    other, other_gains = _greedy(category, points, saving, kg, budget, k, per_point=False)
+    better = other_gains.sum(axis=1) > gains.sum(axis=1) + 1e-12
+    picks[better], gains[better] = other[better], other_gains[better]
+
+    # best single mission within budget, when it beats both
+    rows = np.arange(len(kg))
+    single = np.where(points <= budget[:, None], np.minimum(saving, kg[:, category]), 0.0)
+    one = single.argmax(axis=1)
+    better = single[rows, one] > gains.sum(axis=1) + 1e-12
+    if better.any():
+        picks[better], gains[better] = -1, 0.0
+        picks[better, 0], gains[better, 0] = one[better], single[better, one[better]]
+    return np.where(picks >= 0, idx[np.maximum(picks, 0)], -1), gains
+
+def recommend(
+    catalog: Catalog,
+    kg: np.ndarray,
+    budget_points: Any = None,
+    k: int = 3,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Up to k missions per user (row of `kg`, see category_kg) within
+    `budget_points` (scalar or one per user; None = no limit). Returns
+    (catalog indices, estimated kg saved), both (users, k) and padded with
+    -1 / 0.0, in the order the missions were picked.
+    """
+    kg = np.asarray(kg, dtype=np.float64)
+    users = len(kg)
+    budget = np.broadcast_to(np.inf if budget_points is None else np.asarray(budget_points, dtype=np.float64),
+                             (users,)).astype(np.float64)
+    if not len(catalog) or not users or k < 1:
+        return np.full((users, max(k, 0)), -1, dtype=np.intp), np.zeros((users, max(k, 0)))
+    chunk = max(1, CHUNK_CELLS // len(catalog))
+    if users <= chunk:
+        return _solve(catalog, kg, budget, k)
+    parts = [_solve(catalog, kg[i:i + chunk], budget[i:i + chunk], k) for i in range(0, users, chunk)]
+    return np.concatenate([p for p, _ in parts]), np.concatenate([g for _, g in parts])
+
+def selections(catalog: Catalog, picks: np.ndarray, gains: np.ndarray) -> List[List[Tuple[Dict[str, Any], float]]]:
+    """Per user, [(mission, estimated kg saved)] from recommend()'s arrays."""
+    out = []
+    for p, g in zip(picks.tolist(), gains.tolist()):
+        out.append([(catalog.missions[i], s) for i, s in zip(p, g) if i >= 0])
+    return out
@@ -0,0 +1,191 @@
+# region_masks.py
+# Fractional grid masks for India and its states, from a local GeoJSON of
+# boundaries (REGION_BOUNDARIES_FILE; Polygon / MultiPolygon features with
+# "code" and "name" properties, e.g. code "MH", name "Maharashtra").
+#
+# For a model grid (1-D lat/lon centres) each region gets the fraction of
+# every cell inside its polygons, estimated from MASK_SAMPLES x MASK_SAMPLES
+# points per cell with an even-odd scanline test (holes and multi-part
+# states work). Masks are cached per (boundaries, grid) in memory and as
+# .npz under REGION_MASK_DIR, so they are built once per grid definition.
+#
+# weights() turns the masks into cos(latitude) area weights, one row per
+# region, so a single matrix product gives every region's weighted mean.
+#
+# Without a boundaries file the only region is "IN" = the whole
+# INDIA_BBOX subset (still area-weighted).
+
+import os, json, hashlib, threading
+from typing import Optional, Any, Dict, List, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+INDIA = "IN"
+
+BOUNDARIES_FILE = os.getenv("REGION_BOUNDARIES_FILE", os.path.join(os.path.dirname(__file__), "boundaries", "india_states.geojson"))
+MASK_DIR = os.getenv("REGION_MASK_DIR", os.path.join(os.path.dirname(__file__), ".cache", "region-masks"))
+MASK_SAMPLES = int(os.getenv("MASK_SAMPLES", "4"))
+
+class Boundaries:
+    """Region polygons from one GeoJSON file: codes, names and rings ((n, 2) lon/lat arrays)."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.codes: List[str] = []
+        self.names: Dict[str, str] = {}
+        self.rings: Dict[str, List[np.ndarray]] = {}
+        if path is None:
+            self.source, self.digest = "bbox", "bbox"
+            self.codes, self.names = [INDIA], {INDIA: "India (bounding box)"}
+            return
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.source, self.digest = "boundaries", hashlib.sha1(raw).hexdigest()
+        for i, feature in enumerate(json.loads(raw).get("features", [])):
+            props = feature.get("properties") or {}
+            code = normalize_code(str(props.get("code") or feature.get("id") or f"R{i}"))
+            geom = feature.get("geometry") or {}
+            polygons = geom.get("coordinates", [])
+            if geom.get("type") == "Polygon":
+                polygons = [polygons]
+            elif geom.get("type") != "MultiPolygon":
+                continue
+            if code not in self.rings:
+                self.codes.append(code)
+                self.rings[code] = []
+            self.names[code] = str(props.get("name") or code)
+            self.rings[code] += [np.asarray(ring, dtype=np.float64)[:, :2] for poly in polygons for ring in poly if len(ring) >= 3]
+        if not self.codes:
+            raise ValueError(f"no Polygon/MultiPolygon features in {path}")
+        if INDIA not in self.rings:
+            # India = union of the states (they don't overlap)
+            self.codes.insert(0, INDIA)
+            self.names[INDIA] = "India"
+
+def normalize_code(code: str) -> str:
+    c = code.strip().upper()
+    return c[3:] if c.startswith("IN-") else c
+
+_lock = threading.Lock()
+_boundaries: Dict[Tuple[str, int], Boundaries] = {}
+_masks: Dict[str, Tuple[List[str], np.ndarray]] = {}
+
+def boundaries(path: Optional[str] = None) -> Boundaries:
+    """Boundaries from `path` (default REGION_BOUNDARIES_FILE), reparsed when the file changes."""
+    path = path or BOUNDARIES_FILE
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        path, mtime = None, 0
+    key = (path or "", mtime)
+    b = _boundaries.get(key)
+    if b is None:
+        b = Boundaries(path)
+        with _lock:
+            _boundaries.clear()
+            _boundaries[key] = b
+    return b
+
+def parse_regions(param: Optional[str], b: Optional[Boundaries] = None) -> List[str]:
+    """Region codes from a comma-separated query value ("MH,KA", "all"); default India."""
+    b = b or boundaries()
+    if not param:
+        return [INDIA]
+    if param.strip().lower() == "all":
+        return list(b.codes)
+    codes = [normalize_code(c) for c in param.split(",") if c.strip()]
+    unknown = [c for c in codes if c not in b.names]
+    if unknown:
+        raise HTTPException(400, f"Unknown region(s) {unknown}; available: {b.codes}")
+    return list(dict.fromkeys(codes))
+
+def _cell_size(coord: np.ndarray) -> float:
+    return float(np.abs(np.diff(coord)).mean()) if len(coord) > 1 else 1.0
+
+def polygon_fraction(rings: List[np.ndarray], lat: np.ndarray, lon: np.ndarray, samples: int = MASK_SAMPLES) -> np.ndarray:
+    """(len(lat), len(lon)) fraction of each cell inside the rings (even-odd rule)."""
+    offsets = (np.arange(samples) + 0.5) / samples - 0.5
+    ys = (lat[:, None] + offsets[None, :] * _cell_size(lat)).ravel()
+    xs = (lon[:, None] + offsets[None, :] * _cell_size(lon)).ravel()
+    inside = np.zeros((len(ys), len(xs)), dtype=bool)
+    if rings:
+        pts = [r if lon.max() <= 180 else np.column_stack([r[:, 0] % 360, r[:, 1]]) for r in rings]
+        x1 = np.concatenate([p[:, 0] for p in pts])
+        y1 = np.concatenate([p[:, 1] for p in pts])
+        x2 = np.concatenate([np.roll(p[:, 0], -1) for p in pts])
+        y2 = np.concatenate([np.roll(p[:, 1], -1) for p in pts])
+        flat = y1 == y2
+        x1, y1, x2, y2 = x1[~flat], y1[~flat], x2[~flat], y2[~flat]
+        lo, hi = min(y1.min(), y2.min()), max(y1.max(), y2.max())
+        for i, y in enumerate(ys):
+            if y < lo or y > hi:
+                continue
+            e = (y1 <= y) != (y2 <= y)  # edges crossing this sample row
+            if not e.any():
+                continue
+            xc = np.sort(x1[e] + (y - y1[e]) * (x2[e] - x1[e]) / (y2[e] - y1[e]))
+            inside[i] = np.searchsorted(xc, xs, side="right") % 2 == 1
+    return inside.reshape(len(lat), samples, len(lon), samples).mean(axis=(1, 3))
+
+def _grid_digest(b: Boundaries, lat: np.ndarray, lon: np.ndarray) -> str:
+    h = hashlib.sha1(f"{b.digest}:{MASK_SAMPLES}".encode())
+    h.update(np.ascontiguousarray(lat, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(lon, dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def fractions(lat: np.ndarray, lon: np.ndarray, b: Optional[Boundaries] = None) -> Tuple[List[str], np.ndarray]:
+    """(codes, (regions, lat, lon) fractions) for the grid, from memory, disk or built."""
+    b = b or boundaries()
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    digest = _grid_digest(b, lat, lon)
+    hit = _masks.get(digest)
+    if hit is not None:
+        return hit
+
+    path = os.path.join(MASK_DIR, f"{digest}.npz")
+    codes, frac = None, None
+    if b.source != "bbox" and os.path.exists(path):
+        try:
+            with np.load(path) as z:
+                codes, frac = [str(c) for c in z["codes"]], z["fractions"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[masks] ignoring unreadable {path}: {e}")
+    if frac is None:
+        if b.source == "bbox":
+            codes, frac = [INDIA], np.ones((1, len(lat), len(lon)))
+        else:
+            states = [c for c in b.codes if c in b.rings]
+            frac = np.stack([polygon_fraction(b.rings[c], lat, lon) for c in states]) if states else np.zeros((0, len(lat), len(lon)))
+            codes = states
+            if INDIA not in b.rings:
+                codes = [INDIA] + states
+                frac = np.concatenate([np.minimum(frac.sum(axis=0), 1.0)[None], frac])
+            os.makedirs(MASK_DIR, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+            np.savez_compressed(tmp, codes=np.array(codes), fractions=frac.astype(np.float32))
+            os.replace(tmp, path)  # concurrent builders (threads, pool workers) write the same content
+            frac = frac.astype(np.float32)
+    out = (codes, frac)
+    with _lock:
+        _masks[digest] = out
+    return out
+
+def weights(lat: np.ndarray, lon: np.ndarray, codes: Optional[List[str]] = None,
+            b: Optional[Boundaries] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    (codes, (regions, lat * lon) float64) cell weights = mask fraction x
+    cos(latitude), for `codes` (default all regions).
+    """
+    all_codes, frac = fractions(lat, lon, b)
+    if codes is not None:
+        idx = [all_codes.index(c) for c in codes]
+        all_codes, frac = [all_codes[i] for i in idx], frac[idx]
+    coslat = np.cos(np.deg2rad(np.asarray(lat, dtype=np.float64)))
+    w = frac.astype(np.float64) * coslat[None, :, None]
+    return all_codes, w.reshape(len(all_codes), -1)
+
+def stats() -> Dict[str, Any]:
+    b = boundaries()
+    return {"source": b.source, "file": b.path, "regions": len(b.codes), "grids_cached": len(_masks)}
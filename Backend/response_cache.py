@@ -0,0 +1,180 @@
+# response_cache.py
+# Cache for LLM-generated responses (/explain, /missions/generate).
+#   1) bounded in-memory LRU with TTL (per worker)
+#   2) optional SQLite table shared by workers on the host (RESPONSE_CACHE_DB)
+# Keys are built by the caller from normalized inputs + lang + prompt version.
+#
+# Async routes use aget() / aput(): the memory tier is read inline and only
+# SQLite work goes to a thread, so the event loop never waits on the disk.
+# The row count is kept as a running estimate (each insert adds one) and
+# recounted, then trimmed to max_db_items, once the estimate goes over the
+# limit or every DB_RECOUNT_EVERY inserts (other workers insert too).
+
+import json, time, asyncio, hashlib, sqlite3, threading, unicodedata, re
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple, Hashable
+
+_SPACES = re.compile(r"\s+")
+_TRAILING = re.compile(r"[\s?？!！.।]+$")
+
+DB_RECOUNT_EVERY = 1000
+
+def normalize_text(text: str) -> str:
+    """Case/whitespace/trailing-punctuation-insensitive form of a question."""
+    t = unicodedata.normalize("NFKC", text).casefold()
+    t = _SPACES.sub(" ", t).strip()
+    return _TRAILING.sub("", t)
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_items: int = 1024,
+        ttl_s: float = 24 * 3600,
+        db_path: Optional[str] = None,
+        max_db_items: int = 100_000,
+    ):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self.max_db_items = max_db_items
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "bypass": 0,
+                          "expired": 0, "evictions": 0, "db_evictions": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()  # SQLite work, kept apart so memory hits never wait on it
+        self._db_rows = 0  # estimate; see _trim()
+        self._db_puts = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, created REAL NOT NULL, accessed REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            (self._db_rows,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+
+    @staticmethod
+    def make_key(*parts: Hashable) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _fresh(self, created: float) -> bool:
+        return self.ttl_s <= 0 or (time.time() - created) < self.ttl_s
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                created, value = hit
+                if self._fresh(created):
+                    self._mem.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._mem[key]
+                self._counters["expired"] += 1
+            if self._db is None:
+                self._counters["misses"] += 1
+        return None
+
+    def _get_db(self, key: str) -> Tuple[Optional[Any], str]:
+        with self._db_lock:
+            row = self._db.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                created, raw = row
+                if self._fresh(created):
+                    value = json.loads(raw)
+                    self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+                    with self._lock:
+                        self._remember(key, created, value)
+                        self._counters["db_hits"] += 1
+                    return value, "hit"
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db_rows -= 1
+        with self._lock:
+            if row is not None:
+                self._counters["expired"] += 1
+            self._counters["misses"] += 1
+        return None, "miss"
+
+    def get(self, key: str) -> Tuple[Optional[Any], str]:
+        """(value, "hit") when cached and fresh, else (None, "miss")."""
+        value = self._get_memory(key)
+        if value is not None:
+            return value, "hit"
+        return self._get_db(key) if self._db is not None else (None, "miss")
+
+    async def aget(self, key: str) -> Tuple[Optional[Any], str]:
+        """get() for async callers: SQLite lookups run in a thread."""
+        value = self._get_memory(key)
+        if value is not None:
+            return value, "hit"
+        return await asyncio.to_thread(self._get_db, key) if self._db is not None else (None, "miss")
+
+    def _put_db(self, key: str, created: float, value: Any) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, created, accessed, value) VALUES (?, ?, ?, ?)",
+                (key, created, created, json.dumps(value, ensure_ascii=False)),
+            )
+            self._db_rows += 1  # an over-estimate when the key was already there
+            self._db_puts += 1
+            if self._db_rows > self.max_db_items or self._db_puts % DB_RECOUNT_EVERY == 0:
+                self._trim()
+
+    def _trim(self) -> None:
+        # caller holds self._db_lock
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_db_items
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN"
+                " (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (excess,)
+            )
+            with self._lock:
+                self._counters["db_evictions"] += excess
+        self._db_rows = min(count, self.max_db_items)
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        if self._db is not None:
+            self._put_db(key, now, value)
+
+    async def aput(self, key: str, value: Any) -> None:
+        """put() for async callers: the SQLite write runs in a thread."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._put_db, key, now, value)
+
+    def bypass(self) -> None:
+        """Record a request that asked for a fresh generation."""
+        with self._lock:
+            self._counters["bypass"] += 1
+
+    def _remember(self, key: str, created: float, value: Any) -> None:
+        # caller holds self._lock
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._db_rows = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters)
+            out["memory_items"] = len(self._mem)
+        lookups = out["memory_hits"] + out["db_hits"] + out["misses"]
+        out["hit_rate"] = round((out["memory_hits"] + out["db_hits"]) / lookups, 4) if lookups else 0.0
+        return out
@@ -0,0 +1,90 @@
+# single_flight.py
+# Coalesces identical in-flight work: while a call for a key is running,
+# later callers with the same key await that call instead of starting their
+# own, and all of them get its result (or its exception).
+#
+#   explain = Group("explain", key=lambda cache_key, question: cache_key)
+#   result, shared = await explain.do(ask_model, cache_key, question)
+#   series, shared = await temps.do_in_thread(climate.cached_region_series, variable, scenario, model)
+#
+# Each Group has its own key function, called with the same arguments as the
+# work; returning None runs the call uncoalesced. The work runs as its own
+# task, so a caller that disconnects doesn't cancel it for the others. Only
+# in-flight calls are shared; results are not kept once the call finishes
+# (that is the caches' job). Per worker process; SINGLE_FLIGHT=0 turns it off.
+
+import os, asyncio
+from typing import Optional, Any, Dict, List, Tuple, Callable, Awaitable, Hashable, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+
+ENABLED = os.getenv("SINGLE_FLIGHT", "1") != "0"
+
+T = TypeVar("T")
+
+CALLS = metrics.counter("eco_single_flight_calls_total",
+                        "Coalescable calls by group and role (leader ran the work, follower shared it)",
+                        ("group", "role"))
+ERRORS = metrics.counter("eco_single_flight_errors_total", "Coalesced calls that raised, by group", ("group",))
+
+_groups: List["Group"] = []
+
+class Group:
+    def __init__(self, name: str, key: Callable[..., Optional[Hashable]]):
+        self.name = name
+        self.key = key
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.counters = {"leaders": 0, "followers": 0, "errors": 0}
+        _groups.append(self)
+
+    async def do(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> Tuple[T, bool]:
+        """(result, shared): shared is True when this caller joined another caller's call."""
+        return await self._run(self.key(*args, **kwargs) if ENABLED else None, lambda: fn(*args, **kwargs))
+
+    async def do_in_thread(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Tuple[T, bool]:
+        """
+        do() for blocking work: the leader runs fn(*args, **kwargs) on the
+        same thread pool FastAPI uses for sync routes.
+        """
+        return await self._run(self.key(*args, **kwargs) if ENABLED else None,
+                               lambda: run_in_threadpool(fn, *args, **kwargs))
+
+    async def _run(self, key: Optional[Hashable], start: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        if key is None:
+            return await start(), False
+
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.counters["followers"] += 1
+            CALLS.inc(group=self.name, role="follower")
+        else:
+            self.counters["leaders"] += 1
+            CALLS.inc(group=self.name, role="leader")
+            task = asyncio.ensure_future(start())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        # shield: cancelling one waiter must not cancel the work the others wait for
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.counters["errors"] += 1
+            ERRORS.inc(group=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.counters["leaders"] + self.counters["followers"]
+        return {**self.counters, "in_flight": len(self._inflight),
+                "fan_in": round(done / self.counters["leaders"], 2) if self.counters["leaders"] else None}
+
+def stats() -> Dict[str, Any]:
+    return {"enabled": ENABLED, "groups": {g.name: g.stats() for g in _groups}}
+
+@metrics.collector
+def _in_flight():
+    return [("eco_single_flight_in_flight", "gauge", "Calls currently being shared, by group",
+             [({"group": g.name}, len(g._inflight)) for g in _groups])]